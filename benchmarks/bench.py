@@ -0,0 +1,371 @@
+"""Benchmarks del motor: ``python -m benchmarks.bench`` desde la raíz del repo.
+
+Mide, sobre series de precios sintéticas de 1, 5 y 15 años en resolución
+horaria y cuartohoraria:
+
+* ``simular`` con cada estrategia (filas por segundo y memoria máxima),
+  y con umbrales causales de 7 días,
+* ``resumen_mensual`` sobre el resultado,
+* los barridos completos de ``analizar_duracion`` y ``analizar_margen``,
+* el despacho año a año con degradación de ``simular_plurianual``,
+* una cartera de ``N_ACTIVOS`` baterías en siete zonas con ``simular_cartera``,
+* el modelo financiero, uno a uno y por lotes de escenarios.
+
+Los resultados se comparan con ``benchmarks/baseline.json`` y el proceso
+termina con código 1 si algún caso es más lento (o usa más memoria) que la
+referencia en más del umbral. ``--guardar`` sustituye la referencia por la
+medición actual. Los tiempos dependen de la máquina: la referencia solo es
+comparable en el mismo entorno, que se guarda junto a ella.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from bess import despacho
+from bess.cartera import simular_cartera
+from bess.despacho import resumen_mensual, simular
+from bess.finanzas import evaluar_escenarios, modelo_financiero
+from bess.plurianual import simular_plurianual
+from bess.sensibilidad import analizar_duracion, analizar_margen
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+ESTRATEGIAS = ("Percentiles", "Margen fijo", "Programada", "Óptima")
+HORIZONTES = (1, 5, 15)
+RESOLUCIONES = {"h": "h", "15min": "15min"}
+HORARIO = {**{h: "C" for h in range(1, 6)}, **{h: "D" for h in range(18, 22)}}
+
+# Escenario base de las simulaciones y del modelo financiero.
+DESPACHO = dict(potencia_mw=10, duracion_h=4, ef_carga=0.95, ef_descarga=0.95)
+COSTES = dict(coste_carga=2.0, coste_descarga=2.0)
+ECONOMIA = dict(
+    degradacion=2.0,
+    capex_kwh=230,
+    coste_desarrollo_mw=20000,
+    opex_kw=6.5,
+    tasa_descuento=7.0,
+    tipo_terreno="Compra",
+    coste_terreno=0.0,
+)
+FINANCIACION = dict(ratio_apalancamiento=20, coste_financiacion=5.0)
+N_ESCENARIOS = 10000
+N_ACTIVOS = 50
+
+# Tiempo mínimo que se acumula repitiendo un caso rápido antes de quedarse
+# con la mejor repetición.
+TIEMPO_MINIMO = 1.0
+MAX_REPETICIONES = 20
+
+
+def precios_sinteticos(anios, resolucion="h", semilla=0):
+    """Serie de precios reproducible con forma diaria, semanal y estacional.
+
+    Incluye ruido autocorrelacionado, picos ocasionales y algunas horas con
+    precio negativo, para que las estrategias tengan decisiones que tomar.
+    """
+    rng = np.random.default_rng(semilla)
+    inicio = pd.Timestamp("2024-01-01")
+    fin = inicio + pd.DateOffset(years=anios)
+    fechas = pd.date_range(
+        inicio, fin, freq=RESOLUCIONES[resolucion], inclusive="left"
+    )
+    n = len(fechas)
+    hora = fechas.hour.to_numpy() + fechas.minute.to_numpy() / 60
+    dia_anio = fechas.dayofyear.to_numpy()
+    finde = fechas.dayofweek.to_numpy() >= 5
+
+    diaria = 25 * np.exp(-((hora - 8.5) ** 2) / 4) + 35 * np.exp(-((hora - 19.5) ** 2) / 5)
+    solar = -30 * np.exp(-((hora - 13.5) ** 2) / 6)
+    estacional = 20 * np.cos(2 * np.pi * (dia_anio - 15) / 365.25)
+
+    # Ruido autocorrelacionado: media exponencial de ruido blanco.
+    choques = rng.normal(0, 6, n)
+    ruido = pd.Series(choques).ewm(alpha=0.1, adjust=False).mean().to_numpy() * 3
+
+    precio = 95 + diaria + solar + estacional - 15 * finde + ruido
+    picos = rng.random(n) < 0.002
+    precio[picos] += rng.exponential(150, picos.sum())
+    return pd.DataFrame({"Fecha": fechas, "Precio": precio})
+
+
+def cartera_sintetica(zonas, n=N_ACTIVOS, semilla=0):
+    """Tabla de ``n`` activos de tamaños variados repartidos entre ``zonas``."""
+    rng = np.random.default_rng(semilla)
+    return pd.DataFrame(
+        {
+            "zona": rng.choice(zonas, n),
+            "potencia_mw": rng.integers(1, 50, n).astype(float),
+            "duracion_h": rng.choice([1.0, 2.0, 4.0, 6.0], n),
+        },
+        index=[f"Activo {i + 1}" for i in range(n)],
+    )
+
+
+def _limpiar_caches():
+    """Olvida los índices diarios para medir siempre el camino en frío."""
+    despacho._INDICES.clear()
+
+
+def medir(funcion):
+    """Mejor tiempo de ``funcion()`` y memoria máxima (MB) de una ejecución aparte."""
+    tiempos = []
+    while len(tiempos) < MAX_REPETICIONES:
+        _limpiar_caches()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+        if sum(tiempos) >= TIEMPO_MINIMO:
+            break
+
+    # tracemalloc ralentiza la ejecución, así que la memoria se mide aparte.
+    _limpiar_caches()
+    tracemalloc.start()
+    try:
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(tiempos), pico / 2**20
+
+
+def casos(rapido=False):
+    """Pares ``(nombre, filas, funcion)`` de los casos a medir."""
+    horizontes = HORIZONTES[:1] if rapido else HORIZONTES
+    for anios in horizontes:
+        for resolucion in RESOLUCIONES:
+            precios = precios_sinteticos(anios, resolucion)
+            n = len(precios)
+            sufijo = f"{anios}a/{resolucion}"
+            for estrategia in ESTRATEGIAS:
+                parametros = dict(
+                    DESPACHO,
+                    estrategia=estrategia,
+                    margen=5 if estrategia == "Margen fijo" else 0,
+                    horario=HORARIO if estrategia == "Programada" else None,
+                    **COSTES,
+                )
+                yield (
+                    f"simular/{estrategia}/{sufijo}",
+                    n,
+                    lambda p=precios, k=parametros: simular(p, **k),
+                )
+                # El barrido con "Óptima" resuelve un programa dinámico por
+                # duración; con más filas solo añade minutos.
+                if estrategia == "Óptima" and (anios > 1 or resolucion != "h"):
+                    continue
+                yield (
+                    f"duracion/{estrategia}/{sufijo}",
+                    n,
+                    lambda p=precios, k=parametros: analizar_duracion(
+                        p,
+                        k["potencia_mw"],
+                        6,
+                        k["ef_carga"],
+                        k["ef_descarga"],
+                        k["estrategia"],
+                        0.25,
+                        0.75,
+                        k["margen"],
+                        k["horario"],
+                        **COSTES,
+                        **ECONOMIA,
+                    ),
+                )
+            yield (
+                f"simular/Percentiles 7 días/{sufijo}",
+                n,
+                lambda p=precios: simular(
+                    p, estrategia="Percentiles", ventana_dias=7, **DESPACHO, **COSTES
+                ),
+            )
+            resultado = simular(precios, estrategia="Percentiles", **DESPACHO, **COSTES)
+            yield (
+                f"mensual/{sufijo}",
+                n,
+                lambda r=resultado: resumen_mensual(r),
+            )
+            yield (
+                f"plurianual/Percentiles/{sufijo}",
+                n,
+                lambda p=precios: simular_plurianual(
+                    p,
+                    estrategia="Percentiles",
+                    **DESPACHO,
+                    **COSTES,
+                    degradacion=ECONOMIA["degradacion"],
+                    perdida_ciclos=2.5,
+                ),
+            )
+            zonas = {
+                f"Z{z}": precios_sinteticos(anios, resolucion, semilla=z)
+                for z in range(7)
+            }
+            yield (
+                f"cartera/Percentiles/{sufijo}",
+                n * len(zonas),
+                lambda z=zonas: simular_cartera(
+                    cartera_sintetica(list(z)),
+                    z,
+                    "Percentiles",
+                    ef_carga=DESPACHO["ef_carga"],
+                    ef_descarga=DESPACHO["ef_descarga"],
+                    **COSTES,
+                ),
+            )
+            yield (
+                f"margen/Margen fijo/{sufijo}",
+                n,
+                lambda p=precios: analizar_margen(
+                    p,
+                    DESPACHO["potencia_mw"],
+                    DESPACHO["duracion_h"],
+                    DESPACHO["ef_carga"],
+                    DESPACHO["ef_descarga"],
+                    "Margen fijo",
+                    0.25,
+                    0.75,
+                    20,
+                    None,
+                    **COSTES,
+                    **ECONOMIA,
+                    paso=2.0,
+                ),
+            )
+
+    yield (
+        "finanzas/modelo",
+        1,
+        lambda: modelo_financiero(
+            500_000, DESPACHO["potencia_mw"], DESPACHO["duracion_h"],
+            **ECONOMIA, **FINANCIACION,
+        ),
+    )
+    ingresos = np.random.default_rng(0).uniform(2e5, 1.5e6, N_ESCENARIOS)
+    yield (
+        f"finanzas/escenarios/{N_ESCENARIOS}",
+        N_ESCENARIOS,
+        lambda: evaluar_escenarios(
+            ingresos, DESPACHO["potencia_mw"], DESPACHO["duracion_h"],
+            **ECONOMIA, **FINANCIACION,
+        ),
+    )
+
+
+def entorno():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "maquina": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def comparar(resultados, referencia, umbral):
+    """Filas de la tabla de comparación y nombres de los casos que empeoran."""
+    filas, regresiones = [], []
+    for nombre, r in resultados.items():
+        base = referencia.get(nombre)
+        if base is None:
+            filas.append((nombre, r, None, None, "nuevo"))
+            continue
+        d_tiempo = r["segundos"] / base["segundos"] - 1
+        d_memoria = r["memoria_mb"] / max(base["memoria_mb"], 1e-9) - 1
+        # Por debajo de 1 MB las variaciones de memoria son ruido del intérprete.
+        peor_memoria = d_memoria > umbral and r["memoria_mb"] - base["memoria_mb"] > 1
+        if d_tiempo > umbral or peor_memoria:
+            regresiones.append(nombre)
+            estado = "REGRESIÓN"
+        else:
+            estado = "ok"
+        filas.append((nombre, r, d_tiempo, d_memoria, estado))
+    return filas, regresiones
+
+
+def _pct(valor):
+    return "" if valor is None else f"{valor:+.0%}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.bench", description="Benchmarks del motor bess."
+    )
+    parser.add_argument(
+        "--rapido", action="store_true", help="solo las series de 1 año y las finanzas"
+    )
+    parser.add_argument("--filtro", help="mide solo los casos que contienen este texto")
+    parser.add_argument(
+        "--umbral", type=float, default=0.25,
+        help="empeoramiento relativo admitido en tiempo y memoria (0.25 = 25 %%)",
+    )
+    parser.add_argument("--referencia", default=BASELINE, help="JSON de referencia")
+    parser.add_argument(
+        "--guardar", action="store_true", help="guarda la medición como referencia"
+    )
+    parser.add_argument("--salida", help="escribe también los resultados en este JSON")
+    args = parser.parse_args(argv)
+
+    referencia = {}
+    if os.path.exists(args.referencia):
+        with open(args.referencia, encoding="utf-8") as f:
+            guardada = json.load(f)
+        referencia = guardada.get("casos", {})
+        if guardada.get("entorno") != entorno():
+            print(
+                "Aviso: la referencia se midió en otro entorno "
+                f"({guardada.get('entorno')}); los tiempos pueden no ser comparables.",
+                file=sys.stderr,
+            )
+
+    resultados = {}
+    for nombre, filas, funcion in casos(args.rapido):
+        if args.filtro and args.filtro not in nombre:
+            continue
+        segundos, memoria = medir(funcion)
+        resultados[nombre] = {
+            "segundos": round(segundos, 5),
+            "filas_s": round(filas / segundos),
+            "memoria_mb": round(memoria, 2),
+        }
+        print(
+            f"{nombre:<40} {segundos:9.4f} s {filas / segundos:14,.0f} filas/s "
+            f"{memoria:9.1f} MB",
+            flush=True,
+        )
+
+    documento = {"entorno": entorno(), "casos": resultados}
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(documento, f, indent=2, ensure_ascii=False)
+    if args.guardar:
+        documento["casos"] = {**referencia, **resultados}
+        with open(args.referencia, "w", encoding="utf-8") as f:
+            json.dump(documento, f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write("\n")
+        print(f"Referencia guardada en {args.referencia}")
+        return 0
+
+    filas, regresiones = comparar(resultados, referencia, args.umbral)
+    print()
+    print(f"{'caso':<40} {'Δ tiempo':>9} {'Δ memoria':>10}  estado")
+    for nombre, _, d_tiempo, d_memoria, estado in filas:
+        print(f"{nombre:<40} {_pct(d_tiempo):>9} {_pct(d_memoria):>10}  {estado}")
+    if regresiones:
+        print(
+            f"\n{len(regresiones)} caso(s) empeoran más de un {args.umbral:.0%} "
+            "respecto a la referencia.",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""Motor de simulación de BESS sin interfaz gráfica.
+
+Los submódulos se importan al acceder a cada nombre, de modo que
+``import bess`` no carga pandas ni NumPy::
+
+    from bess import cargar_precios, simular
+
+    precios = cargar_precios("NORD")
+    resultado = simular(precios, 10, 4, 0.95, 0.95, "Percentiles")
+"""
+import importlib
+
+_EXPORTS = {
+    "ALMACEN": "datos",
+    "ZONAS": "datos",
+    "cargar_precios": "datos",
+    "guardar_en_almacen": "datos",
+    "leer_almacen": "datos",
+    "informe_ingesta": "datos",
+    "ruta_predeterminada": "datos",
+    "ESTADOS": "despacho",
+    "IndiceDiario": "despacho",
+    "IndiceFechas": "despacho",
+    "ResultadoCompacto": "despacho",
+    "cuantiles_moviles": "despacho",
+    "indice_diario": "despacho",
+    "media_movil": "despacho",
+    "resumen_mensual": "despacho",
+    "simular": "despacho",
+    "simular_duraciones": "despacho",
+    "simular_margenes": "despacho",
+    "simular_referencia": "despacho",
+    "lttb": "graficos",
+    "detectar_formato": "ingesta",
+    "ingerir": "ingesta",
+    "ingerir_hojas": "ingesta",
+    "regularizar": "ingesta",
+    "Canalizacion": "etapas",
+    "ETAPAS": "etapas",
+    "Etapa": "etapas",
+    "evaluar_escenarios": "finanzas",
+    "modelo_financiero": "finanzas",
+    "tir_lote": "finanzas",
+    "analizar_duracion": "sensibilidad",
+    "analizar_margen": "sensibilidad",
+    "barrer_duraciones": "sensibilidad",
+    "barrer_margenes": "sensibilidad",
+    "optimizar_duracion": "sensibilidad",
+    "optimizar_margen": "sensibilidad",
+    "valorar_duraciones": "sensibilidad",
+    "valorar_margenes": "sensibilidad",
+    "CACHE": "cache",
+    "CacheResultados": "cache",
+    "VERSION_MOTOR": "cache",
+    "clave_llamada": "cache",
+    "POR_ACTIVO": "cartera",
+    "analizar_cartera": "cartera",
+    "simular_cartera": "cartera",
+    "valorar_cartera": "cartera",
+    "comparar_zonas": "comparativa",
+    "EJES": "rejilla",
+    "analizar_rejilla": "rejilla",
+    "simular_rejilla": "rejilla",
+    "valorar_rejilla": "rejilla",
+    "simular_por_bloques": "bloques",
+    "simular_por_trozos": "trozos",
+    "trozos_almacen": "trozos",
+    "trozos_df": "trozos",
+    "Registro": "rendimiento",
+    "configurar_log": "rendimiento",
+    "medir": "rendimiento",
+    "perfilar": "rendimiento",
+    "simular_plurianual": "plurianual",
+    "resumen_montecarlo": "montecarlo",
+    "simular_montecarlo": "montecarlo",
+    "TECHS": "tecnologias",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(nombre):
+    modulo = _EXPORTS.get(nombre)
+    if modulo is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    valor = getattr(importlib.import_module(f".{modulo}", __name__), nombre)
+    globals()[nombre] = valor
+    return valor
+
+
+def __dir__():
+    return __all__
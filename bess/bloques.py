@@ -0,0 +1,168 @@
+"""Despacho por bloques diarios o semanales resueltos en paralelo.
+
+El SOC es lo único que acopla un bloque con el siguiente. Con la estrategia
+"Óptima" se fija el SOC al principio y al final de cada bloque, así que los
+bloques son independientes y se reparten entre procesos. Las fronteras las
+asigna una pasada gruesa (el mismo programa dinámico sobre toda la serie con
+``NIVELES_GRUESOS`` niveles de SOC) o se fijan en ``soc_frontera``. Los
+resultados se vuelven a unir en el mismo DataFrame que ``simular``.
+
+Las estrategias heurísticas no pueden dirigir el SOC con que termina un
+bloque: el siguiente depende de él, así que su despacho es una sola pasada
+en serie y solo las señales, vectorizadas, se calculan de una vez.
+"""
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from .despacho import NIVELES_SOC, _despachar, _despacho_optimo, _resultado, _senales
+
+BLOQUES = {"D": "D", "W": "W-SUN"}
+# Niveles de la pasada gruesa; divide a NIVELES_SOC, así que sus fronteras
+# están en la rejilla fina y cada bloque puede alcanzarlas.
+NIVELES_GRUESOS = NIVELES_SOC // 10
+
+
+def _despachar_tramos(
+    tramos,
+    paso_c,
+    paso_d,
+    energia_mwh,
+    coste_carga,
+    coste_descarga,
+):
+    """Óptimo de cada ``(precio, soc_inicial, soc_final)``; en un proceso del pool."""
+    salidas = [
+        _despacho_optimo(
+            precio,
+            paso_c,
+            paso_d,
+            energia_mwh,
+            coste_carga,
+            coste_descarga,
+            soc_inicial=inicial,
+            soc_final=final,
+        )
+        for precio, inicial, final in tramos
+    ]
+    return [np.concatenate(col) for col in zip(*salidas)]
+
+
+def simular_por_bloques(
+    precios,
+    potencia_mw,
+    duracion_h,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    umbral_carga=0.25,
+    umbral_descarga=0.75,
+    margen=0,
+    horario=None,
+    coste_carga=0.0,
+    coste_descarga=0.0,
+    ventana_dias=0,
+    bloque="D",
+    soc_frontera=None,
+    max_workers=None,
+):
+    """``simular`` con el horizonte dividido en bloques.
+
+    ``bloque`` es ``"D"`` (días) o ``"W"`` (semanas de lunes a domingo). Con la
+    estrategia "Óptima" cada bloque se resuelve en paralelo entre dos
+    fronteras de SOC. Sin ``soc_frontera`` las asigna la pasada gruesa: en
+    NORD 2024 el resultado queda a menos de un 0,01 % del óptimo sin cortes,
+    con bloques diarios o semanales. Con ``soc_frontera`` (fracción de la
+    energía) todos los bloques empiezan y terminan en ese nivel, y esa
+    restricción cuesta: con bloques diarios y ``soc_frontera=0.5`` NORD 2024
+    da en torno a un 16 % menos. Por eso se avisa con ``warnings.warn``.
+    Las estrategias heurísticas se despachan en una sola pasada, con el
+    mismo resultado que ``simular``, y no admiten ``soc_frontera``. Los
+    bloques se agrupan en tramos contiguos, unos pocos por proceso, para que
+    el coste de enviarlos sea pequeño.
+    """
+    if bloque not in BLOQUES:
+        raise ValueError(f"Bloque desconocido: {bloque!r} (usa 'D' o 'W')")
+    if soc_frontera is not None and estrategia != "Óptima":
+        raise ValueError("soc_frontera solo se puede fijar con la estrategia 'Óptima'")
+    energia_mwh = potencia_mw * duracion_h
+    if precios.empty:
+        vacio = np.zeros(0)
+        return _resultado(
+            precios,
+            vacio,
+            vacio,
+            vacio,
+            np.zeros(0, dtype=np.int8),
+            coste_carga,
+            coste_descarga,
+        )
+    if estrategia != "Óptima":
+        senal = _senales(
+            precios,
+            estrategia,
+            umbral_carga,
+            umbral_descarga,
+            margen,
+            horario,
+            ventana_dias,
+        )
+        despacho = _despachar(senal, potencia_mw, energia_mwh, ef_carga, ef_descarga)
+        return _resultado(precios, *despacho, coste_carga, coste_descarga)
+
+    precio = precios["Precio"].to_numpy(dtype=float)
+    paso_c = potencia_mw * ef_carga
+    paso_d = potencia_mw * ef_descarga
+    periodo = precios["Fecha"].dt.to_period(BLOQUES[bloque]).to_numpy()
+    cortes = np.flatnonzero(periodo[1:] != periodo[:-1]) + 1
+    if soc_frontera is None:
+        _, _, soc_grueso, _ = _despacho_optimo(
+            precio,
+            paso_c,
+            paso_d,
+            energia_mwh,
+            coste_carga,
+            coste_descarga,
+            niveles=NIVELES_GRUESOS,
+        )
+        # El primer bloque parte de vacío, como ``simular``, y el último
+        # termina libre.
+        fronteras = [0.0, *soc_grueso[cortes - 1], None]
+        inicios, finales = fronteras[:-1], fronteras[1:]
+    else:
+        warnings.warn(
+            "Con soc_frontera cada bloque empieza y termina en ese nivel, lo que "
+            "puede reducir bastante el beneficio (un 16 % con bloques diarios y "
+            "0.5 en NORD 2024); sin soc_frontera las fronteras las asigna una "
+            "pasada gruesa.",
+            stacklevel=2,
+        )
+        inicios = finales = [soc_frontera * energia_mwh] * (len(cortes) + 1)
+    bloques = list(zip(np.split(precio, cortes), inicios, finales))
+
+    workers = max_workers or os.cpu_count() or 1
+    n_tramos = min(len(bloques), 4 * workers)
+    limites = np.linspace(0, len(bloques), n_tramos + 1).astype(int)
+    tramos = [bloques[a:b] for a, b in zip(limites[:-1], limites[1:])]
+
+    tarea = partial(
+        _despachar_tramos,
+        paso_c=paso_c,
+        paso_d=paso_d,
+        energia_mwh=energia_mwh,
+        coste_carga=coste_carga,
+        coste_descarga=coste_descarga,
+    )
+    if workers == 1:
+        salidas = [tarea(t) for t in tramos]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            salidas = list(pool.map(tarea, tramos))
+
+    carga, descarga, soc, estado = (np.concatenate(col) for col in zip(*salidas))
+    return _resultado(
+        precios, carga, descarga, soc, estado, coste_carga, coste_descarga
+    )
@@ -0,0 +1,167 @@
+"""Caché de resultados por parámetros, compartida entre ejecuciones y sesiones.
+
+La clave es un hash canónico de la función, del contenido de la serie de
+precios, de todos los argumentos (con sus valores por defecto) y de la
+versión del motor, que es un hash de las fuentes de ``bess``: al cambiar el
+código, los resultados guardados dejan de servirse. Los
+resultados se guardan en memoria con expulsión LRU y, comprimidos, en disco
+(``.bess_cache/`` o la carpeta de la variable de entorno ``BESS_CACHE``), de
+modo que un escenario repetido se recupera al instante aunque se haya
+reiniciado el proceso.
+"""
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from .despacho import _huella_precios
+
+DIRECTORIO_CACHE = os.environ.get("BESS_CACHE", ".bess_cache")
+
+
+def _version_motor():
+    """Hash de los módulos de ``bess``; cambia con cualquier cambio del motor."""
+    h = hashlib.blake2b(digest_size=8)
+    carpeta = os.path.dirname(os.path.abspath(__file__))
+    for nombre in sorted(os.listdir(carpeta)):
+        if nombre.endswith(".py"):
+            h.update(nombre.encode())
+            with open(os.path.join(carpeta, nombre), "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+
+VERSION_MOTOR = _version_motor()
+
+
+def _canonico(valor):
+    """Valor serializable en JSON para los tipos que aparecen en los parámetros."""
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    return str(valor)
+
+
+def _normalizar(valor):
+    """Claves de diccionario como texto (JSON no admite, p. ej., ``np.int64``)."""
+    if isinstance(valor, dict):
+        return {str(k): _normalizar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_normalizar(v) for v in valor]
+    return valor
+
+
+def huella_parametros(parametros):
+    """Hash canónico de un diccionario de parámetros."""
+    texto = json.dumps(_normalizar(parametros), sort_keys=True, default=_canonico)
+    return hashlib.blake2b(texto.encode(), digest_size=16).hexdigest()
+
+
+def clave_llamada(funcion, precios, *args, **kwargs):
+    """Hash de ``funcion(precios, *args, **kwargs)``.
+
+    Los argumentos se normalizan con la firma de la función, así que pasar un
+    parámetro por posición, por nombre o dejar su valor por defecto da la
+    misma clave. La clave incluye ``VERSION_MOTOR``.
+    """
+    ligados = inspect.signature(funcion).bind(precios, *args, **kwargs)
+    ligados.apply_defaults()
+    parametros = dict(ligados.arguments)
+    parametros.pop(next(iter(parametros)))
+    h = hashlib.blake2b(digest_size=16)
+    h.update(VERSION_MOTOR.encode())
+    h.update(f"{funcion.__module__}.{funcion.__qualname__}".encode())
+    h.update(_huella_precios(precios).encode())
+    h.update(huella_parametros(parametros).encode())
+    return h.hexdigest()
+
+
+class CacheResultados:
+    """Caché LRU en memoria con copia comprimida en disco.
+
+    Los objetos devueltos se comparten entre quienes piden la misma clave y
+    no deben modificarse.
+    """
+
+    def __init__(self, max_memoria=32, max_disco=256, directorio=DIRECTORIO_CACHE):
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+        self.directorio = directorio
+        self._memoria = OrderedDict()
+        self._cerrojo = threading.Lock()
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.pkl.z")
+
+    def _leer_disco(self, clave):
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "rb") as f:
+                valor = pickle.loads(zlib.decompress(f.read()))
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError):
+            return None
+        os.utime(ruta)
+        return valor
+
+    def _escribir_disco(self, clave, valor):
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = self._ruta(clave)
+        tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(pickle.dumps(valor, pickle.HIGHEST_PROTOCOL), 6))
+        os.replace(tmp, ruta)
+        archivos = [
+            os.path.join(self.directorio, n)
+            for n in os.listdir(self.directorio)
+            if n.endswith(".pkl.z")
+        ]
+        if len(archivos) > self.max_disco:
+            archivos.sort(key=os.path.getmtime)
+            for viejo in archivos[: len(archivos) - self.max_disco]:
+                try:
+                    os.remove(viejo)
+                except OSError:
+                    pass
+
+    def _guardar_memoria(self, clave, valor):
+        with self._cerrojo:
+            self._memoria[clave] = valor
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+
+    def llamar(self, funcion, precios, *args, **kwargs):
+        """Resultado de ``funcion(precios, *args, **kwargs)``, desde la caché si existe."""
+        clave = clave_llamada(funcion, precios, *args, **kwargs)
+        with self._cerrojo:
+            if clave in self._memoria:
+                self._memoria.move_to_end(clave)
+                return self._memoria[clave]
+        valor = self._leer_disco(clave)
+        if valor is None:
+            valor = funcion(precios, *args, **kwargs)
+            try:
+                self._escribir_disco(clave, valor)
+            except OSError:
+                pass
+        self._guardar_memoria(clave, valor)
+        return valor
+
+    def vaciar(self, disco=False):
+        """Vacía la memoria y, con ``disco=True``, también la copia en disco."""
+        with self._cerrojo:
+            self._memoria.clear()
+        if disco and os.path.isdir(self.directorio):
+            for n in os.listdir(self.directorio):
+                if n.endswith(".pkl.z"):
+                    os.remove(os.path.join(self.directorio, n))
+
+
+CACHE = CacheResultados()
@@ -0,0 +1,220 @@
+"""Cartera de baterías: todos los activos en una sola pasada por lotes.
+
+Cada activo, con su tamaño, sus eficiencias y su zona, es un carril de
+``_despachar_lote``. Los precios de las zonas se alinean en un eje temporal
+común, una columna por zona, y cada carril lee la columna de la suya, así
+que la cartera entera se despacha recorriendo la serie una vez en lugar de
+llamar a ``simular`` por activo. La valoración también es por lotes
+(``evaluar_escenarios``); la de la cartera suma los flujos de los activos.
+"""
+import numpy as np
+import pandas as pd
+
+from .despacho import _beneficio_neto, _despachar_lote, _limites, _optimo_anual
+from .finanzas import evaluar_escenarios, tir_lote
+
+# Parámetros del despacho que cada activo puede fijar en su propia columna;
+# en la valoración puede hacerlo con cualquiera de los económicos.
+POR_ACTIVO = ("potencia_mw", "duracion_h", "ef_carga", "ef_descarga", "margen")
+
+
+def _por_activo(activos, nombre, valor):
+    """Columna ``nombre`` de la tabla o, si no la tiene, ``valor`` para todos."""
+    if nombre in activos:
+        return activos[nombre].to_numpy()
+    if valor is None:
+        raise ValueError(f"Falta la columna {nombre!r} en la tabla de activos")
+    return np.full(len(activos), valor)
+
+
+def simular_cartera(
+    activos,
+    precios,
+    estrategia,
+    potencia_mw=None,
+    duracion_h=None,
+    ef_carga=None,
+    ef_descarga=None,
+    umbral_carga=0.25,
+    umbral_descarga=0.75,
+    margen=0,
+    horario=None,
+    coste_carga=0.0,
+    coste_descarga=0.0,
+    ventana_dias=0,
+):
+    """Totales anuales del despacho de cada activo de la cartera.
+
+    ``activos`` tiene una fila por activo (el índice es su nombre), la
+    columna ``zona`` y, si varían entre activos, columnas con los parámetros
+    de ``POR_ACTIVO``; los que no tienen columna toman el valor indicado.
+    ``precios`` es ``{zona: DataFrame}``. La estrategia y sus umbrales son
+    los de toda la cartera, calculados con los precios de cada zona.
+    Devuelve un DataFrame indexado por año y activo con la energía cargada y
+    descargada, las compras, las ventas y el beneficio neto.
+    """
+    zonas, zona = np.unique(activos["zona"].astype(str).to_numpy(), return_inverse=True)
+    zona = zona.ravel()
+    faltan = [z for z in zonas if z not in precios]
+    if faltan:
+        raise ValueError(f"No hay precios para las zonas {faltan}")
+    series = [precios[z].reset_index(drop=True) for z in zonas]
+    fecha = np.unique(
+        np.concatenate([s["Fecha"].to_numpy(dtype="datetime64[ns]") for s in series])
+    )
+    precio = np.full((len(fecha), len(zonas)), np.nan)
+    lim_c = np.full_like(precio, np.nan)
+    lim_d = np.full_like(precio, np.nan)
+    filas = []
+    for z, serie in enumerate(series):
+        pos = np.searchsorted(fecha, serie["Fecha"].to_numpy(dtype="datetime64[ns]"))
+        precio[pos, z] = serie["Precio"].to_numpy(dtype=float)
+        if estrategia != "Óptima":
+            lim_c[pos, z], lim_d[pos, z] = _limites(
+                serie, estrategia, umbral_carga, umbral_descarga, horario, ventana_dias
+            )
+        filas.append(pos)
+    anios, grupo = np.unique(
+        fecha.astype("datetime64[Y]").astype(int) + 1970, return_inverse=True
+    )
+
+    valores = dict(
+        potencia_mw=potencia_mw,
+        duracion_h=duracion_h,
+        ef_carga=ef_carga,
+        ef_descarga=ef_descarga,
+        margen=margen,
+    )
+    p = {n: _por_activo(activos, n, valores[n]).astype(float) for n in POR_ACTIVO}
+    paso_c = p["potencia_mw"] * p["ef_carga"]
+    paso_d = p["potencia_mw"] * p["ef_descarga"]
+    energia = p["potencia_mw"] * p["duracion_h"]
+
+    if estrategia == "Óptima":
+        # Sin umbrales que compartir: un programa dinámico por activo.
+        tot = {
+            c: np.zeros((len(anios), len(activos)))
+            for c in ("Carga (MWh)", "Descarga (MWh)", "Compra (€)", "Venta (€)")
+        }
+        for z, pos in enumerate(filas):
+            carriles = np.flatnonzero(zona == z)
+            parcial = _optimo_anual(
+                precio[pos, z],
+                paso_c[carriles],
+                paso_d[carriles],
+                energia[carriles],
+                grupo[pos],
+                len(anios),
+                coste_carga,
+                coste_descarga,
+            )
+            for c, v in parcial.items():
+                tot[c][:, carriles] = v
+    else:
+        off = p["margen"] if estrategia == "Margen fijo" else 0.0
+        tot = _despachar_lote(
+            precio,
+            lim_c,
+            lim_d,
+            off,
+            off,
+            paso_c,
+            paso_d,
+            energia,
+            grupo,
+            len(anios),
+            zona,
+            zona,
+            carril_p=zona,
+        )
+
+    tot["Beneficio neto (€)"] = _beneficio_neto(tot, coste_carga, coste_descarga)
+    indice = pd.MultiIndex.from_product([anios, activos.index], names=["Año", "Activo"])
+    return pd.DataFrame({c: v.ravel() for c, v in tot.items()}, index=indice)
+
+
+def valorar_cartera(
+    anual,
+    activos,
+    degradacion,
+    capex_kwh,
+    coste_desarrollo_mw,
+    opex_kw,
+    tasa_descuento,
+    tipo_terreno,
+    coste_terreno,
+    ratio_apalancamiento=0.0,
+    coste_financiacion=0.0,
+    potencia_mw=None,
+    duracion_h=None,
+):
+    """VAN y TIR de cada activo de ``simular_cartera`` y de la cartera.
+
+    Como en el modelo de una batería, el ingreso es el beneficio neto del
+    primer año. Cualquier parámetro económico puede ser una columna de
+    ``activos``. Devuelve la tabla por activo y un diccionario con los
+    totales, los flujos de caja sumados y las TIR de la cartera.
+    """
+    primero = anual.xs(anual.index.get_level_values("Año")[0], level="Año")
+    ingreso = primero["Beneficio neto (€)"].to_numpy()
+    economia = dict(
+        degradacion=degradacion,
+        capex_kwh=capex_kwh,
+        coste_desarrollo_mw=coste_desarrollo_mw,
+        opex_kw=opex_kw,
+        tasa_descuento=tasa_descuento,
+        tipo_terreno=tipo_terreno,
+        coste_terreno=coste_terreno,
+        ratio_apalancamiento=ratio_apalancamiento,
+        coste_financiacion=coste_financiacion,
+    )
+    economia = {n: _por_activo(activos, n, v) for n, v in economia.items()}
+    potencia = _por_activo(activos, "potencia_mw", potencia_mw).astype(float)
+    duracion = _por_activo(activos, "duracion_h", duracion_h).astype(float)
+    esc = evaluar_escenarios(ingreso, potencia, duracion, **economia)
+
+    tabla = pd.DataFrame(
+        {
+            "Zona": activos["zona"].to_numpy(),
+            "Potencia (MW)": potencia,
+            "Duración (h)": duracion,
+            "Ingreso anual (€)": ingreso,
+            "Ciclos/año": primero["Descarga (MWh)"].to_numpy() / (potencia * duracion),
+            "CAPEX (€)": esc["capex_total"],
+            "VAN (€)": esc["van"],
+            "TIR proyecto": esc["tir"],
+            "TIR equity": esc["tir_equity"],
+        },
+        index=activos.index.rename("Activo"),
+    )
+    flujo_caja = esc["flujo_caja"].sum(axis=0)
+    flujo_equity = esc["flujo_equity"].sum(axis=0)
+    tir, tir_equity = tir_lote(np.stack((flujo_caja, flujo_equity)))
+    cartera = {
+        "ingreso_anual": float(ingreso.sum()),
+        "capex_total": float(esc["capex_total"].sum()),
+        "van": float(esc["van"].sum()),
+        "tir": float(tir),
+        "tir_equity": float(tir_equity),
+        "flujo_caja": flujo_caja.tolist(),
+        "flujo_equity": flujo_equity.tolist(),
+    }
+    return tabla, cartera
+
+
+def analizar_cartera(activos, precios, despacho, economia):
+    """Despacho y valoración de la cartera en una llamada.
+
+    ``despacho`` son los argumentos de ``simular_cartera`` (salvo activos y
+    precios) y ``economia`` los de ``valorar_cartera``; las columnas de
+    ``activos`` mandan sobre ambos. Devuelve la tabla por activo y el
+    diccionario de la cartera.
+    """
+    anual = simular_cartera(activos, precios, **despacho)
+    return valorar_cartera(
+        anual,
+        activos,
+        **economia,
+        potencia_mw=despacho.get("potencia_mw"),
+        duracion_h=despacho.get("duracion_h"),
+    )
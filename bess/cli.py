@@ -0,0 +1,287 @@
+"""Línea de comandos: ``python -m bess parametros.json -o salida/``.
+
+El archivo de parámetros es un JSON con los valores base de la simulación
+(mismos nombres que en ``simular`` y ``modelo_financiero``) y, opcionalmente,
+una lista ``escenarios`` con los valores que cambian en cada escenario::
+
+    {
+        "zona": "NORD",
+        "potencia_mw": 10,
+        "estrategia": "Margen fijo",
+        "escenarios": [{"duracion_h": 2}, {"duracion_h": 4, "margen": 5}]
+    }
+
+Se escribe ``resumen.csv`` con una fila por escenario y, con ``--detalle``,
+los resultados horarios y mensuales de cada uno.
+"""
+import argparse
+import json
+import os
+
+PARAMETROS = {
+    "zona": "NORD",
+    "archivo": None,
+    "desde": None,
+    "anios": 15,
+    "potencia_mw": 10,
+    "duracion_h": 4,
+    "ef_carga": 0.95,
+    "ef_descarga": 0.95,
+    "estrategia": "Percentiles",
+    "umbral_carga": 0.25,
+    "umbral_descarga": 0.75,
+    "margen": 0.0,
+    "horario": None,
+    "coste_carga": 2.0,
+    "coste_descarga": 2.0,
+    "ventana_dias": 0,
+    "bloque": None,
+    "soc_frontera": None,
+    "trozo_filas": None,
+    "degradacion": 2.0,
+    "degradacion_despacho": False,
+    "perdida_ciclos": 0.0,
+    "capex_kwh": 230,
+    "coste_desarrollo_mw": 20000,
+    "opex_kw": 6.5,
+    "tasa_descuento": 7.0,
+    "tipo_terreno": "Compra",
+    "coste_terreno": 0.0,
+    "ratio_apalancamiento": 20,
+    "coste_financiacion": 5.0,
+    "max_h": None,
+    "max_margen": None,
+    "adaptativa": False,
+}
+
+_DESPACHO = (
+    "potencia_mw",
+    "duracion_h",
+    "ef_carga",
+    "ef_descarga",
+    "estrategia",
+    "umbral_carga",
+    "umbral_descarga",
+    "margen",
+    "horario",
+    "coste_carga",
+    "coste_descarga",
+    "ventana_dias",
+)
+_ECONOMIA = (
+    "degradacion",
+    "capex_kwh",
+    "coste_desarrollo_mw",
+    "opex_kw",
+    "tasa_descuento",
+    "tipo_terreno",
+    "coste_terreno",
+    "ratio_apalancamiento",
+    "coste_financiacion",
+)
+
+_SENSIBILIDAD = tuple(
+    k
+    for k in _DESPACHO + _ECONOMIA
+    if k not in ("duracion_h", "margen", "ratio_apalancamiento", "coste_financiacion")
+)
+
+
+def leer_escenarios(ruta):
+    """Lista de escenarios completos a partir del archivo de parámetros."""
+    with open(ruta, encoding="utf-8") as f:
+        datos = json.load(f)
+    base = {**PARAMETROS, **{k: v for k, v in datos.items() if k != "escenarios"}}
+    desconocidos = set(base) - set(PARAMETROS)
+    for cambios in datos.get("escenarios", []):
+        desconocidos |= set(cambios) - set(PARAMETROS)
+    if desconocidos:
+        raise ValueError(f"Parámetros desconocidos: {', '.join(sorted(desconocidos))}")
+    escenarios = [{**base, **c} for c in datos.get("escenarios", [{}])]
+    for p in escenarios:
+        if p["horario"] is not None:
+            p["horario"] = {int(h): a for h, a in p["horario"].items()}
+    return escenarios
+
+
+def ejecutar_escenario(p, precios, salida_horaria=None):
+    """Simula un escenario y devuelve (fila resumen, resultado, mensual).
+
+    Con ``trozo_filas`` la simulación se hace por trozos: los resultados
+    horarios se escriben directamente en ``salida_horaria`` (si se indica) y
+    ``resultado`` es ``None``.
+    """
+    import pandas as pd
+
+    from .bloques import simular_por_bloques
+    from .despacho import resumen_mensual, simular
+    from .trozos import simular_por_trozos, trozos_df
+    from .finanzas import modelo_financiero
+    from .plurianual import simular_plurianual
+    from .rendimiento import medir
+    from .sensibilidad import (
+        analizar_duracion,
+        analizar_margen,
+        optimizar_duracion,
+        optimizar_margen,
+    )
+
+    desde = pd.Timestamp(p["desde"]) if p["desde"] else precios["Fecha"].min().normalize()
+    hasta = min(
+        desde + pd.DateOffset(years=p["anios"]) - pd.Timedelta(days=1),
+        precios["Fecha"].max(),
+    )
+    precios = precios[(precios["Fecha"] >= desde) & (precios["Fecha"] <= hasta)]
+
+    despacho = {k: p[k] for k in _DESPACHO}
+    economia = {k: p[k] for k in _ECONOMIA}
+    if p["trozo_filas"]:
+        resultado = None
+        with medir("despacho", filas=len(precios)):
+            mensual = simular_por_trozos(
+                trozos_df(precios, p["trozo_filas"]), salida=salida_horaria, **despacho
+            )
+    else:
+        with medir("despacho", filas=len(precios)):
+            if p["bloque"]:
+                resultado = simular_por_bloques(
+                    precios, bloque=p["bloque"], soc_frontera=p["soc_frontera"], **despacho
+                )
+            else:
+                resultado = simular(precios, **despacho)
+        with medir("mensual", filas=len(resultado)):
+            mensual = resumen_mensual(resultado)
+    ingreso_anual = mensual[mensual.index.year == desde.year]["Beneficio neto (€)"].sum()
+    plurianual = None
+    if p["degradacion_despacho"]:
+        with medir("plurianual", filas=len(precios)):
+            plurianual = simular_plurianual(
+                precios,
+                **despacho,
+                degradacion=p["degradacion"],
+                perdida_ciclos=p["perdida_ciclos"],
+            )
+    with medir("finanzas"):
+        fin = modelo_financiero(
+            ingreso_anual,
+            p["potencia_mw"],
+            p["duracion_h"],
+            **economia,
+            ingresos=None if plurianual is None else plurianual["Beneficio neto (€)"],
+        )
+    dias = (hasta - desde).days + 1
+    fila = {
+        "zona": p["zona"],
+        "potencia_mw": p["potencia_mw"],
+        "duracion_h": p["duracion_h"],
+        "estrategia": p["estrategia"],
+        "ingreso_anual": ingreso_anual,
+        "van": fin["van"],
+        "tir": fin["tir"],
+        "tir_equity": fin["tir_equity"],
+        "ciclos_anuales": mensual["Descarga (MWh)"].sum()
+        / (p["potencia_mw"] * p["duracion_h"])
+        / (dias / 365),
+    }
+    if plurianual is not None:
+        fila["capacidad_final"] = plurianual["Capacidad (%)"].iloc[-1]
+
+    sens = {k: p[k] for k in _SENSIBILIDAD}
+    por_duracion = optimizar_duracion if p["adaptativa"] else analizar_duracion
+    por_margen = optimizar_margen if p["adaptativa"] else analizar_margen
+    if p["max_h"]:
+        with medir("sens_duracion", filas=len(precios)):
+            _, fila["duracion_optima"] = por_duracion(
+                precios, max_h=p["max_h"], margen=p["margen"], **sens
+            )
+    if p["max_margen"] and p["estrategia"] == "Margen fijo":
+        with medir("sens_margen", filas=len(precios)):
+            _, fila["margen_optimo"] = por_margen(
+                precios, duracion_h=p["duracion_h"], max_margen=p["max_margen"], **sens
+            )
+    return fila, resultado, mensual
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bess",
+        description="Simula escenarios de BESS sin interfaz gráfica.",
+    )
+    parser.add_argument("parametros", help="archivo JSON de parámetros")
+    parser.add_argument("-o", "--salida", default="salida", help="carpeta de resultados")
+    parser.add_argument(
+        "--detalle",
+        action="store_true",
+        help="escribe también los resultados horarios y mensuales de cada escenario",
+    )
+    parser.add_argument(
+        "--formato",
+        choices=("csv", "csv.gz", "parquet"),
+        default="csv",
+        help="formato de los archivos de --detalle (por defecto csv); con "
+        "trozo_filas el horario se escribe siempre en CSV",
+    )
+    parser.add_argument(
+        "--rendimiento",
+        metavar="RUTA",
+        help="escribe tiempo, memoria máxima y filas de cada etapa como líneas "
+        "JSON en RUTA ('-' para stderr)",
+    )
+    parser.add_argument(
+        "--perfil", metavar="RUTA", help="guarda un perfil de cProfile de la ejecución"
+    )
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    from .rendimiento import Registro, configurar_log, datos_perfil, perfilar
+
+    if args.rendimiento:
+        configurar_log(args.rendimiento)
+    registro = Registro(memoria=bool(args.rendimiento))
+    with registro, perfilar(bool(args.perfil)) as captura:
+        filas = _ejecutar(args, leer_escenarios(args.parametros))
+    if args.perfil:
+        with open(args.perfil, "wb") as f:
+            f.write(datos_perfil(captura["perfil"]))
+
+    pd.DataFrame(filas).to_csv(os.path.join(args.salida, "resumen.csv"), index=False)
+    print(f"{len(filas)} escenarios -> {os.path.join(args.salida, 'resumen.csv')}")
+    return 0
+
+
+def _ejecutar(args, escenarios):
+    """Ejecuta los escenarios y escribe su detalle; devuelve las filas del resumen."""
+    from .datos import cargar_precios
+    from .exportar import FORMATOS, escribir
+    from .rendimiento import medir
+
+    os.makedirs(args.salida, exist_ok=True)
+    series = {}
+    filas = []
+    for i, p in enumerate(escenarios):
+        clave = (p["zona"], p["archivo"])
+        if clave not in series:
+            with medir("cargar_datos") as carga:
+                series[clave] = cargar_precios(p["zona"], p["archivo"])
+                carga["filas"] = len(series[clave])
+        horario = os.path.join(args.salida, f"escenario_{i}_horario.csv")
+        with medir(f"escenario_{i}"):
+            fila, resultado, mensual = ejecutar_escenario(
+                p, series[clave], horario if args.detalle else None
+            )
+        filas.append({"escenario": i, **fila})
+        if args.detalle:
+            extension = FORMATOS[args.formato][0]
+            if resultado is not None:
+                escribir(
+                    resultado,
+                    os.path.join(args.salida, f"escenario_{i}_horario{extension}"),
+                    args.formato,
+                )
+            escribir(
+                mensual,
+                os.path.join(args.salida, f"escenario_{i}_mensual{extension}"),
+                args.formato,
+            )
+    return filas
@@ -0,0 +1,78 @@
+"""Evaluación en paralelo de la misma batería en todas las zonas."""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pandas as pd
+
+from .datos import ALMACEN, ZONAS, leer_almacen
+from .despacho import resumen_mensual, simular
+from .finanzas import modelo_financiero
+
+
+def _evaluar_zona(zona, despacho, economia, desde, hasta, directorio=ALMACEN):
+    """Carga, simula y valora una zona; se ejecuta en un proceso del pool."""
+    precios = leer_almacen(zona, directorio)
+    if precios is None:
+        return None
+    precios = precios[(precios["Fecha"] >= desde) & (precios["Fecha"] <= hasta)]
+    resultado = simular(precios, **despacho)
+    mensual = resumen_mensual(resultado)
+    ingreso_anual = mensual[mensual.index.year == desde.year]["Beneficio neto (€)"].sum()
+    fin = modelo_financiero(
+        ingreso_anual, despacho["potencia_mw"], despacho["duracion_h"], **economia
+    )
+    energia = despacho["potencia_mw"] * despacho["duracion_h"]
+    dias = (hasta - desde).days + 1
+    fila = {
+        "Zona": zona,
+        "Ingreso anual (€)": ingreso_anual,
+        "VAN (€)": fin["van"],
+        "TIR proyecto": fin["tir"],
+        "TIR equity": fin["tir_equity"],
+        "Ciclos/año": resultado["Descarga (MWh)"].sum() / energia / (dias / 365),
+    }
+    return fila, mensual["Beneficio neto (€)"].rename(zona)
+
+
+def comparar_zonas(
+    despacho,
+    economia,
+    desde,
+    hasta,
+    zonas=ZONAS,
+    max_workers=None,
+    directorio=ALMACEN,
+):
+    """Evalúa la misma batería y economía en todas las zonas en paralelo.
+
+    ``despacho`` son los argumentos de ``simular`` (salvo ``precios``) y
+    ``economia`` los de ``modelo_financiero`` (salvo ingreso, potencia y
+    duración). Las zonas se leen del almacén de precios. Devuelve la tabla
+    ordenada por VAN, el beneficio neto mensual con una columna por zona y
+    la lista de zonas omitidas por no estar en el almacén (tabla y mensual
+    son ``None`` si no hay ninguna).
+    """
+    tarea = partial(
+        _evaluar_zona,
+        despacho=despacho,
+        economia=economia,
+        desde=desde,
+        hasta=hasta,
+        directorio=directorio,
+    )
+    workers = max_workers or min(len(zonas), os.cpu_count() or 1)
+    with ProcessPoolExecutor(workers) as pool:
+        salidas = list(pool.map(tarea, zonas))
+    omitidas = [z for z, s in zip(zonas, salidas) if s is None]
+    salidas = [s for s in salidas if s is not None]
+    if not salidas:
+        return None, None, omitidas
+    tabla = (
+        pd.DataFrame([fila for fila, _ in salidas])
+        .sort_values("VAN (€)", ascending=False)
+        .reset_index(drop=True)
+    )
+    tabla.index = pd.RangeIndex(1, len(tabla) + 1, name="Ranking")
+    mensual = pd.concat([m for _, m in salidas], axis=1)
+    return tabla, mensual, omitidas
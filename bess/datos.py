@@ -0,0 +1,209 @@
+"""Carga de precios y almacén columnar en disco (``.npy`` por zona y año)."""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .ingesta import ingerir, ingerir_hojas
+
+ZONAS = ["NORD", "CNORD", "CSUD", "SUD", "SARD", "SICILY", "BZ"]
+
+RUTAS_PREDETERMINADAS = (
+    "Precios_Mercado_Italiano_2024.xlsx",
+    "data/precios_italia_2024.xlsx",
+    "data/precios_italia.xlsx",
+)
+
+ALMACEN = os.environ.get("BESS_ALMACEN", ".bess_almacen")
+
+
+def _huella_arrays(*arrays):
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        h.update(np.ascontiguousarray(a).tobytes())
+    return h.hexdigest()
+
+
+def _leer_manifiesto(directorio):
+    ruta = os.path.join(directorio, "manifiesto.json")
+    if not os.path.exists(ruta):
+        return {"fuentes": {}, "zonas": {}}
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _escribir_manifiesto(directorio, manifiesto):
+    ruta = os.path.join(directorio, "manifiesto.json")
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, indent=1, sort_keys=True)
+    os.replace(tmp, ruta)
+
+
+def _guardar_npy(ruta, array):
+    tmp = f"{ruta}.{os.getpid()}.tmp.npy"
+    np.save(tmp, array)
+    os.replace(tmp, ruta)
+
+
+def guardar_en_almacen(df, zona, directorio=ALMACEN, fuente=None):
+    """Guarda ``df`` en el almacén, particionado por zona y año.
+
+    Solo se reescriben los años cuyo contenido ha cambiado, de modo que añadir
+    un año nuevo de precios no toca los anteriores. Un año presente en ``df``
+    sustituye por completo a la partición existente. Devuelve los años escritos.
+    """
+    manifiesto = _leer_manifiesto(directorio)
+    particiones = manifiesto["zonas"].setdefault(zona, {})
+    df = df.sort_values("Fecha")
+    fechas = pd.to_datetime(df["Fecha"])
+    escritos = []
+    for anio, idx in fechas.groupby(fechas.dt.year).groups.items():
+        fecha = fechas.loc[idx].to_numpy(dtype="datetime64[ns]")
+        precio = df.loc[idx, "Precio"].to_numpy(dtype=np.float64)
+        huella = _huella_arrays(fecha, precio)
+        if particiones.get(str(anio), {}).get("huella") == huella:
+            continue
+        carpeta = os.path.join(directorio, zona, str(anio))
+        os.makedirs(carpeta, exist_ok=True)
+        _guardar_npy(os.path.join(carpeta, "fecha.npy"), fecha)
+        _guardar_npy(os.path.join(carpeta, "precio.npy"), precio)
+        particiones[str(anio)] = {"filas": len(precio), "huella": huella}
+        escritos.append(int(anio))
+    if fuente is not None:
+        zonas = manifiesto["fuentes"].setdefault(fuente, [])
+        if zona not in zonas:
+            zonas.append(zona)
+    _escribir_manifiesto(directorio, manifiesto)
+    return escritos
+
+
+def leer_almacen(zona, directorio=ALMACEN):
+    """Precios de ``zona`` desde el almacén (lectura con mmap) o ``None``."""
+    particiones = _leer_manifiesto(directorio)["zonas"].get(zona)
+    if not particiones:
+        return None
+    fechas, precios = [], []
+    for anio in sorted(particiones, key=int):
+        carpeta = os.path.join(directorio, zona, anio)
+        fechas.append(np.load(os.path.join(carpeta, "fecha.npy"), mmap_mode="r"))
+        precios.append(np.load(os.path.join(carpeta, "precio.npy"), mmap_mode="r"))
+    if len(fechas) == 1:
+        fecha, precio = fechas[0], precios[0]
+    else:
+        fecha, precio = np.concatenate(fechas), np.concatenate(precios)
+    return pd.DataFrame({"Fecha": fecha, "Precio": precio})
+
+
+def _firma_archivo(path):
+    info = os.stat(path)
+    return f"{os.path.abspath(path)}:{info.st_size}:{info.st_mtime_ns}"
+
+
+def _elegir_zona(zona, nombres, fuente):
+    """``zona`` entre los nombres guardados de una fuente.
+
+    Las zonas de un archivo subido se guardan como ``fuente-zona``. Una
+    fuente de una sola zona la devuelve sea cual sea ``zona``; si tiene
+    varias y ninguna es ``zona`` se lanza ``ValueError``.
+    """
+    for nombre in nombres:
+        if nombre == zona or nombre.endswith(f"-{zona}"):
+            return nombre
+    if len(nombres) == 1:
+        return nombres[0]
+    disponibles = [n.removeprefix(f"{fuente}-") for n in nombres]
+    raise ValueError(
+        f"La fuente de precios no tiene la zona {zona!r}; "
+        f"zonas disponibles: {', '.join(disponibles)}"
+    )
+
+
+def _cargar_fuente(fuente, zona, leer, directorio=ALMACEN):
+    """Lee ``zona`` del almacén y solo convierte la fuente si es nueva.
+
+    ``leer`` devuelve ``({zona: DataFrame}, informe)`` con todo el contenido
+    de la fuente ya regularizado (``bess.ingesta``), que se convierte de una
+    vez; el informe de validación se guarda en el manifiesto. Una fuente de
+    una sola zona se devuelve para cualquier ``zona``; en una de varias que
+    no la tiene se lanza ``ValueError``.
+    """
+    manifiesto = _leer_manifiesto(directorio)
+    nombres = manifiesto["fuentes"].get(fuente)
+    if nombres:
+        try:
+            df = leer_almacen(_elegir_zona(zona, nombres, fuente), directorio)
+        except OSError:
+            df = None
+        if df is not None:
+            return df
+    hojas, informe = leer()
+    for nombre, df in hojas.items():
+        guardar_en_almacen(df, nombre, directorio, fuente=fuente)
+    manifiesto = _leer_manifiesto(directorio)
+    # Formato "split": el manifiesto se escribe con las claves ordenadas.
+    manifiesto.setdefault("informes", {})[fuente] = json.loads(
+        informe.reset_index().to_json(orient="split", index=False, date_format="iso")
+    )
+    _escribir_manifiesto(directorio, manifiesto)
+    return leer_almacen(_elegir_zona(zona, list(hojas), fuente), directorio)
+
+
+def ruta_predeterminada():
+    """Primer libro de precios predeterminado que existe."""
+    for path in RUTAS_PREDETERMINADAS:
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(
+        f"Archivo predeterminado no encontrado: {RUTAS_PREDETERMINADAS[0]}"
+    )
+
+
+def _origen(archivo):
+    """Clave de la fuente en el manifiesto y función que la lee."""
+    if archivo is None:
+        path = ruta_predeterminada()
+        return _firma_archivo(path), lambda: ingerir_hojas(
+            pd.read_excel(path, sheet_name=None)
+        )
+    if isinstance(archivo, (str, os.PathLike)):
+        nombre = os.fspath(archivo)
+        with open(nombre, "rb") as f:
+            contenido = f.read()
+    else:
+        nombre, contenido = archivo.name, archivo.getvalue()
+    fuente = f"subida-{hashlib.blake2b(contenido, digest_size=16).hexdigest()}"
+
+    def leer():
+        zonas, informe = ingerir(contenido, nombre)
+        return {
+            fuente if z == "" else f"{fuente}-{z}": df for z, df in zonas.items()
+        }, informe
+
+    return fuente, leer
+
+
+def cargar_precios(zona, archivo=None, directorio=ALMACEN):
+    """Precios de ``zona`` del libro predeterminado, o los de ``archivo``.
+
+    ``archivo`` puede ser una ruta o un objeto con ``name`` y ``getvalue()``
+    (como los archivos subidos en Streamlit), en CSV, CSV.GZ o Excel, con una
+    o varias zonas (ver ``bess.ingesta``). En ambos casos la fuente se
+    convierte una sola vez al almacén y después se lee de él.
+    """
+    fuente, leer = _origen(archivo)
+    return _cargar_fuente(fuente, zona, leer, directorio)
+
+
+def informe_ingesta(archivo=None, directorio=ALMACEN):
+    """Informe de validación guardado al convertir la fuente, o ``None``."""
+    fuente, _ = _origen(archivo)
+    guardado = _leer_manifiesto(directorio).get("informes", {}).get(fuente)
+    if guardado is None:
+        return None
+    informe = pd.DataFrame(guardado["data"], columns=guardado["columns"])
+    for columna in ("Desde", "Hasta"):
+        informe[columna] = pd.to_datetime(informe[columna])
+    return informe.set_index("Zona")
@@ -0,0 +1,952 @@
+"""Despacho horario de la batería: estrategias, índice diario y kernels."""
+import datetime
+import hashlib
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+ESTADOS = np.array(["Reposo", "Carga", "Descarga"], dtype=object)
+
+# Intervalos de la rejilla de SOC de la estrategia "Óptima".
+NIVELES_SOC = 200
+
+
+def simular_referencia(
+    precios,
+    potencia_mw,
+    duracion_h,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    umbral_carga=0.25,
+    umbral_descarga=0.75,
+    margen=0,
+    horario=None,
+    coste_carga=0.0,
+    coste_descarga=0.0,
+):
+    """Implementación de referencia fila a fila de ``simular``."""
+    energia_mwh = potencia_mw * duracion_h
+    capacidad_actual = 0
+    resultados = []
+
+    media_global = precios["Precio"].mean()
+    media_d = (
+        precios.groupby(precios["Fecha"].dt.date)["Precio"].mean().to_dict()
+    )
+    p_inf_d = (
+        precios.groupby(precios["Fecha"].dt.date)["Precio"]
+        .quantile(umbral_carga)
+        .to_dict()
+    )
+    p_sup_d = (
+        precios.groupby(precios["Fecha"].dt.date)["Precio"]
+        .quantile(umbral_descarga)
+        .to_dict()
+    )
+
+    for _, row in precios.iterrows():
+        precio = row["Precio"]
+        fecha_d = row["Fecha"].date()
+        p_inf = p_inf_d.get(fecha_d, media_global)
+        p_sup = p_sup_d.get(fecha_d, media_global)
+        media_dia = media_d.get(fecha_d, media_global)
+        estado = "Reposo"
+        carga = descarga = 0
+
+        if estrategia == "Percentiles":
+            if precio < p_inf and capacidad_actual < energia_mwh:
+                carga = potencia_mw * ef_carga
+                capacidad_actual += carga
+                estado = "Carga"
+            elif precio > p_sup and capacidad_actual > 0:
+                descarga = min(potencia_mw * ef_descarga, capacidad_actual)
+                capacidad_actual -= descarga
+                estado = "Descarga"
+
+        elif estrategia == "Margen fijo":
+            if precio < media_dia - margen and capacidad_actual < energia_mwh:
+                carga = potencia_mw * ef_carga
+                capacidad_actual += carga
+                estado = "Carga"
+            elif precio > media_dia + margen and capacidad_actual > 0:
+                descarga = min(potencia_mw * ef_descarga, capacidad_actual)
+                capacidad_actual -= descarga
+                estado = "Descarga"
+
+        elif estrategia == "Programada" and horario is not None:
+            accion = horario.get(row["Fecha"].hour)
+            if accion == "C" and capacidad_actual < energia_mwh:
+                carga = potencia_mw * ef_carga
+                capacidad_actual += carga
+                estado = "Carga"
+            elif accion == "D" and capacidad_actual > 0:
+                descarga = min(potencia_mw * ef_descarga, capacidad_actual)
+                capacidad_actual -= descarga
+                estado = "Descarga"
+
+        coste_c = coste_carga * carga
+        coste_d = coste_descarga * descarga
+        benef_bruto = precio * descarga - precio * carga
+        benef_neto = benef_bruto - coste_c - coste_d
+
+        resultados.append({
+            "Fecha": row["Fecha"],
+            "Precio": precio,
+            "Carga (MWh)": carga,
+            "Descarga (MWh)": descarga,
+            "Coste carga (€)": coste_c,
+            "Coste descarga (€)": coste_d,
+            "Beneficio bruto (€)": benef_bruto,
+            "Beneficio neto (€)": benef_neto,
+            "SOC (MWh)": capacidad_actual,
+            "Estado": estado,
+        })
+
+    return pd.DataFrame(resultados)
+
+
+@dataclass(frozen=True)
+class IndiceDiario:
+    """Estadísticas diarias precalculadas de una serie de precios.
+
+    ``ordenados`` contiene los precios de cada día ordenados y concatenados;
+    el día ``d`` ocupa ``ordenados[inicio[d]:inicio[d] + filas[d]]``, de modo
+    que cualquier percentil es una consulta sin reagrupar.
+    """
+
+    codigo: np.ndarray
+    inicio: np.ndarray
+    filas: np.ndarray
+    validos: np.ndarray
+    ordenados: np.ndarray
+    media: np.ndarray
+
+    def cuantil(self, q):
+        """Percentil ``q`` de cada día con la interpolación lineal de pandas."""
+        pos = q * (self.validos - 1.0)
+        lo = pos.astype(np.int64)
+        frac = pos % 1
+        base = self.inicio + np.clip(lo, 0, None)
+        val = self.ordenados[np.minimum(base, len(self.ordenados) - 1)]
+        sig = self.ordenados[np.minimum(base + 1, len(self.ordenados) - 1)]
+        out = np.where(frac == 0.0, val, val + (sig - val) * frac)
+        return np.where(self.validos > 0, out, np.nan)
+
+    def difundir(self, por_dia):
+        """Valor diario asignado a cada fila de la serie original."""
+        return por_dia[self.codigo]
+
+
+_INDICES = OrderedDict()
+_MAX_INDICES = 16
+
+
+def _huella_precios(precios):
+    """Hash del contenido de las columnas ``Fecha`` y ``Precio``."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(precios["Fecha"].to_numpy(dtype="datetime64[ns]").tobytes())
+    h.update(precios["Precio"].to_numpy(dtype=float).tobytes())
+    return h.hexdigest()
+
+
+def indice_diario(precios):
+    """Índice diario de ``precios``, reutilizado entre llamadas (LRU acotado)."""
+    clave = _huella_precios(precios)
+    if clave in _INDICES:
+        _INDICES.move_to_end(clave)
+        return _INDICES[clave]
+
+    precio = precios["Precio"].to_numpy(dtype=float)
+    dias = precios["Fecha"].to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+    _, codigo = np.unique(dias, return_inverse=True)
+    orden = np.lexsort((precio, codigo))
+    filas = np.bincount(codigo)
+    inicio = np.concatenate(([0], np.cumsum(filas)[:-1]))
+    validos = np.bincount(codigo, weights=~np.isnan(precio)).astype(np.int64)
+    indice = IndiceDiario(
+        codigo=codigo,
+        inicio=inicio,
+        filas=filas,
+        validos=validos,
+        ordenados=precio[orden],
+        media=pd.Series(precio).groupby(codigo).mean().to_numpy(),
+    )
+
+    _INDICES[clave] = indice
+    if len(_INDICES) > _MAX_INDICES:
+        _INDICES.popitem(last=False)
+    return indice
+
+
+def _inicio_ventana(fecha, ventana_dias):
+    """Primera fila de la ventana ``[t - ventana_dias, t)`` de cada fila."""
+    return np.searchsorted(fecha, fecha - np.timedelta64(int(ventana_dias), "D"))
+
+
+def cuantiles_moviles(precios, ventana_dias, cuantiles):
+    """Percentiles causales: los de los ``ventana_dias`` días anteriores a cada fila.
+
+    La ventana de una fila son las filas con fecha en ``[t - ventana_dias, t)``,
+    es decir, solo precios ya conocidos. Se mantiene una lista ordenada de la
+    ventana: cada fila que entra se inserta con ``insort`` y cada una que
+    sale se localiza con ``bisect``, así que todos los ``cuantiles`` se
+    obtienen en una sola pasada. Misma interpolación lineal que pandas.
+    Devuelve un array ``(n, len(cuantiles))``; las filas sin historia son NaN.
+    """
+    fecha = precios["Fecha"].to_numpy(dtype="datetime64[ns]")
+    precio = precios["Precio"].to_numpy(dtype=float).tolist()
+    cuantiles = np.atleast_1d(np.asarray(cuantiles, dtype=float)).tolist()
+    desde = _inicio_ventana(fecha, ventana_dias).tolist()
+    salida = np.full((len(precio), len(cuantiles)), np.nan)
+    fila = [np.nan] * len(cuantiles)
+    ventana = []
+    j = 0
+    for i, p in enumerate(precio):
+        while j < desde[i]:
+            v = precio[j]
+            if v == v:
+                del ventana[bisect_left(ventana, v)]
+            j += 1
+        m = len(ventana)
+        if m:
+            for k, q in enumerate(cuantiles):
+                pos = q * (m - 1)
+                lo = int(pos)
+                frac = pos - lo
+                a = ventana[lo]
+                fila[k] = a + (ventana[lo + 1] - a) * frac if frac else a
+            salida[i] = fila
+        if p == p:
+            insort(ventana, p)
+    return salida
+
+
+def media_movil(precios, ventana_dias):
+    """Media causal de los ``ventana_dias`` días anteriores a cada fila."""
+    fecha = precios["Fecha"].to_numpy(dtype="datetime64[ns]")
+    precio = precios["Precio"].to_numpy(dtype=float)
+    validos = ~np.isnan(precio)
+    suma = np.concatenate(([0.0], np.cumsum(np.where(validos, precio, 0.0))))
+    cuenta = np.concatenate(([0], np.cumsum(validos)))
+    desde = _inicio_ventana(fecha, ventana_dias)
+    hasta = np.arange(len(precio))
+    filas = cuenta[hasta] - cuenta[desde]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(filas > 0, (suma[hasta] - suma[desde]) / filas, np.nan)
+
+
+def _limites(
+    precios,
+    estrategia,
+    umbral_carga=0.25,
+    umbral_descarga=0.75,
+    horario=None,
+    ventana_dias=0,
+):
+    """Límites horarios de la estrategia antes de aplicar el margen.
+
+    Se quiere cargar cuando ``precio < lim_c - margen`` y descargar cuando
+    ``precio > lim_d + margen``. Las estadísticas diarias salen del
+    ``IndiceDiario`` de la serie y se difunden a cada fila. Con
+    ``ventana_dias`` se usan en su lugar las estadísticas causales de los
+    días anteriores (``cuantiles_moviles`` y ``media_movil``).
+    """
+    n = len(precios)
+    lim_c = np.full(n, -np.inf)
+    lim_d = np.full(n, np.inf)
+
+    if estrategia in ("Percentiles", "Margen fijo") and ventana_dias:
+        if estrategia == "Percentiles":
+            lim_c, lim_d = cuantiles_moviles(
+                precios, ventana_dias, (umbral_carga, umbral_descarga)
+            ).T
+        else:
+            lim_c = lim_d = media_movil(precios, ventana_dias)
+    elif estrategia in ("Percentiles", "Margen fijo"):
+        indice = indice_diario(precios)
+        if estrategia == "Percentiles":
+            lim_c = indice.difundir(indice.cuantil(umbral_carga))
+            lim_d = indice.difundir(indice.cuantil(umbral_descarga))
+        else:
+            lim_c = lim_d = indice.difundir(indice.media)
+    elif estrategia == "Programada" and horario is not None:
+        accion = np.array([horario.get(h) for h in range(24)], dtype=object)
+        hora = precios["Fecha"].dt.hour.to_numpy()
+        lim_c = np.where(accion == "C", np.inf, -np.inf)[hora]
+        lim_d = np.where(accion == "D", -np.inf, np.inf)[hora]
+
+    return lim_c, lim_d
+
+
+def _senales(
+    precios,
+    estrategia,
+    umbral_carga=0.25,
+    umbral_descarga=0.75,
+    margen=0,
+    horario=None,
+    ventana_dias=0,
+):
+    """Señal horaria de la estrategia: bit 1 = quiere cargar, bit 2 = quiere descargar."""
+    precio = precios["Precio"].to_numpy(dtype=float)
+    lim_c, lim_d = _limites(
+        precios, estrategia, umbral_carga, umbral_descarga, horario, ventana_dias
+    )
+    off = margen if estrategia == "Margen fijo" else 0
+    quiere_c = precio < lim_c - off
+    quiere_d = precio > lim_d + off
+    return quiere_c.astype(np.int8) | (quiere_d.astype(np.int8) << 1)
+
+
+def _despachar(
+    senal, potencia_mw, energia_mwh, ef_carga, ef_descarga, soc_inicial=0.0
+):
+    """Recurrencia del SOC sobre las señales horarias.
+
+    Devuelve arrays de carga, descarga, SOC y código de estado
+    (0 = Reposo, 1 = Carga, 2 = Descarga) con las mismas reglas que
+    ``simular_referencia``: si la carga no es posible se evalúa la descarga.
+    """
+    n = len(senal)
+    paso_c = potencia_mw * ef_carga
+    paso_d = potencia_mw * ef_descarga
+    carga = [0.0] * n
+    descarga = [0.0] * n
+    soc = [0.0] * n
+    estado = [0] * n
+    nivel = soc_inicial
+    for i, s in enumerate(senal.tolist()):
+        if s & 1 and nivel < energia_mwh:
+            carga[i] = paso_c
+            nivel += paso_c
+            estado[i] = 1
+        elif s & 2 and nivel > 0:
+            d = min(paso_d, nivel)
+            descarga[i] = d
+            nivel -= d
+            estado[i] = 2
+        soc[i] = nivel
+    return (
+        np.array(carga),
+        np.array(descarga),
+        np.array(soc),
+        np.array(estado, dtype=np.int8),
+    )
+
+
+# Celdas (horas x carriles) de los buffers intermedios de ``_despachar_lote``.
+_BLOQUE_LOTE = 1 << 20
+
+
+def _despachar_lote(
+    precio,
+    lim_c,
+    lim_d,
+    off_c,
+    off_d,
+    paso_c,
+    paso_d,
+    energia_mwh,
+    grupo,
+    n_grupos,
+    carril_c=None,
+    carril_d=None,
+    carril_p=None,
+):
+    """Despacho simultáneo de ``k`` variantes (carriles) en una sola pasada.
+
+    Cada carril ``j`` tiene su propio SOC y carga en la hora ``i`` si
+    ``precio[i] < lim_c[i] - off_c[j]`` (descarga con ``lim_d + off_d``), con
+    las mismas reglas que ``_despachar``. ``off_*``, ``paso_*`` y
+    ``energia_mwh`` se difunden a ``k`` carriles. ``lim_c`` y ``lim_d`` también
+    pueden ser matrices ``(n, m)`` con varios límites por hora: el carril
+    ``j`` usa la columna ``carril_c[j]`` de ``lim_c`` (y ``carril_d[j]`` de
+    ``lim_d``). En lugar de series horarias se acumulan totales por grupo
+    (p. ej. año), arrays ``(n_grupos, k)``. Del mismo modo, ``precio`` puede
+    ser una matriz ``(n, z)`` con una serie por zona en un eje temporal común:
+    el carril ``j`` opera con la columna ``carril_p[j]`` (``NaN`` donde la
+    zona no tiene precio).
+    """
+    off_c, off_d, paso_c, paso_d, energia_mwh = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(x, dtype=float))
+          for x in (off_c, off_d, paso_c, paso_d, energia_mwh))
+    )
+    k = len(energia_mwh)
+    # Con una sola columna los límites se guardan como vector: la comparación
+    # de cada hora es con un escalar.
+    lim_c = np.asarray(lim_c, dtype=float).reshape(len(precio), -1)
+    lim_d = np.asarray(lim_d, dtype=float).reshape(len(precio), -1)
+    lim_c = lim_c[:, 0] if lim_c.shape[1] == 1 else lim_c
+    lim_d = lim_d[:, 0] if lim_d.shape[1] == 1 else lim_d
+    if precio.ndim == 2 and precio.shape[1] == 1:
+        precio = precio[:, 0]
+    soc = np.zeros(k)
+    tot = {
+        c: np.zeros((n_grupos, k))
+        for c in ("Carga (MWh)", "Descarga (MWh)", "Compra (€)", "Venta (€)")
+    }
+    comunes = (
+        np.ptp(off_c) == 0
+        and np.ptp(off_d) == 0
+        and lim_c.ndim == lim_d.ndim == precio.ndim == 1
+    )
+    nunca = np.zeros(k, dtype=bool)
+
+    # Las horas en las que ningún carril quiere operar no cambian el SOC.
+    if precio.ndim == 1:
+        activo = (
+            precio < (lim_c if lim_c.ndim == 1 else lim_c.max(axis=1)) - off_c.min()
+        ) | (precio > (lim_d if lim_d.ndim == 1 else lim_d.min(axis=1)) + off_d.min())
+    else:
+        # Cada combinación de columnas (precio, límites) que usa algún carril.
+        lc = lim_c.reshape(len(precio), -1)
+        ld = lim_d.reshape(len(precio), -1)
+        cero = np.zeros(k, dtype=np.intp)
+        pares = zip(
+            carril_p.tolist(),
+            (carril_c if lim_c.ndim == 2 else cero).tolist(),
+            (carril_d if lim_d.ndim == 2 else cero).tolist(),
+        )
+        activo = np.zeros(len(precio), dtype=bool)
+        for zp, zc, zd in set(pares):
+            activo |= (precio[:, zp] < lc[:, zc] - off_c.min()) | (
+                precio[:, zp] > ld[:, zd] + off_d.min()
+            )
+    horas = np.flatnonzero(activo)
+    filas = max(1, _BLOQUE_LOTE // k)
+    for inicio in range(0, len(horas), filas):
+        idx = horas[inicio:inicio + filas]
+        buf_c = np.zeros((len(idx), k))
+        buf_d = np.zeros((len(idx), k))
+        p = precio[idx, None] if precio.ndim == 1 else precio[idx][:, carril_p]
+        if not comunes:
+            # Qué carriles quieren operar en cada hora del bloque, de una vez.
+            lc = lim_c[idx, None] if lim_c.ndim == 1 else lim_c[idx][:, carril_c]
+            ld = lim_d[idx, None] if lim_d.ndim == 1 else lim_d[idx][:, carril_d]
+            quiere_c = p < lc - off_c
+            quiere_d = p > ld + off_d
+        for j, i in enumerate(idx.tolist()):
+            if comunes:
+                # Umbral compartido: la decisión de querer operar es escalar.
+                c = (soc < energia_mwh) if precio[i] < lim_c[i] - off_c[0] else nunca
+                quiere = precio[i] > lim_d[i] + off_d[0]
+            else:
+                c = quiere_c[j] & (soc < energia_mwh)
+                quiere = quiere_d[j]
+            d = ~c & quiere & (soc > 0)
+            carga = c * paso_c
+            descarga = d * np.minimum(paso_d, soc)
+            soc = soc + carga - descarga
+            buf_c[j] = carga
+            buf_d[j] = descarga
+        g = grupo[idx]
+        # Con varias zonas, una hora activa en una puede no tener precio en otra.
+        p = np.nan_to_num(p)
+        np.add.at(tot["Carga (MWh)"], g, buf_c)
+        np.add.at(tot["Descarga (MWh)"], g, buf_d)
+        np.add.at(tot["Compra (€)"], g, p * buf_c)
+        np.add.at(tot["Venta (€)"], g, p * buf_d)
+    return tot
+
+
+def _despacho_optimo(
+    precio,
+    paso_c,
+    paso_d,
+    energia_mwh,
+    coste_carga=0.0,
+    coste_descarga=0.0,
+    niveles=NIVELES_SOC,
+    soc_inicial=0.0,
+    soc_final=None,
+):
+    """Programa de carga y descarga que maximiza el beneficio neto.
+
+    Programación dinámica con previsión perfecta sobre una rejilla de
+    ``niveles + 1`` estados de SOC entre 0 y ``energia_mwh``, con la misma
+    contabilidad que el resto de estrategias: en cada hora el SOC puede subir
+    hasta ``paso_c`` (se compra a ``precio + coste_carga``) o bajar hasta
+    ``paso_d`` (se vende a ``precio - coste_descarga``). Como el valor de la
+    acción es lineal en la energía, el mejor destino de cada estado es un
+    máximo en ventana deslizante sobre el valor futuro. Se parte de
+    ``soc_inicial`` (MWh) y, si se indica ``soc_final``, se obliga a terminar
+    en ese nivel; si no, la energía que queda al final no tiene valor.
+    Devuelve carga, descarga, SOC y código de estado como ``_despachar``.
+
+    No es una cota estricta de las demás estrategias. Los pasos se redondean
+    hacia abajo a la rejilla (``floor(paso_c / delta)``): con 200 niveles,
+    10 MW y 4 h el beneficio de NORD 2024 queda un 0,14 % por debajo del
+    de 2000 niveles. Además, las heurísticas cargan un paso completo
+    mientras el SOC no llega a ``energia_mwh``, así que pueden superarla.
+    """
+    n = len(precio)
+    if energia_mwh <= 0 or n == 0:
+        cero = np.zeros(n)
+        return cero, cero.copy(), cero.copy(), np.zeros(n, dtype=np.int8)
+    delta = energia_mwh / niveles
+    kc = min(niveles, int(np.floor(paso_c / delta + 1e-9)))
+    kd = min(niveles, int(np.floor(paso_d / delta + 1e-9)))
+    nivel = np.arange(niveles + 1)
+    relleno_c = np.full(kc, -np.inf)
+    relleno_d = np.full(kd, -np.inf)
+    destino = np.empty((n, niveles + 1), dtype=np.int16 if niveles < 2**15 else np.int32)
+
+    # Recorrido hacia atrás: ``valor[s]`` es el beneficio óptimo desde la hora
+    # siguiente partiendo del nivel ``s``.
+    valor = np.zeros(niveles + 1)
+    if soc_final is not None:
+        valor[:] = -np.inf
+        valor[int(round(soc_final / delta))] = 0.0
+    for t in range(n - 1, -1, -1):
+        p = precio[t]
+        if np.isnan(p):
+            destino[t] = nivel
+            continue
+        # Cargar de s a j >= s: a*s + max(valor[j] - a*j), con a = coste por escalón.
+        a = (p + coste_carga) * delta * nivel
+        w = valor - a
+        j_c = sliding_window_view(np.concatenate((w, relleno_c)), kc + 1).argmax(axis=1)
+        j_c += nivel
+        v_c = w[j_c] + a
+        # Descargar de s a j <= s: b*s + max(valor[j] - b*j).
+        b = (p - coste_descarga) * delta * nivel
+        u = valor - b
+        j_d = sliding_window_view(np.concatenate((relleno_d, u)), kd + 1).argmax(axis=1)
+        j_d += nivel - kd
+        v_d = u[j_d] + b
+        # En caso de empate se prefiere la ventana de carga, que empieza en reposo.
+        descargar = v_d > v_c
+        destino[t] = np.where(descargar, j_d, j_c)
+        valor = np.where(descargar, v_d, v_c)
+
+    inicio = int(round(soc_inicial / delta))
+    camino = np.empty(n, dtype=np.int64)
+    s = inicio
+    for t, fila in enumerate(destino):
+        s = fila[s]
+        camino[t] = s
+    soc = camino * delta
+    cambio = np.diff(camino, prepend=inicio)
+    carga = np.clip(cambio, 0, None) * delta
+    descarga = np.clip(-cambio, 0, None) * delta
+    estado = np.sign(cambio).astype(np.int8)
+    estado[estado < 0] = 2
+    return carga, descarga, soc, estado
+
+
+def _optimo_anual(
+    precio, paso_c, paso_d, energias, grupo, n_grupos, coste_carga, coste_descarga
+):
+    """Totales por grupo de ``_despacho_optimo`` para varias capacidades.
+
+    Mismo formato que ``_despachar_lote``; la estrategia "Óptima" no tiene
+    umbrales que compartir, así que cada capacidad se resuelve por separado.
+    ``paso_c`` y ``paso_d`` pueden ser también un valor por capacidad.
+    """
+    paso_c, paso_d, energias = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(x, dtype=float)) for x in (paso_c, paso_d, energias))
+    )
+    tot = {
+        c: np.zeros((n_grupos, len(energias)))
+        for c in ("Carga (MWh)", "Descarga (MWh)", "Compra (€)", "Venta (€)")
+    }
+    precio_0 = np.nan_to_num(precio)
+    for j, energia in enumerate(energias):
+        carga, descarga, _soc, _estado = _despacho_optimo(
+            precio, paso_c[j], paso_d[j], energia, coste_carga, coste_descarga
+        )
+        tot["Carga (MWh)"][:, j] = np.bincount(grupo, carga, n_grupos)
+        tot["Descarga (MWh)"][:, j] = np.bincount(grupo, descarga, n_grupos)
+        tot["Compra (€)"][:, j] = np.bincount(grupo, precio_0 * carga, n_grupos)
+        tot["Venta (€)"][:, j] = np.bincount(grupo, precio_0 * descarga, n_grupos)
+    return tot
+
+
+def _beneficio_neto(tot, coste_carga, coste_descarga):
+    """Beneficio neto a partir de los totales de ``_despachar_lote``."""
+    return (
+        tot["Venta (€)"]
+        - tot["Compra (€)"]
+        - coste_carga * tot["Carga (MWh)"]
+        - coste_descarga * tot["Descarga (MWh)"]
+    )
+
+
+def simular(
+    precios,
+    potencia_mw,
+    duracion_h,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    umbral_carga=0.25,
+    umbral_descarga=0.75,
+    margen=0,
+    horario=None,
+    coste_carga=0.0,
+    coste_descarga=0.0,
+    ventana_dias=0,
+    compacto=False,
+    dtype=np.float64,
+):
+    """Simula la operación horaria de la batería sobre arrays de NumPy.
+
+    Produce el mismo DataFrame que ``simular_referencia`` (que se mantiene
+    como implementación de referencia) sin recorrer ``iterrows``. La
+    estrategia "Óptima" sustituye las señales por ``_despacho_optimo``. Con
+    ``ventana_dias`` los umbrales de "Percentiles" y "Margen fijo" son
+    causales (ver ``_limites``); con 0 salen del mismo día, como en la
+    referencia. Con ``compacto=True`` devuelve un ``ResultadoCompacto`` en lugar del DataFrame,
+    con las columnas de energía en ``dtype``.
+    """
+    energia_mwh = potencia_mw * duracion_h
+    precio = precios["Precio"].to_numpy(dtype=float)
+    if estrategia == "Óptima":
+        carga, descarga, soc, estado = _despacho_optimo(
+            precio,
+            potencia_mw * ef_carga,
+            potencia_mw * ef_descarga,
+            energia_mwh,
+            coste_carga,
+            coste_descarga,
+        )
+    else:
+        senal = _senales(
+            precios,
+            estrategia,
+            umbral_carga,
+            umbral_descarga,
+            margen,
+            horario,
+            ventana_dias,
+        )
+        carga, descarga, soc, estado = _despachar(
+            senal, potencia_mw, energia_mwh, ef_carga, ef_descarga
+        )
+
+    if compacto:
+        return ResultadoCompacto(
+            precios["Fecha"].to_numpy(),
+            precio,
+            carga,
+            descarga,
+            soc,
+            estado,
+            coste_carga,
+            coste_descarga,
+            dtype,
+        )
+    return _resultado(
+        precios, carga, descarga, soc, estado, coste_carga, coste_descarga
+    )
+
+
+def _resultado(precios, carga, descarga, soc, estado, coste_carga, coste_descarga):
+    """DataFrame horario de ``simular`` a partir de los arrays del despacho."""
+    return ResultadoCompacto(
+        precios["Fecha"].to_numpy(),
+        precios["Precio"].to_numpy(dtype=float),
+        carga,
+        descarga,
+        soc,
+        estado,
+        coste_carga,
+        coste_descarga,
+    ).to_frame()
+
+
+@dataclass(frozen=True)
+class IndiceFechas:
+    """Posiciones de inicio y fin de cada día y de cada mes de una serie ordenada.
+
+    Se construye una vez por resultado; localizar un día o un mes es una
+    consulta en un diccionario en lugar de recorrer la columna de fechas.
+    """
+
+    dias: dict
+    meses: dict
+
+    @classmethod
+    def construir(cls, fecha):
+        def tramos(claves):
+            cortes = np.flatnonzero(claves[1:] != claves[:-1]) + 1
+            inicio = np.concatenate(([0], cortes))
+            fin = np.concatenate((cortes, [len(claves)]))
+            return dict(zip(claves[inicio].tolist(), zip(inicio.tolist(), fin.tolist())))
+
+        if not len(fecha):
+            return cls({}, {})
+        return cls(
+            tramos(fecha.astype("datetime64[D]")),
+            tramos(fecha.astype("datetime64[M]")),
+        )
+
+    def anios(self):
+        return sorted({m.year for m in self.meses})
+
+    def meses_de(self, anio):
+        return [m.month for m in sorted(self.meses) if m.year == anio]
+
+
+class ResultadoCompacto:
+    """Resultado horario de ``simular`` en formato compacto.
+
+    Solo se guardan la fecha, el precio, el SOC, el código de estado (int8) y
+    un único flujo de energía con signo (positivo al cargar, negativo al
+    descargar; en cada hora solo una de las dos es distinta de cero). Las
+    columnas en € se calculan al pedirlas. ``dtype=np.float32`` reduce además
+    las columnas de energía a la mitad. ``to_frame`` devuelve el DataFrame con
+    el esquema completo, pensado para mostrar o exportar.
+    """
+
+    COLUMNAS = (
+        "Fecha",
+        "Precio",
+        "Carga (MWh)",
+        "Descarga (MWh)",
+        "Coste carga (€)",
+        "Coste descarga (€)",
+        "Beneficio bruto (€)",
+        "Beneficio neto (€)",
+        "SOC (MWh)",
+        "Estado",
+    )
+
+    def __init__(
+        self,
+        fecha,
+        precio,
+        carga,
+        descarga,
+        soc,
+        estado,
+        coste_carga=0.0,
+        coste_descarga=0.0,
+        dtype=np.float64,
+    ):
+        self.fecha = np.asarray(fecha, dtype="datetime64[ns]")
+        self.precio = np.asarray(precio, dtype=float)
+        self.flujo = (np.asarray(carga) - np.asarray(descarga)).astype(dtype)
+        self.soc = np.asarray(soc).astype(dtype)
+        self.estado = np.asarray(estado, dtype=np.int8)
+        self.coste_carga = coste_carga
+        self.coste_descarga = coste_descarga
+
+    def __len__(self):
+        return len(self.fecha)
+
+    @property
+    def nbytes(self):
+        return sum(
+            a.nbytes for a in (self.fecha, self.precio, self.flujo, self.soc, self.estado)
+        )
+
+    def columna(self, nombre):
+        """Array de la columna ``nombre`` del esquema de ``simular``."""
+        if nombre == "Fecha":
+            return self.fecha
+        if nombre == "Precio":
+            return self.precio
+        if nombre == "SOC (MWh)":
+            return self.soc.astype(float)
+        if nombre == "Estado":
+            return ESTADOS[self.estado]
+        flujo = self.flujo.astype(float)
+        carga = np.where(self.estado == 1, flujo, 0.0)
+        descarga = np.where(self.estado == 2, -flujo, 0.0)
+        if nombre == "Carga (MWh)":
+            return carga
+        if nombre == "Descarga (MWh)":
+            return descarga
+        if nombre == "Coste carga (€)":
+            return self.coste_carga * carga
+        if nombre == "Coste descarga (€)":
+            return self.coste_descarga * descarga
+        bruto = self.precio * descarga - self.precio * carga
+        if nombre == "Beneficio bruto (€)":
+            return bruto
+        if nombre == "Beneficio neto (€)":
+            return bruto - self.coste_carga * carga - self.coste_descarga * descarga
+        raise KeyError(nombre)
+
+    def __getitem__(self, nombre):
+        return pd.Series(self.columna(nombre), name=nombre)
+
+    @property
+    def indice(self):
+        """``IndiceFechas`` del resultado, construido en el primer acceso."""
+        if getattr(self, "_indice", None) is None:
+            self._indice = IndiceFechas.construir(self.fecha)
+        return self._indice
+
+    def _filas(self, a, b):
+        parte = object.__new__(ResultadoCompacto)
+        parte.__dict__.update(self.__dict__)
+        for nombre in ("fecha", "precio", "flujo", "soc", "estado"):
+            setattr(parte, nombre, getattr(self, nombre)[a:b])
+        parte._indice = None
+        return parte
+
+    def dia(self, fecha):
+        """Filas del día ``fecha`` (``datetime.date``)."""
+        return self._filas(*self.indice.dias.get(fecha, (0, 0)))
+
+    def mes(self, anio, mes):
+        """Filas del mes ``mes`` del año ``anio``."""
+        clave = datetime.date(int(anio), int(mes), 1)
+        return self._filas(*self.indice.meses.get(clave, (0, 0)))
+
+    def entre(self, desde, hasta):
+        """Filas con ``desde <= Fecha < hasta`` (vistas, sin copiar)."""
+        a, b = np.searchsorted(self.fecha, pd.to_datetime([desde, hasta]).to_numpy())
+        return self._filas(a, b)
+
+    def to_frame(self, columnas=None):
+        """DataFrame con el esquema de ``simular`` (o solo ``columnas``)."""
+        columnas = self.COLUMNAS if columnas is None else columnas
+        return pd.DataFrame({c: self.columna(c) for c in columnas})
+
+    def head(self, n=5):
+        return self._filas(0, n).to_frame()
+
+    def to_csv(self, *args, **kwargs):
+        return self.to_frame().to_csv(*args, **kwargs)
+
+
+def simular_duraciones(
+    precios,
+    potencia_mw,
+    duraciones,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    umbral_carga=0.25,
+    umbral_descarga=0.75,
+    margen=0,
+    horario=None,
+    coste_carga=0.0,
+    coste_descarga=0.0,
+    ventana_dias=0,
+):
+    """Beneficio neto anual de varias duraciones en una sola pasada.
+
+    Los umbrales se calculan una vez y se comparten; el SOC es un vector con
+    un elemento por duración. Devuelve un DataFrame indexado por año con una
+    columna por duración.
+    """
+    duraciones = np.asarray(duraciones, dtype=float)
+    precio = precios["Precio"].to_numpy(dtype=float)
+    anios, grupo = np.unique(precios["Fecha"].dt.year.to_numpy(), return_inverse=True)
+    if estrategia == "Óptima":
+        tot = _optimo_anual(
+            precio,
+            potencia_mw * ef_carga,
+            potencia_mw * ef_descarga,
+            potencia_mw * duraciones,
+            grupo,
+            len(anios),
+            coste_carga,
+            coste_descarga,
+        )
+    else:
+        lim_c, lim_d = _limites(
+            precios, estrategia, umbral_carga, umbral_descarga, horario, ventana_dias
+        )
+        off = margen if estrategia == "Margen fijo" else 0
+        tot = _despachar_lote(
+            precio,
+            lim_c,
+            lim_d,
+            off,
+            off,
+            potencia_mw * ef_carga,
+            potencia_mw * ef_descarga,
+            potencia_mw * duraciones,
+            grupo,
+            len(anios),
+        )
+    return pd.DataFrame(
+        _beneficio_neto(tot, coste_carga, coste_descarga),
+        index=pd.Index(anios, name="Año"),
+        columns=duraciones,
+    )
+
+
+def simular_margenes(
+    precios,
+    potencia_mw,
+    duracion_h,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    margenes,
+    umbral_carga=0.25,
+    umbral_descarga=0.75,
+    horario=None,
+    coste_carga=0.0,
+    coste_descarga=0.0,
+    ventana_dias=0,
+):
+    """Beneficio neto anual de varios márgenes en una sola pasada.
+
+    El margen es un eje adicional sobre la tabla de medias diarias compartida,
+    con un SOC por margen. Devuelve un DataFrame indexado por año con una
+    columna por margen.
+    """
+    margenes = np.asarray(margenes, dtype=float)
+    precio = precios["Precio"].to_numpy(dtype=float)
+    anios, grupo = np.unique(precios["Fecha"].dt.year.to_numpy(), return_inverse=True)
+    if estrategia == "Óptima":
+        # El óptimo no depende del margen: se resuelve una vez y se repite.
+        tot = _optimo_anual(
+            precio,
+            potencia_mw * ef_carga,
+            potencia_mw * ef_descarga,
+            potencia_mw * duracion_h,
+            grupo,
+            len(anios),
+            coste_carga,
+            coste_descarga,
+        )
+        tot = {c: np.repeat(v, len(margenes), axis=1) for c, v in tot.items()}
+    else:
+        lim_c, lim_d = _limites(
+            precios, estrategia, umbral_carga, umbral_descarga, horario, ventana_dias
+        )
+        off = margenes if estrategia == "Margen fijo" else np.zeros_like(margenes)
+        tot = _despachar_lote(
+            precio,
+            lim_c,
+            lim_d,
+            off,
+            off,
+            potencia_mw * ef_carga,
+            potencia_mw * ef_descarga,
+            potencia_mw * duracion_h,
+            grupo,
+            len(anios),
+        )
+    return pd.DataFrame(
+        _beneficio_neto(tot, coste_carga, coste_descarga),
+        index=pd.Index(anios, name="Año"),
+        columns=margenes,
+    )
+
+
+def resumen_mensual(df):
+    if isinstance(df, ResultadoCompacto):
+        df = df.to_frame(
+            ["Fecha", "Carga (MWh)", "Descarga (MWh)", "Beneficio neto (€)"]
+        )
+    return (
+        df.resample("ME", on="Fecha")
+          .agg({"Carga (MWh)": "sum",
+                "Descarga (MWh)": "sum",
+                "Beneficio neto (€)": "sum"})
+          .rename_axis("Mes")
+    )
@@ -0,0 +1,369 @@
+"""Cálculo por etapas con entradas declaradas y recálculo incremental.
+
+Cada ``Etapa`` declara de qué parámetros y de qué etapas anteriores depende.
+Su huella es el hash de esas entradas (las etapas anteriores aportan su propia
+huella), así que al cambiar un parámetro solo se recalculan las etapas que
+dependen de él, directa o indirectamente. Cambiar la tasa de descuento o el
+apalancamiento, por ejemplo, rehace las finanzas sin volver a despachar.
+
+El despacho y los barridos (duración, margen y rejilla 2D) pasan además por
+``CACHE``, así que sus resultados se comparten entre sesiones y sobreviven a
+un reinicio; el recuerdo de cada ``Canalizacion`` es solo de su sesión.
+"""
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+import pandas as pd
+
+from .cache import CACHE, huella_parametros
+from .despacho import (
+    ResultadoCompacto,
+    _huella_precios,
+    indice_diario,
+    resumen_mensual,
+    simular,
+)
+from .finanzas import modelo_financiero
+from .montecarlo import simular_montecarlo
+from .plurianual import simular_plurianual
+from .rejilla import simular_rejilla, valorar_rejilla
+from .rendimiento import medir, registro_activo
+from .sensibilidad import (
+    barrer_duraciones,
+    barrer_margenes,
+    optimizar_duracion,
+    optimizar_margen,
+    valorar_duraciones,
+    valorar_margenes,
+)
+from .tecnologias import TECHS
+
+
+@dataclass(frozen=True)
+class Etapa:
+    """Paso del cálculo: ``funcion`` recibe sus ``entradas`` por nombre."""
+
+    nombre: str
+    entradas: tuple
+    funcion: Callable
+
+
+def _huella_valor(valor):
+    if isinstance(valor, pd.DataFrame):
+        return _huella_precios(valor)
+    return huella_parametros(valor)
+
+
+def _filas(argumentos):
+    """Filas de la serie más larga entre los argumentos de una etapa."""
+    filas = [
+        len(v)
+        for v in argumentos.values()
+        if isinstance(v, (pd.DataFrame, ResultadoCompacto))
+    ]
+    return max(filas) if filas else None
+
+
+class Canalizacion:
+    """Ejecuta una lista de etapas recordando la salida de cada una.
+
+    Las etapas se ejecutan en el orden dado, que debe respetar las
+    dependencias. ``ultima_ejecucion`` indica, para cada etapa, si se
+    recalculó y cuánto tardó. Si hay un ``Registro`` de rendimiento activo,
+    cada etapa se anota en él con sus filas y su memoria máxima.
+    """
+
+    def __init__(self, etapas):
+        self.etapas = list(etapas)
+        self._memo = {}
+        self.ultima_ejecucion = {}
+
+    def huellas(self, parametros):
+        """Huella de cada etapa para ``parametros``, sin ejecutar nada."""
+        huellas = {}
+        for etapa in self.etapas:
+            h = hashlib.blake2b(etapa.nombre.encode(), digest_size=16)
+            for entrada in etapa.entradas:
+                if entrada in huellas:
+                    h.update(huellas[entrada].encode())
+                else:
+                    h.update(_huella_valor(parametros.get(entrada)).encode())
+            huellas[etapa.nombre] = h.hexdigest()
+        return huellas
+
+    def pendientes(self, parametros):
+        """Etapas que habría que recalcular con ``parametros``."""
+        huellas = self.huellas(parametros)
+        return [
+            e.nombre
+            for e in self.etapas
+            if self._memo.get(e.nombre, (None,))[0] != huellas[e.nombre]
+        ]
+
+    def ejecutar(self, parametros):
+        """Salidas de todas las etapas, reutilizando las que no han cambiado."""
+        huellas = self.huellas(parametros)
+        salidas = {}
+        self.ultima_ejecucion = {}
+        for etapa in self.etapas:
+            memo = self._memo.get(etapa.nombre)
+            if memo is not None and memo[0] == huellas[etapa.nombre]:
+                salidas[etapa.nombre] = memo[1]
+                self.ultima_ejecucion[etapa.nombre] = ("reutilizada", 0.0)
+                registro = registro_activo()
+                if registro is not None:
+                    registro.anotar(etapa.nombre, 0.0, estado="reutilizada")
+                continue
+            argumentos = {
+                e: salidas[e] if e in salidas else parametros.get(e)
+                for e in etapa.entradas
+            }
+            inicio = time.perf_counter()
+            with medir(etapa.nombre, filas=_filas(argumentos)):
+                valor = etapa.funcion(**argumentos)
+            self.ultima_ejecucion[etapa.nombre] = (
+                "recalculada",
+                time.perf_counter() - inicio,
+            )
+            self._memo[etapa.nombre] = (huellas[etapa.nombre], valor)
+            salidas[etapa.nombre] = valor
+        return salidas
+
+
+DESPACHO = (
+    "potencia_mw",
+    "duracion_h",
+    "ef_carga",
+    "ef_descarga",
+    "estrategia",
+    "umbral_carga",
+    "umbral_descarga",
+    "margen",
+    "horario",
+    "coste_carga",
+    "coste_descarga",
+    "ventana_dias",
+)
+ECONOMIA = (
+    "degradacion",
+    "capex_kwh",
+    "coste_desarrollo_mw",
+    "opex_kw",
+    "tasa_descuento",
+    "tipo_terreno",
+    "coste_terreno",
+    "ratio_apalancamiento",
+    "coste_financiacion",
+)
+_SIN_DURACION = tuple(p for p in DESPACHO if p != "duracion_h")
+_SIN_MARGEN = tuple(p for p in DESPACHO if p != "margen")
+_MONTECARLO = (
+    "coste_desarrollo_mw",
+    "tasa_descuento",
+    "tipo_terreno",
+    "coste_terreno",
+    "ratio_apalancamiento",
+    "coste_financiacion",
+)
+_VALORACION = (
+    "potencia_mw",
+    "degradacion",
+    "capex_kwh",
+    "coste_desarrollo_mw",
+    "opex_kw",
+    "tasa_descuento",
+    "tipo_terreno",
+    "coste_terreno",
+)
+
+# ``potencia_mw`` ya está entre los parámetros de despacho.
+_VALORACION_SIN_POTENCIA = _VALORACION[1:]
+
+
+def _carga(serie, desde, hasta):
+    return serie[(serie["Fecha"] >= desde) & (serie["Fecha"] <= hasta)]
+
+
+def _indice(carga):
+    return indice_diario(carga)
+
+
+def _despacho(carga, indice, **despacho):
+    return CACHE.llamar(simular, carga, **despacho, compacto=True)
+
+
+def _mensual(despacho):
+    return resumen_mensual(despacho)
+
+
+def _operacion(despacho, mensual, desde, hasta, potencia_mw, duracion_h):
+    ingreso_anual = mensual[mensual.index.year == desde.year]["Beneficio neto (€)"].sum()
+    dias = (hasta - desde).days + 1
+    ciclos = despacho["Descarga (MWh)"].sum() / (potencia_mw * duracion_h)
+    return {"ingreso_anual": ingreso_anual, "ciclos_anuales": ciclos / (dias / 365)}
+
+
+def _plurianual(
+    carga, indice, degradacion_despacho, degradacion, perdida_ciclos, **despacho
+):
+    if not degradacion_despacho:
+        return None
+    return simular_plurianual(
+        carga, degradacion=degradacion, perdida_ciclos=perdida_ciclos, **despacho
+    )
+
+
+def _finanzas(operacion, plurianual, potencia_mw, duracion_h, **economia):
+    ingresos = None if plurianual is None else plurianual["Beneficio neto (€)"]
+    return modelo_financiero(
+        operacion["ingreso_anual"],
+        potencia_mw,
+        duracion_h,
+        **economia,
+        ingresos=ingresos,
+    )
+
+
+def _barrido_duracion(carga, indice, max_h, paso_h, adaptativa_h, **despacho):
+    if not max_h or max_h <= paso_h or adaptativa_h:
+        return None
+    return CACHE.llamar(barrer_duraciones, carga, max_h=max_h, paso=paso_h, **despacho)
+
+
+def _sens_duracion(barrido_duracion, **valoracion):
+    if barrido_duracion is None:
+        return None
+    return valorar_duraciones(barrido_duracion, **valoracion)
+
+
+def _busqueda_duracion(carga, indice, max_h, adaptativa_h, **parametros):
+    if not max_h or not adaptativa_h:
+        return None
+    return CACHE.llamar(optimizar_duracion, carga, max_h=max_h, **parametros)
+
+
+def _barrido_margen(carga, indice, max_margen, paso_margen, adaptativa_margen, **despacho):
+    if (
+        not max_margen
+        or adaptativa_margen
+        or despacho["estrategia"] != "Margen fijo"
+    ):
+        return None
+    return CACHE.llamar(
+        barrer_margenes, carga, max_margen=max_margen, paso=paso_margen, **despacho
+    )
+
+
+def _sens_margen(barrido_margen, duracion_h, **valoracion):
+    if barrido_margen is None:
+        return None
+    return valorar_margenes(barrido_margen, duracion_h=duracion_h, **valoracion)
+
+
+def _busqueda_margen(carga, indice, max_margen, adaptativa_margen, **parametros):
+    if (
+        not max_margen
+        or not adaptativa_margen
+        or parametros["estrategia"] != "Margen fijo"
+    ):
+        return None
+    return CACHE.llamar(optimizar_margen, carga, max_margen=max_margen, **parametros)
+
+
+def _barrido_rejilla(carga, indice, rejilla, **despacho):
+    if not rejilla:
+        return None
+    return CACHE.llamar(
+        simular_rejilla,
+        carga,
+        rejilla["eje_x"],
+        rejilla["valores_x"],
+        rejilla["eje_y"],
+        rejilla["valores_y"],
+        **despacho,
+    )
+
+
+def _sens_rejilla(barrido_rejilla, duracion_h, **valoracion):
+    if barrido_rejilla is None:
+        return None
+    return valorar_rejilla(barrido_rejilla, duracion_h=duracion_h, **valoracion)
+
+
+def _montecarlo(operacion, tecnologia, n_sorteos, potencia_mw, duracion_h, **economia):
+    if not n_sorteos:
+        return None
+    return simular_montecarlo(
+        operacion["ingreso_anual"],
+        operacion["ciclos_anuales"],
+        TECHS[tecnologia],
+        potencia_mw,
+        duracion_h,
+        n=int(n_sorteos),
+        **economia,
+    )
+
+
+ETAPAS = (
+    Etapa("carga", ("serie", "desde", "hasta"), _carga),
+    Etapa("indice", ("carga",), _indice),
+    Etapa("despacho", ("carga", "indice") + DESPACHO, _despacho),
+    Etapa("mensual", ("despacho",), _mensual),
+    Etapa(
+        "operacion",
+        ("despacho", "mensual", "desde", "hasta", "potencia_mw", "duracion_h"),
+        _operacion,
+    ),
+    Etapa(
+        "plurianual",
+        ("carga", "indice", "degradacion_despacho", "degradacion", "perdida_ciclos")
+        + DESPACHO,
+        _plurianual,
+    ),
+    Etapa(
+        "finanzas",
+        ("operacion", "plurianual", "potencia_mw", "duracion_h") + ECONOMIA,
+        _finanzas,
+    ),
+    Etapa(
+        "barrido_duracion",
+        ("carga", "indice", "max_h", "paso_h", "adaptativa_h") + _SIN_DURACION,
+        _barrido_duracion,
+    ),
+    Etapa("sens_duracion", ("barrido_duracion",) + _VALORACION, _sens_duracion),
+    Etapa(
+        "busqueda_duracion",
+        ("carga", "indice", "max_h", "adaptativa_h")
+        + _SIN_DURACION
+        + _VALORACION_SIN_POTENCIA,
+        _busqueda_duracion,
+    ),
+    Etapa(
+        "barrido_margen",
+        ("carga", "indice", "max_margen", "paso_margen", "adaptativa_margen")
+        + _SIN_MARGEN,
+        _barrido_margen,
+    ),
+    Etapa(
+        "sens_margen", ("barrido_margen", "duracion_h") + _VALORACION, _sens_margen
+    ),
+    Etapa(
+        "busqueda_margen",
+        ("carga", "indice", "max_margen", "adaptativa_margen")
+        + _SIN_MARGEN
+        + _VALORACION_SIN_POTENCIA,
+        _busqueda_margen,
+    ),
+    Etapa("barrido_rejilla", ("carga", "indice", "rejilla") + DESPACHO, _barrido_rejilla),
+    Etapa(
+        "sens_rejilla", ("barrido_rejilla", "duracion_h") + _VALORACION, _sens_rejilla
+    ),
+    Etapa(
+        "montecarlo",
+        ("operacion", "tecnologia", "n_sorteos", "potencia_mw", "duracion_h")
+        + _MONTECARLO,
+        _montecarlo,
+    ),
+)
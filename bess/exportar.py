@@ -0,0 +1,91 @@
+"""Exportación por trozos de resultados a CSV, CSV comprimido o Parquet.
+
+Los datos se escriben en bloques de filas, de modo que nunca se construye el
+texto completo de una exportación larga en memoria. ``escribir`` vuelca cada
+bloque en el destino (así trabaja la línea de comandos); ``exportar`` solo
+aplaza el trabajo al momento de la descarga y devuelve el archivo entero en
+memoria, porque ``st.download_button`` no admite envíos por partes. Parquet
+necesita ``pyarrow``.
+"""
+import gzip
+import io
+
+import pandas as pd
+
+from .despacho import ResultadoCompacto
+
+# Extensión y tipo MIME de cada formato.
+FORMATOS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+FILAS_EXPORTACION = 1 << 16
+
+
+def _trozos(datos, filas=FILAS_EXPORTACION):
+    """DataFrames consecutivos de ``datos`` (``ResultadoCompacto`` o DataFrame).
+
+    El índice de un DataFrame se exporta como columna salvo que sea un
+    ``RangeIndex`` sin nombre.
+    """
+    for inicio in range(0, max(len(datos), 1), filas):
+        if isinstance(datos, ResultadoCompacto):
+            yield datos._filas(inicio, inicio + filas).to_frame()
+        else:
+            trozo = datos.iloc[inicio:inicio + filas]
+            if isinstance(trozo.index, pd.RangeIndex) and trozo.index.name is None:
+                yield trozo
+            else:
+                yield trozo.reset_index()
+
+
+def escribir(datos, destino, formato="csv", filas=FILAS_EXPORTACION):
+    """Escribe ``datos`` en ``destino`` (ruta o archivo binario) por trozos."""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconocido: {formato!r}")
+    if formato == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("La exportación a Parquet necesita pyarrow") from e
+
+        escritor = None
+        try:
+            for trozo in _trozos(datos, filas):
+                tabla = pa.Table.from_pandas(trozo, preserve_index=False)
+                if escritor is None:
+                    escritor = pq.ParquetWriter(destino, tabla.schema, compression="zstd")
+                escritor.write_table(tabla)
+        finally:
+            if escritor is not None:
+                escritor.close()
+        return
+
+    archivo = open(destino, "wb") if isinstance(destino, str) else destino
+    try:
+        binario = archivo
+        if formato == "csv.gz":
+            binario = gzip.GzipFile(fileobj=archivo, mode="wb", compresslevel=6, mtime=0)
+        texto = io.TextIOWrapper(binario, encoding="utf-8", newline="", write_through=True)
+        for i, trozo in enumerate(_trozos(datos, filas)):
+            trozo.to_csv(texto, header=i == 0, index=False)
+        texto.detach()
+        if binario is not archivo:
+            binario.close()
+    finally:
+        if archivo is not destino:
+            archivo.close()
+
+
+def exportar(datos, formato="csv"):
+    """Contenido de la exportación de ``datos`` en ``formato``, en bytes.
+
+    Se escribe por trozos, pero el resultado es el archivo completo: la
+    descarga se aplaza hasta pulsar el botón, no se envía por partes.
+    """
+    salida = io.BytesIO()
+    escribir(datos, salida, formato)
+    return salida.getvalue()
@@ -0,0 +1,303 @@
+"""Modelo financiero del proyecto: flujos a 15 años, VAN y TIR.
+
+``evaluar_escenarios`` trabaja sobre arrays de escenarios (cada parámetro
+puede ser un escalar o un array y se difunden entre sí); ``modelo_financiero``
+es la versión de un solo escenario que usa la interfaz.
+"""
+import numpy as np
+import pandas as pd
+
+from .rendimiento import medir
+
+ANIOS = 15
+
+
+def _cambios_signo(flujos):
+    """Número de cambios de signo por fila, ignorando los ceros."""
+    signo = np.sign(flujos)
+    t = np.arange(flujos.shape[1])
+    ultimo = np.maximum.accumulate(np.where(signo != 0, t, 0), axis=1)
+    signo = np.take_along_axis(signo, ultimo, axis=1)
+    return np.count_nonzero(signo[:, 1:] * signo[:, :-1] < 0, axis=1)
+
+
+def _tir_raices(flujos):
+    """Criterio de ``numpy_financial.irr`` (raíz más cercana a cero) en lote.
+
+    Resuelve los valores propios de las matrices compañeras de todas las filas
+    en una sola llamada; las filas con el primer o el último flujo nulo, que
+    cambian el grado del polinomio, se delegan en ``numpy_financial.irr``.
+    """
+    tir = np.full(len(flujos), np.nan)
+    regular = (flujos[:, 0] != 0) & (flujos[:, -1] != 0)
+    if (~regular).any():
+        import numpy_financial as npf
+
+        tir[~regular] = [npf.irr(fila) for fila in flujos[~regular]]
+    f = flujos[regular]
+    if len(f):
+        n = f.shape[1] - 1
+        compania = np.zeros((len(f), n, n))
+        compania[:, 0, :] = -f[:, -2::-1] / f[:, -1:]
+        compania[:, np.arange(1, n), np.arange(n - 1)] = 1
+        raices = np.linalg.eigvals(compania)
+        validas = (raices.imag == 0) & (raices.real > 0)
+        with np.errstate(divide="ignore"):
+            tasa = np.where(validas, 1 / np.where(validas, raices.real, 1) - 1, np.inf)
+        mejor = np.take_along_axis(
+            tasa, np.argmin(np.abs(tasa), axis=1)[:, None], axis=1
+        )[:, 0]
+        tir[regular] = np.where(validas.any(axis=1), mejor, np.nan)
+    return tir
+
+
+def tir_lote(flujos, estimacion=0.1, tol=1e-12, max_iter=100):
+    """TIR de cada fila de ``flujos`` (array ``(..., n)``), vectorizada.
+
+    Con un único cambio de signo hay una sola raíz ``x = 1 / (1 + tir)``
+    positiva del polinomio del VAN; se busca con Newton protegido por
+    bisección, partiendo de ``estimacion`` (escalar o un valor por fila, p. ej.
+    la solución de un escenario vecino). Las filas con varios cambios de signo
+    siguen el criterio de ``numpy_financial.irr`` (raíz más cercana a cero,
+    ``_tir_raices``); sin cambio de signo la TIR es ``nan``.
+    """
+    flujos = np.asarray(flujos, dtype=float)
+    forma = flujos.shape[:-1]
+    f = flujos.reshape(-1, flujos.shape[-1])
+    tir = np.full(len(f), np.nan)
+
+    cambios = _cambios_signo(f)
+    unica = (cambios == 1) & (f[:, 0] != 0)
+    varias = ~unica & (cambios > 0)
+    if varias.any():
+        tir[varias] = _tir_raices(f[varias])
+
+    c = f[unica]
+    if len(c):
+        s0 = np.sign(c[:, 0])
+        coefs = np.ascontiguousarray(c.T[::-1])
+
+        def polinomio(x, filas):
+            g = np.zeros(len(x))
+            dg = np.zeros(len(x))
+            for coef in coefs if len(filas) == len(c) else coefs[:, filas]:
+                dg *= x
+                dg += g
+                g *= x
+                g += coef
+            return g, dg
+
+        # Intervalo [lo, hi] con g(lo) del signo de c0 y g(hi) del contrario.
+        todas = np.arange(len(c))
+        lo = np.zeros(len(c))
+        hi = np.ones(len(c))
+        for _ in range(64):
+            g, _dg = polinomio(hi, todas)
+            sin_cambio = np.sign(g) == s0
+            if not sin_cambio.any():
+                break
+            lo = np.where(sin_cambio, hi, lo)
+            hi = np.where(sin_cambio, hi * 2, hi)
+
+        x0 = 1 / (1 + np.broadcast_to(estimacion, tir.shape)[unica])
+        x = np.where((x0 > lo) & (x0 < hi), x0, (lo + hi) / 2)
+        act = todas
+        for _ in range(max_iter):
+            xa, la, ha = x[act], lo[act], hi[act]
+            g, dg = polinomio(xa, act)
+            mismo = np.sign(g) == s0[act]
+            la = np.where(mismo, xa, la)
+            ha = np.where(mismo, ha, xa)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                nuevo = xa - g / dg
+            fuera = ~np.isfinite(nuevo) | (nuevo < la) | (nuevo > ha)
+            nuevo = np.where(fuera, (la + ha) / 2, nuevo)
+            hecho = np.abs(nuevo - xa) <= tol * np.maximum(xa, 1e-300)
+            x[act], lo[act], hi[act] = nuevo, la, ha
+            act = act[~hecho]
+            if not len(act):
+                break
+        tir[unica] = 1 / x - 1
+    return tir.reshape(forma)
+
+
+def evaluar_escenarios(
+    ingreso_anual,
+    potencia_mw,
+    duracion_h,
+    degradacion,
+    capex_kwh,
+    coste_desarrollo_mw,
+    opex_kw,
+    tasa_descuento,
+    tipo_terreno,
+    coste_terreno,
+    ratio_apalancamiento=0.0,
+    coste_financiacion=0.0,
+    vida_util=ANIOS,
+    estimacion_tir=0.1,
+    ingresos=None,
+):
+    """Modelo financiero de ``S`` escenarios a la vez.
+
+    Devuelve un diccionario de arrays: importes de inversión ``(S,)``, tablas
+    anuales ``(S, 15)`` (ingresos, flujos, intereses y amortización, con un
+    calendario de anualidad mensual en forma cerrada), flujos con el año 0
+    ``(S, 16)`` y VAN, TIR del proyecto y TIR del equity ``(S,)``.
+    ``vida_util`` (años, admite fracciones) corta los ingresos cuando la
+    batería agota sus ciclos antes del horizonte. ``ingresos`` (``(15,)`` o
+    ``(S, 15)``) da los ingresos de cada año ya degradados, por ejemplo de
+    ``simular_plurianual``; entonces no se aplica ``degradacion``.
+    """
+    compra = np.asarray(tipo_terreno) == "Compra"
+    (
+        ingreso_anual,
+        potencia_mw,
+        duracion_h,
+        degradacion,
+        capex_kwh,
+        coste_desarrollo_mw,
+        opex_kw,
+        tasa_descuento,
+        compra,
+        coste_terreno,
+        ratio_apalancamiento,
+        coste_financiacion,
+        vida_util,
+    ) = (
+        np.atleast_1d(a).astype(float)
+        for a in np.broadcast_arrays(
+            ingreso_anual,
+            potencia_mw,
+            duracion_h,
+            degradacion,
+            capex_kwh,
+            coste_desarrollo_mw,
+            opex_kw,
+            tasa_descuento,
+            compra,
+            coste_terreno,
+            ratio_apalancamiento,
+            coste_financiacion,
+            vida_util,
+        )
+    )
+    compra = compra.astype(bool)
+    anios = np.arange(ANIOS)
+
+    capex_bateria = potencia_mw * duracion_h * 1000 * capex_kwh
+    coste_desarrollo = potencia_mw * coste_desarrollo_mw
+    capex_total = capex_bateria + coste_desarrollo + np.where(compra, coste_terreno, 0)
+    gasto_terreno = np.where(compra, 0, coste_terreno)
+    if ingresos is None:
+        ingresos = ingreso_anual[:, None] * (1 - degradacion[:, None] / 100) ** anios
+    else:
+        ingresos = np.broadcast_to(
+            np.asarray(ingresos, dtype=float), (len(ingreso_anual), ANIOS)
+        )
+    ingresos = ingresos * np.clip(vida_util[:, None] - anios, 0, 1)
+    flujo_anual = ingresos - (potencia_mw * 1000 * opex_kw + gasto_terreno)[:, None]
+    flujo_caja = np.concatenate([-capex_total[:, None], flujo_anual], axis=1)
+    descuento = (1 + tasa_descuento[:, None] / 100) ** -np.arange(ANIOS + 1)
+    van = (flujo_caja * descuento).sum(axis=1)
+
+    # Préstamo a 15 años con cuota mensual constante: saldo tras m meses
+    # B_m = D (1+r)^m - P ((1+r)^m - 1) / r.
+    deuda = capex_total * (ratio_apalancamiento / 100)
+    r = (coste_financiacion / 100 / 12)[:, None]
+    meses = 12 * np.arange(ANIOS + 1)
+    crec = np.exp(meses * np.log1p(r))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        acum = np.where(r > 0, np.expm1(meses * np.log1p(r)) / r, meses)
+    pago_mes = deuda[:, None] / acum[:, -1:] * crec[:, -1:]
+    saldo = deuda[:, None] * crec - pago_mes * acum
+    amortizacion_anual = saldo[:, :-1] - saldo[:, 1:]
+    intereses_anuales = 12 * pago_mes - amortizacion_anual
+
+    flujos_equity_anual = flujo_anual - intereses_anuales - amortizacion_anual
+    flujo_equity = np.concatenate(
+        [-(capex_total - deuda)[:, None], flujos_equity_anual], axis=1
+    )
+    with medir("tir", filas=2 * len(van)):
+        tir = tir_lote(flujo_caja, estimacion_tir)
+        tir_equity = tir_lote(
+            flujo_equity, np.where(np.isfinite(tir), tir, estimacion_tir)
+        )
+
+    return {
+        "capex_bateria": capex_bateria,
+        "coste_desarrollo": coste_desarrollo,
+        "capex_total": capex_total,
+        "inversion": -capex_total,
+        "deuda": deuda,
+        "ingresos": ingresos,
+        "flujo_anual": flujo_anual,
+        "flujo_caja": flujo_caja,
+        "intereses_anuales": intereses_anuales,
+        "amortizacion_anual": amortizacion_anual,
+        "flujos_equity_anual": flujos_equity_anual,
+        "flujo_equity": flujo_equity,
+        "van": van,
+        "tir": tir,
+        "tir_equity": tir_equity,
+    }
+
+
+def modelo_financiero(
+    ingreso_anual,
+    potencia_mw,
+    duracion_h,
+    degradacion,
+    capex_kwh,
+    coste_desarrollo_mw,
+    opex_kw,
+    tasa_descuento,
+    tipo_terreno,
+    coste_terreno,
+    ratio_apalancamiento,
+    coste_financiacion,
+    ingresos=None,
+):
+    """Flujos a 15 años, VAN, TIR del proyecto y del equity y cuenta de resultados.
+
+    ``ingresos`` sustituye a ``ingreso_anual`` degradado, como en
+    ``evaluar_escenarios``.
+    """
+    esc = evaluar_escenarios(
+        ingreso_anual,
+        potencia_mw,
+        duracion_h,
+        degradacion,
+        capex_kwh,
+        coste_desarrollo_mw,
+        opex_kw,
+        tasa_descuento,
+        tipo_terreno,
+        coste_terreno,
+        ratio_apalancamiento,
+        coste_financiacion,
+        ingresos=ingresos,
+    )
+    fin = {k: v[0].item() if v.ndim == 1 else v[0].tolist() for k, v in esc.items()}
+
+    opex_anual = -potencia_mw * 1000 * opex_kw
+    if tipo_terreno == "Compra":
+        terreno_fila = [-coste_terreno] + [0] * ANIOS
+    else:
+        terreno_fila = [0] + [-coste_terreno] * ANIOS
+    data_cr = {
+        "Ingresos": [0] + fin["ingresos"],
+        "OPEX": [0] + [opex_anual] * ANIOS,
+        "Coste terrenos": terreno_fila,
+        "Intereses": [0] + [-i for i in fin["intereses_anuales"]],
+        "Amortización": [0] + [-a for a in fin["amortizacion_anual"]],
+        "Coste desarrollo": [-fin["coste_desarrollo"]] + [0] * ANIOS,
+        "CAPEX": [-fin["capex_bateria"]] + [0] * ANIOS,
+        "Flujo equity": fin["flujo_equity"],
+    }
+    cuenta_df = pd.DataFrame.from_dict(
+        data_cr, orient="index", columns=[f"Año {i}" for i in range(ANIOS + 1)]
+    )
+    cuenta_df.index.name = "Concepto"
+    fin["cuenta_df"] = cuenta_df
+    return fin
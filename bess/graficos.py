@@ -0,0 +1,43 @@
+"""Reducción de series largas para las gráficas."""
+import numpy as np
+
+MAX_PUNTOS = 2000
+
+
+def lttb(x, y, puntos=MAX_PUNTOS):
+    """Índices de los puntos elegidos con *Largest-Triangle-Three-Buckets*.
+
+    Conserva el primer y el último punto y, de cada uno de los ``puntos - 2``
+    cubos intermedios, el que forma el triángulo de mayor área con el punto
+    elegido en el cubo anterior y la media del siguiente, de modo que los
+    picos y valles siguen visibles. ``x`` puede ser numérico o ``datetime64``.
+    """
+    n = len(y)
+    if puntos >= n or puntos < 3:
+        return np.arange(n)
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype("datetime64[ns]").astype(np.int64)
+    x = (x - x[0]).astype(float)
+    y = np.asarray(y, dtype=float)
+
+    bordes = np.linspace(1, n - 1, puntos - 1).astype(np.int64)
+    # Media de cada cubo; el "siguiente" del último cubo es el punto final.
+    media_x = np.add.reduceat(x[:-1], bordes[:-1]) / np.diff(bordes)
+    media_y = np.add.reduceat(y[:-1], bordes[:-1]) / np.diff(bordes)
+    media_x = np.append(media_x[1:], x[-1])
+    media_y = np.append(media_y[1:], y[-1])
+
+    elegidos = np.empty(puntos, dtype=np.int64)
+    elegidos[0] = 0
+    elegidos[-1] = n - 1
+    a = 0
+    for i in range(puntos - 2):
+        lo, hi = bordes[i], bordes[i + 1]
+        area = np.abs(
+            (x[a] - media_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (media_y[i] - y[a])
+        )
+        a = lo + int(np.nanargmax(area)) if not np.isnan(area).all() else lo
+        elegidos[i + 1] = a
+    return elegidos
@@ -0,0 +1,292 @@
+"""Ingesta de archivos de precios: lectura por trozos, rejilla regular e informe.
+
+Los CSV (también ``.csv.gz``) se leen por trozos con columnas tipadas y las
+fechas se interpretan con un formato explícito, detectado sobre una muestra,
+en lugar del análisis elemento a elemento de ``pd.to_datetime``; un trozo en
+el que ese formato deja muchas fechas sin interpretar se vuelve a detectar.
+Cada zona se lleva después a una rejilla temporal regular: las fechas
+repetidas (el cambio de hora de otoño) se promedian, los huecos cortos (el
+de primavera) se interpolan y el resto quedan como filas sin precio, en las
+que la batería no opera. Todo lo que se corrige queda en el informe.
+
+Se admiten tres disposiciones: ``Fecha, Precio`` (una zona), ``Fecha, Zona,
+Precio`` (varias zonas en formato largo) y ``Fecha`` más una columna de
+precios por zona (formato ancho).
+"""
+import csv
+import gzip
+import io
+
+import numpy as np
+import pandas as pd
+
+# Se prueban en orden; el día va antes que el mes, como en los mercados europeos.
+FORMATOS_FECHA = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%d-%m-%Y %H:%M:%S",
+    "%d-%m-%Y %H:%M",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+    "%Y-%m-%d",
+    "%d/%m/%Y",
+)
+FILAS_TROZO = 1 << 20
+# Un trozo con más de esta fracción de fechas no válidas vuelve a detectar el formato.
+MAX_FECHAS_INVALIDAS = 0.5
+# Huecos de hasta estos pasos de la rejilla se rellenan interpolando.
+MAX_HUECO = 6
+
+_ALIAS = {
+    "fecha": "Fecha",
+    "date": "Fecha",
+    "datetime": "Fecha",
+    "precio": "Precio",
+    "price": "Precio",
+    "zona": "Zona",
+    "zone": "Zona",
+}
+
+
+def detectar_formato(muestra):
+    """Formato de ``FORMATOS_FECHA`` que interpreta más valores de la muestra.
+
+    Basta con que interprete más de la mitad: las filas que no encajan quedan
+    después como fechas no válidas. A igualdad gana el primero de la lista;
+    ``None`` si ninguno llega a la mitad.
+    """
+    muestra = pd.Series(muestra).dropna().astype(str).head(1000)
+    mejor, validas = None, len(muestra) / 2
+    for formato in FORMATOS_FECHA:
+        n = pd.to_datetime(muestra, format=formato, errors="coerce").notna().sum()
+        if n > validas:
+            mejor, validas = formato, n
+    return mejor
+
+
+def _renombrar(df):
+    return df.rename(columns=lambda c: _ALIAS.get(str(c).strip().lower(), c))
+
+
+def _fechas(columna, formato):
+    if pd.api.types.is_datetime64_any_dtype(columna):
+        return columna.to_numpy(dtype="datetime64[ns]")
+    if formato is None:
+        fechas = pd.to_datetime(columna, format="mixed", dayfirst=True, errors="coerce")
+    else:
+        fechas = pd.to_datetime(columna, format=formato, errors="coerce")
+    return fechas.to_numpy(dtype="datetime64[ns]")
+
+
+def _numeros(columna):
+    if pd.api.types.is_numeric_dtype(columna):
+        return columna.to_numpy(dtype=float)
+    texto = columna.astype(str).str.replace(",", ".", regex=False)
+    return pd.to_numeric(texto, errors="coerce").to_numpy(dtype=float)
+
+
+def _a_largo(trozo):
+    """Trozo con columnas ``Fecha``, ``Zona`` y ``Precio``."""
+    trozo = _renombrar(trozo)
+    if "Fecha" not in trozo:
+        raise ValueError("El archivo de precios no tiene columna 'Fecha'")
+    if "Precio" in trozo:
+        zona = trozo["Zona"].astype(str) if "Zona" in trozo else ""
+        return trozo[["Fecha"]].assign(Zona=zona, Precio=trozo["Precio"])
+    zonas = [c for c in trozo.columns if c != "Fecha"]
+    if not zonas:
+        raise ValueError("El archivo de precios no tiene columnas de precio")
+    return trozo.melt(id_vars="Fecha", value_vars=zonas, var_name="Zona", value_name="Precio")
+
+
+def _separador(contenido, comprimido):
+    """Separador y marca decimal del CSV a partir de sus primeras líneas."""
+    cabeza = (
+        gzip.GzipFile(fileobj=io.BytesIO(contenido)).read(8192)
+        if comprimido
+        else contenido[:8192]
+    )
+    texto = cabeza.decode("utf-8", errors="ignore")
+    try:
+        sep = csv.Sniffer().sniff(texto, delimiters=",;\t").delimiter
+    except csv.Error:
+        sep = ","
+    return sep, "," if sep == ";" else "."
+
+
+def leer_csv(contenido, comprimido=False, filas_trozo=FILAS_TROZO):
+    """Trozos del CSV en formato largo.
+
+    Fechas y zonas se leen como texto y los precios los convierte el lector
+    de C; un precio que no es un número deja su columna como texto y se
+    convierte después en ``_numeros``.
+    """
+    sep, decimal = _separador(contenido, comprimido)
+    opciones = {
+        "sep": sep,
+        "decimal": decimal,
+        "compression": "gzip" if comprimido else None,
+    }
+    columnas = pd.read_csv(io.BytesIO(contenido), nrows=0, **opciones).columns
+    texto = {
+        c: str for c in columnas if _ALIAS.get(str(c).strip().lower()) in ("Fecha", "Zona")
+    }
+    lector = pd.read_csv(
+        io.BytesIO(contenido), chunksize=filas_trozo, dtype=texto, **opciones
+    )
+    for trozo in lector:
+        yield _a_largo(trozo)
+
+
+def regularizar(fecha, precio, max_hueco=MAX_HUECO):
+    """Serie en una rejilla temporal regular y recuento de lo corregido.
+
+    El paso de la rejilla es la diferencia más frecuente entre fechas
+    consecutivas. Las fechas repetidas se promedian; las que no caen en la
+    rejilla se descartan; las posiciones sin precio se interpolan si forman
+    huecos de hasta ``max_hueco`` pasos.
+    """
+    orden = np.argsort(fecha, kind="stable")
+    fecha, precio = fecha[orden], precio[orden]
+    unicas, inverso = np.unique(fecha, return_inverse=True)
+    validos = ~np.isnan(precio)
+    suma = np.bincount(inverso, np.where(validos, precio, 0.0), len(unicas))
+    cuenta = np.bincount(inverso, validos, len(unicas))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = np.where(cuenta > 0, suma / cuenta, np.nan)
+
+    if len(unicas) > 1:
+        saltos, veces = np.unique(np.diff(unicas), return_counts=True)
+        paso = saltos[np.argmax(veces)]
+    else:
+        paso = np.timedelta64(1, "h").astype("timedelta64[ns]")
+    desfase = (unicas - unicas[0]) % paso
+    en_rejilla = desfase == np.timedelta64(0, "ns")
+    rejilla = np.arange(unicas[0], unicas[-1] + paso, paso)
+    valores = np.full(len(rejilla), np.nan)
+    valores[(unicas[en_rejilla] - unicas[0]) // paso] = media[en_rejilla]
+
+    falta = np.isnan(valores)
+    rellenadas = 0
+    huecos = 0
+    if falta.any() and not falta.all():
+        bordes = np.diff(np.concatenate(([0], falta.astype(np.int8), [0])))
+        inicio, fin = np.flatnonzero(bordes == 1), np.flatnonzero(bordes == -1)
+        huecos = len(inicio)
+        cortos = fin - inicio <= max_hueco
+        rellenar = np.zeros(len(valores), dtype=bool)
+        for a, b in zip(inicio[cortos], fin[cortos]):
+            rellenar[a:b] = True
+        posiciones = np.flatnonzero(rellenar)
+        valores[posiciones] = np.interp(
+            posiciones, np.flatnonzero(~falta), valores[~falta]
+        )
+        rellenadas = len(posiciones)
+
+    informe = {
+        "Filas leídas": len(fecha),
+        "Desde": pd.Timestamp(rejilla[0]),
+        "Hasta": pd.Timestamp(rejilla[-1]),
+        "Paso (min)": paso / np.timedelta64(1, "m"),
+        "Duplicadas": len(fecha) - len(unicas),
+        "Fuera de rejilla": int((~en_rejilla).sum()),
+        "Huecos": huecos,
+        "Filas rellenadas": rellenadas,
+        "Filas sin precio": int(np.isnan(valores).sum()),
+        "Filas finales": len(rejilla),
+    }
+    return pd.DataFrame({"Fecha": rejilla, "Precio": valores}), informe
+
+
+def _fechas_trozo(columna, formato):
+    """Fechas de un trozo y el formato con el que se han leído.
+
+    Se usa ``formato`` (el del trozo anterior) salvo que deje sin interpretar
+    más de ``MAX_FECHAS_INVALIDAS`` de las fechas; entonces se detecta sobre
+    el trozo. El formato devuelto es ``"datetime"`` si la columna ya es de
+    fechas y ``"mixto"`` si no se detecta ninguno y cada fecha se interpreta
+    por separado, con el día antes del mes.
+    """
+    if pd.api.types.is_datetime64_any_dtype(columna):
+        return _fechas(columna, None), "datetime"
+    if formato is not None:
+        fecha = _fechas(columna, formato)
+        if np.isnat(fecha).sum() <= MAX_FECHAS_INVALIDAS * columna.notna().sum():
+            return fecha, formato
+    detectado = detectar_formato(columna)
+    if detectado is None and formato is not None:
+        return fecha, formato
+    return _fechas(columna, detectado), detectado or "mixto"
+
+
+def _ingerir(trozos, max_hueco):
+    """Acumula trozos en formato largo y regulariza cada zona."""
+    fechas, precios = {}, {}
+    formato = None
+    formatos = {}
+    invalidas = {}
+    no_numericos = {}
+    for trozo in trozos:
+        fecha, usado = _fechas_trozo(trozo["Fecha"], formato)
+        if usado in FORMATOS_FECHA:
+            formato = usado
+        precio = _numeros(trozo["Precio"])
+        mala = np.isnat(fecha)
+        sin_numero = np.isnan(precio) & trozo["Precio"].notna().to_numpy()
+        for zona, filas in trozo.groupby("Zona", sort=False).indices.items():
+            buenas = filas[~mala[filas]]
+            if usado not in formatos.setdefault(zona, []):
+                formatos[zona].append(usado)
+            fechas.setdefault(zona, []).append(fecha[buenas])
+            precios.setdefault(zona, []).append(precio[buenas])
+            invalidas[zona] = invalidas.get(zona, 0) + int(mala[filas].sum())
+            no_numericos[zona] = no_numericos.get(zona, 0) + int(sin_numero[filas].sum())
+
+    zonas, filas = {}, []
+    for zona in fechas:
+        fecha = np.concatenate(fechas[zona])
+        if not len(fecha):
+            continue
+        df, informe = regularizar(fecha, np.concatenate(precios[zona]), max_hueco)
+        zonas[zona] = df
+        filas.append(
+            {
+                "Zona": zona,
+                "Formato de fecha": ", ".join(formatos[zona]),
+                "Fechas no válidas": invalidas[zona],
+                "Precios no numéricos": no_numericos[zona],
+                **informe,
+            }
+        )
+    if not zonas:
+        raise ValueError("El archivo de precios no tiene filas con fecha válida")
+    return zonas, pd.DataFrame(filas).set_index("Zona")
+
+
+def ingerir(contenido, nombre, max_hueco=MAX_HUECO, filas_trozo=FILAS_TROZO):
+    """Precios por zona e informe de validación de un archivo CSV, CSV.GZ o Excel.
+
+    ``contenido`` son los bytes del archivo y ``nombre`` su nombre (por la
+    extensión). Devuelve ``({zona: DataFrame}, informe)``; un archivo de una
+    sola zona la devuelve con nombre ``""``.
+    """
+    if nombre.endswith((".csv", ".csv.gz", ".gz")):
+        trozos = leer_csv(contenido, nombre.endswith(".gz"), filas_trozo)
+    else:
+        hojas = pd.read_excel(io.BytesIO(contenido), sheet_name=None)
+        if len(hojas) > 1:
+            return ingerir_hojas(hojas, max_hueco)
+        trozos = (_a_largo(hoja) for hoja in hojas.values())
+    return _ingerir(trozos, max_hueco)
+
+
+def ingerir_hojas(hojas, max_hueco=MAX_HUECO):
+    """Como ``ingerir`` para un libro ya leído: cada hoja es una zona."""
+    trozos = (
+        _a_largo(df).assign(Zona=nombre) for nombre, df in hojas.items()
+    )
+    return _ingerir(trozos, max_hueco)
@@ -0,0 +1,85 @@
+"""Análisis de riesgo Monte Carlo sobre los rangos de ``TECHS``."""
+import numpy as np
+import pandas as pd
+
+from .finanzas import ANIOS, evaluar_escenarios
+
+OPEX_KW = (5.0, 8.0)
+ESCALA_INGRESOS = (0.8, 1.2)
+MARGEN_FINANCIACION = 2.0
+
+
+def simular_montecarlo(
+    ingreso_anual,
+    ciclos_anuales,
+    tecnologia,
+    potencia_mw,
+    duracion_h,
+    coste_desarrollo_mw,
+    tasa_descuento,
+    tipo_terreno,
+    coste_terreno,
+    ratio_apalancamiento,
+    coste_financiacion,
+    n=20000,
+    opex_kw=OPEX_KW,
+    escala_ingresos=ESCALA_INGRESOS,
+    margen_financiacion=MARGEN_FINANCIACION,
+    semilla=None,
+):
+    """Evalúa ``n`` sorteos del modelo financiero en una sola pasada.
+
+    Reutiliza el ingreso anual y los ciclos de un único despacho. Se sortean
+    de forma uniforme el CAPEX, la degradación y los ciclos de vida dentro de
+    los rangos de ``tecnologia`` (una entrada de ``TECHS``), el OPEX, el coste
+    de financiación (± ``margen_financiacion`` puntos) y un factor de escala
+    de los ingresos. Si los ciclos se agotan antes de 15 años, los ingresos
+    se cortan en ese punto. Devuelve un DataFrame con un sorteo por fila.
+    """
+    rng = np.random.default_rng(semilla)
+    sorteo = pd.DataFrame({
+        "CAPEX (€/kWh)": rng.uniform(*tecnologia["costo"], n),
+        "Degradación (%)": rng.uniform(*tecnologia["degrad"], n),
+        "Ciclos de vida": rng.uniform(*tecnologia["ciclos"], n),
+        "OPEX (€/kW)": rng.uniform(*opex_kw, n),
+        "Coste financiación (%)": rng.uniform(
+            max(0.0, coste_financiacion - margen_financiacion),
+            coste_financiacion + margen_financiacion,
+            n,
+        ),
+        "Escala ingresos": rng.uniform(*escala_ingresos, n),
+    })
+    vida = (
+        sorteo["Ciclos de vida"].to_numpy() / ciclos_anuales
+        if ciclos_anuales > 0
+        else ANIOS
+    )
+    fin = evaluar_escenarios(
+        ingreso_anual * sorteo["Escala ingresos"].to_numpy(),
+        potencia_mw,
+        duracion_h,
+        sorteo["Degradación (%)"].to_numpy(),
+        sorteo["CAPEX (€/kWh)"].to_numpy(),
+        coste_desarrollo_mw,
+        sorteo["OPEX (€/kW)"].to_numpy(),
+        tasa_descuento,
+        tipo_terreno,
+        coste_terreno,
+        ratio_apalancamiento,
+        sorteo["Coste financiación (%)"].to_numpy(),
+        vida_util=vida,
+    )
+    sorteo["VAN"] = fin["van"]
+    sorteo["TIR"] = fin["tir"]
+    sorteo["TIR equity"] = fin["tir_equity"]
+    return sorteo
+
+
+def resumen_montecarlo(sorteo):
+    """Percentiles P10/P50/P90 de VAN y TIR y probabilidad de VAN negativo."""
+    filas = {}
+    for col in ("VAN", "TIR", "TIR equity"):
+        p10, p50, p90 = np.nanpercentile(sorteo[col], [10, 50, 90])
+        filas[col] = {"P10": p10, "P50": p50, "P90": p90}
+    tabla = pd.DataFrame(filas).T
+    return tabla, float((sorteo["VAN"] < 0).mean())
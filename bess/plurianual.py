@@ -0,0 +1,128 @@
+"""Despacho año a año con la capacidad degradada.
+
+El modelo financiero básico simula el primer año y escala sus ingresos con
+``(1 - degradacion/100) ** i``. Aquí cada año del proyecto se despacha
+contra los precios de ese año con la capacidad útil que le queda, y el SOC
+final de un año es el inicial del siguiente. La capacidad se degrada por
+calendario (``degradacion`` % anual) y por uso (``perdida_ciclos`` % por
+cada 1000 ciclos equivalentes acumulados).
+"""
+import numpy as np
+import pandas as pd
+
+from .despacho import _despachar, _despacho_optimo, _senales
+from .finanzas import ANIOS
+
+
+def _bloques_anuales(fecha):
+    """Filas ``(a, b)`` y factor de escala de cada año de la serie.
+
+    Los años se cuentan desde la primera fecha. Un último año incompleto se
+    descarta salvo que sea el único; entonces se eleva a un año completo.
+    """
+    fecha = fecha.to_numpy()
+    paso = fecha[1] - fecha[0] if len(fecha) > 1 else np.timedelta64(1, "h")
+    inicio = pd.Timestamp(fecha[0])
+    fin_serie = pd.Timestamp(fecha[-1] + paso)
+    bloques = []
+    k = 0
+    while inicio + pd.DateOffset(years=k) < fin_serie:
+        desde = inicio + pd.DateOffset(years=k)
+        hasta = desde + pd.DateOffset(years=1)
+        a, b = np.searchsorted(fecha, np.array([desde, hasta], dtype=fecha.dtype))
+        if hasta <= fin_serie:
+            bloques.append((a, b, 1.0))
+        elif not bloques:
+            bloques.append((a, b, (hasta - desde) / (fin_serie - desde)))
+        k += 1
+    return bloques
+
+
+def simular_plurianual(
+    precios,
+    potencia_mw,
+    duracion_h,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    umbral_carga=0.25,
+    umbral_descarga=0.75,
+    margen=0,
+    horario=None,
+    coste_carga=0.0,
+    coste_descarga=0.0,
+    ventana_dias=0,
+    degradacion=0.0,
+    perdida_ciclos=0.0,
+    anios=ANIOS,
+):
+    """Beneficio y capacidad de cada año del proyecto con degradación.
+
+    El año ``i`` usa los precios del año ``i`` de la serie; si la serie es
+    más corta que ``anios``, sus años se repiten en orden. Las señales de la
+    estrategia se calculan una vez para toda la serie y cada año se despacha
+    como un trozo con el SOC que dejó el anterior (recortado a la nueva
+    capacidad). Devuelve un DataFrame indexado por año del proyecto.
+    """
+    precios = precios.reset_index(drop=True)
+    precio = precios["Precio"].to_numpy(dtype=float)
+    energia_nominal = potencia_mw * duracion_h
+    paso_c = potencia_mw * ef_carga
+    paso_d = potencia_mw * ef_descarga
+    if estrategia != "Óptima":
+        senal = _senales(
+            precios,
+            estrategia,
+            umbral_carga,
+            umbral_descarga,
+            margen,
+            horario,
+            ventana_dias,
+        )
+    bloques = _bloques_anuales(precios["Fecha"])
+
+    filas = []
+    soc = 0.0
+    ciclos_acumulados = 0.0
+    for i in range(anios):
+        a, b, escala = bloques[i % len(bloques)]
+        capacidad = max(
+            0.0,
+            (1 - degradacion / 100) ** i
+            * (1 - perdida_ciclos / 100 * ciclos_acumulados / 1000),
+        )
+        energia = energia_nominal * capacidad
+        soc = min(soc, energia)
+        if estrategia == "Óptima":
+            carga, descarga, nivel, _ = _despacho_optimo(
+                precio[a:b],
+                paso_c,
+                paso_d,
+                energia,
+                coste_carga,
+                coste_descarga,
+                soc_inicial=soc,
+            )
+        else:
+            carga, descarga, nivel, _ = _despachar(
+                senal[a:b], potencia_mw, energia, ef_carga, ef_descarga, soc
+            )
+        if len(nivel):
+            soc = float(nivel[-1])
+        p = np.nan_to_num(precio[a:b])
+        neto = (
+            (p - coste_descarga) @ descarga - (p + coste_carga) @ carga
+        ) * escala
+        ciclos = descarga.sum() * escala / energia_nominal if energia_nominal else 0.0
+        ciclos_acumulados += ciclos
+        filas.append(
+            {
+                "Año": i + 1,
+                "Año de precios": precios["Fecha"].iloc[a].year,
+                "Capacidad (%)": 100 * capacidad,
+                "Capacidad (MWh)": energia,
+                "Ciclos": ciclos,
+                "Beneficio neto (€)": neto,
+            }
+        )
+    return pd.DataFrame(filas).set_index("Año")
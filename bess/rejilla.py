@@ -0,0 +1,303 @@
+"""Sensibilidad en dos dimensiones: VAN y TIR en una rejilla de parámetros.
+
+Cada celda de la rejilla es un carril del despacho por lotes
+(``_despachar_lote``), así que toda la rejilla se simula en una pasada por
+la serie. Las celdas que dan el mismo despacho (p. ej. márgenes distintos
+con una estrategia que no usa margen) se simulan una sola vez, y los
+carriles se reparten entre procesos.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from .despacho import (
+    _beneficio_neto,
+    _despachar_lote,
+    _limites,
+    _optimo_anual,
+    cuantiles_moviles,
+    indice_diario,
+)
+from .finanzas import evaluar_escenarios
+
+EJES = {
+    "potencia_mw": "Potencia (MW)",
+    "duracion_h": "Duración (h)",
+    "margen": "Margen (€/MWh)",
+    "umbral_carga": "Umbral de carga",
+    "umbral_descarga": "Umbral de descarga",
+}
+
+
+def _despachar_carriles(
+    tarea,
+    precio,
+    grupo,
+    n_grupos,
+    estrategia,
+    coste_carga,
+    coste_descarga,
+):
+    """Totales por grupo de un subconjunto de carriles; se ejecuta en el pool."""
+    if estrategia == "Óptima":
+        return _optimo_anual(
+            precio,
+            tarea["paso_c"],
+            tarea["paso_d"],
+            tarea["energia"],
+            grupo,
+            n_grupos,
+            coste_carga,
+            coste_descarga,
+        )
+    return _despachar_lote(
+        precio,
+        tarea["lim_c"],
+        tarea["lim_d"],
+        tarea["off"],
+        tarea["off"],
+        tarea["paso_c"],
+        tarea["paso_d"],
+        tarea["energia"],
+        grupo,
+        n_grupos,
+        tarea["carril_c"],
+        tarea["carril_d"],
+    )
+
+
+def _columnas(lim, carril):
+    """Solo las columnas de ``lim`` que usan los carriles, con índices locales."""
+    usadas, local = np.unique(carril, return_inverse=True)
+    return lim[:, usadas], local.ravel()
+
+
+def simular_rejilla(
+    precios,
+    eje_x,
+    valores_x,
+    eje_y,
+    valores_y,
+    potencia_mw,
+    duracion_h,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    umbral_carga=0.25,
+    umbral_descarga=0.75,
+    margen=0,
+    horario=None,
+    coste_carga=0.0,
+    coste_descarga=0.0,
+    ventana_dias=0,
+    max_workers=None,
+):
+    """Beneficio neto anual de cada celda ``(x, y)`` de la rejilla.
+
+    ``eje_x`` y ``eje_y`` son dos nombres de ``EJES``; los demás parámetros
+    toman el valor indicado. Devuelve un DataFrame indexado por año con una
+    columna por celda (``MultiIndex`` con los nombres de los ejes).
+    """
+    if eje_x == eje_y or eje_x not in EJES or eje_y not in EJES:
+        raise ValueError(f"Ejes no válidos: {eje_x!r}, {eje_y!r} (usa dos de {list(EJES)})")
+    x, y = (
+        m.ravel()
+        for m in np.meshgrid(
+            np.asarray(valores_x, dtype=float),
+            np.asarray(valores_y, dtype=float),
+            indexing="ij",
+        )
+    )
+    celda = {
+        "potencia_mw": potencia_mw,
+        "duracion_h": duracion_h,
+        "margen": margen,
+        "umbral_carga": umbral_carga,
+        "umbral_descarga": umbral_descarga,
+    }
+    celda = {k: np.full(len(x), float(v)) for k, v in celda.items()}
+    celda[eje_x], celda[eje_y] = x, y
+
+    # Parámetros que de verdad cambian el despacho con esta estrategia.
+    potencia = celda["potencia_mw"]
+    energia = potencia * celda["duracion_h"]
+    ceros = np.zeros(len(x))
+    clave = np.column_stack(
+        (
+            potencia,
+            energia,
+            celda["margen"] if estrategia == "Margen fijo" else ceros,
+            celda["umbral_carga"] if estrategia == "Percentiles" else ceros,
+            celda["umbral_descarga"] if estrategia == "Percentiles" else ceros,
+        )
+    )
+    carriles, celda_carril = np.unique(clave, axis=0, return_inverse=True)
+    celda_carril = celda_carril.ravel()
+    k = len(carriles)
+
+    precio = precios["Precio"].to_numpy(dtype=float)
+    anios, grupo = np.unique(precios["Fecha"].dt.year.to_numpy(), return_inverse=True)
+    comun = {
+        "paso_c": carriles[:, 0] * ef_carga,
+        "paso_d": carriles[:, 0] * ef_descarga,
+        "energia": carriles[:, 1],
+        "off": carriles[:, 2],
+    }
+    if estrategia == "Percentiles":
+        q_c, comun["carril_c"] = np.unique(carriles[:, 3], return_inverse=True)
+        q_d, comun["carril_d"] = np.unique(carriles[:, 4], return_inverse=True)
+        if ventana_dias:
+            # Todos los cuantiles salen de la misma pasada por la ventana.
+            lim = cuantiles_moviles(precios, ventana_dias, np.concatenate((q_c, q_d)))
+            lim_c, lim_d = lim[:, :len(q_c)], lim[:, len(q_c):]
+        else:
+            indice = indice_diario(precios)
+            lim_c = np.column_stack([indice.difundir(indice.cuantil(q)) for q in q_c])
+            lim_d = np.column_stack([indice.difundir(indice.cuantil(q)) for q in q_d])
+    elif estrategia != "Óptima":
+        lim_c, lim_d = _limites(
+            precios, estrategia, horario=horario, ventana_dias=ventana_dias
+        )
+        lim_c, lim_d = lim_c[:, None], lim_d[:, None]
+        comun["carril_c"] = comun["carril_d"] = np.zeros(k, dtype=np.intp)
+
+    workers = max_workers or os.cpu_count() or 1
+    tareas = []
+    for parte in np.array_split(np.arange(k), min(k, workers)):
+        tarea = {c: v[parte] for c, v in comun.items()}
+        if estrategia != "Óptima":
+            tarea["lim_c"], tarea["carril_c"] = _columnas(lim_c, tarea["carril_c"])
+            tarea["lim_d"], tarea["carril_d"] = _columnas(lim_d, tarea["carril_d"])
+        tareas.append(tarea)
+
+    ejecutar = partial(
+        _despachar_carriles,
+        precio=precio,
+        grupo=grupo,
+        n_grupos=len(anios),
+        estrategia=estrategia,
+        coste_carga=coste_carga,
+        coste_descarga=coste_descarga,
+    )
+    if len(tareas) == 1:
+        totales = [ejecutar(tareas[0])]
+    else:
+        with ProcessPoolExecutor(len(tareas)) as pool:
+            totales = list(pool.map(ejecutar, tareas))
+    tot = {c: np.concatenate([t[c] for t in totales], axis=1) for c in totales[0]}
+
+    neto = _beneficio_neto(tot, coste_carga, coste_descarga)
+    return pd.DataFrame(
+        neto[:, celda_carril],
+        index=pd.Index(anios, name="Año"),
+        columns=pd.MultiIndex.from_arrays([x, y], names=[eje_x, eje_y]),
+    )
+
+
+def valorar_rejilla(
+    anual,
+    potencia_mw,
+    duracion_h,
+    degradacion,
+    capex_kwh,
+    coste_desarrollo_mw,
+    opex_kw,
+    tasa_descuento,
+    tipo_terreno,
+    coste_terreno,
+):
+    """VAN y TIR de cada celda de ``simular_rejilla`` y celdas óptimas.
+
+    Devuelve una tabla con una fila por celda y ``{"VAN": (x, y), "TIR":
+    (x, y)}`` con la mejor celda de cada métrica (``None`` si la TIR no
+    está definida en ninguna).
+    """
+    eje_x, eje_y = anual.columns.names
+    x = anual.columns.get_level_values(0).to_numpy(dtype=float)
+    y = anual.columns.get_level_values(1).to_numpy(dtype=float)
+    valores = {eje_x: x, eje_y: y}
+    esc = evaluar_escenarios(
+        anual.iloc[0].to_numpy(),
+        valores.get("potencia_mw", potencia_mw),
+        valores.get("duracion_h", duracion_h),
+        degradacion,
+        capex_kwh,
+        coste_desarrollo_mw,
+        opex_kw,
+        tasa_descuento,
+        tipo_terreno,
+        coste_terreno,
+    )
+    df = pd.DataFrame({eje_x: x, eje_y: y, "VAN": esc["van"], "TIR": esc["tir"]})
+    opt = {}
+    for metrica in ("VAN", "TIR"):
+        serie = df[metrica].dropna()
+        opt[metrica] = (
+            tuple(df.loc[serie.idxmax(), [eje_x, eje_y]]) if len(serie) else None
+        )
+    return df, opt
+
+
+def analizar_rejilla(
+    precios,
+    eje_x,
+    valores_x,
+    eje_y,
+    valores_y,
+    potencia_mw,
+    duracion_h,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    umbral_carga,
+    umbral_descarga,
+    margen,
+    horario,
+    degradacion,
+    capex_kwh,
+    coste_desarrollo_mw,
+    opex_kw,
+    tasa_descuento,
+    coste_carga,
+    coste_descarga,
+    tipo_terreno,
+    coste_terreno,
+    max_workers=None,
+    ventana_dias=0,
+):
+    """VAN y TIR en la rejilla ``valores_x`` x ``valores_y`` de dos parámetros."""
+    anual = simular_rejilla(
+        precios,
+        eje_x,
+        valores_x,
+        eje_y,
+        valores_y,
+        potencia_mw,
+        duracion_h,
+        ef_carga,
+        ef_descarga,
+        estrategia,
+        umbral_carga,
+        umbral_descarga,
+        margen,
+        horario,
+        coste_carga,
+        coste_descarga,
+        ventana_dias,
+        max_workers,
+    )
+    return valorar_rejilla(
+        anual,
+        potencia_mw,
+        duracion_h,
+        degradacion,
+        capex_kwh,
+        coste_desarrollo_mw,
+        opex_kw,
+        tasa_descuento,
+        tipo_terreno,
+        coste_terreno,
+    )
@@ -0,0 +1,191 @@
+"""Tiempos, memoria y filas de cada etapa del cálculo.
+
+``medir("despacho", filas=n)`` rodea un bloque de código. Si hay un
+``Registro`` activo (``with Registro() as registro:``), la medición se añade
+a él. Si no lo hay, el coste es despreciable. Las mediciones anidadas se
+nombran con su ruta (``finanzas/tir``). La memoria máxima se mide con
+``tracemalloc`` solo si el registro se crea con ``memoria=True``, porque
+ralentiza el cálculo. Cada medición se emite además como una línea JSON en
+el logger ``bess.rendimiento``.
+"""
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import marshal
+import pstats
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+_MANEJADORES = {}
+
+_REGISTRO = contextvars.ContextVar("registro_rendimiento", default=None)
+
+
+@dataclass
+class Medicion:
+    """Resultado de medir una etapa."""
+
+    etapa: str
+    segundos: float
+    memoria_mb: float = None
+    filas: int = None
+    estado: str = "calculada"
+
+
+class Registro:
+    """Colección de mediciones de una ejecución.
+
+    Se usa como gestor de contexto; mientras está activo, ``medir`` añade
+    aquí sus mediciones. ``ejecucion`` identifica la ejecución en los logs.
+    """
+
+    def __init__(self, memoria=False, ejecucion=None):
+        self.memoria = memoria
+        self.ejecucion = ejecucion or uuid.uuid4().hex[:12]
+        self.mediciones = []
+        self._ruta = []
+        # Pico de memoria de los hijos de cada nivel abierto de ``_ruta``.
+        self._picos = []
+        self._token = None
+        self._detener_tracemalloc = False
+
+    def __enter__(self):
+        if self.memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._detener_tracemalloc = True
+        self._token = _REGISTRO.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _REGISTRO.reset(self._token)
+        if self._detener_tracemalloc:
+            tracemalloc.stop()
+            self._detener_tracemalloc = False
+
+    def anotar(self, etapa, segundos, memoria_mb=None, filas=None, estado="calculada"):
+        """Añade una medición y la emite como JSON."""
+        medicion = Medicion(etapa, segundos, memoria_mb, filas, estado)
+        self.mediciones.append(medicion)
+        if LOGGER.isEnabledFor(logging.INFO):
+            LOGGER.info(
+                json.dumps(
+                    {"evento": "etapa", "ejecucion": self.ejecucion, **asdict(medicion)},
+                    ensure_ascii=False,
+                )
+            )
+        return medicion
+
+    def tabla(self, *otros):
+        """Mediciones como DataFrame, en el orden en que terminaron.
+
+        Las de los registros ``otros`` van a continuación, en la misma tabla
+        (concatenar tablas vacías o con columnas sin valores hace avisar a
+        pandas).
+        """
+        mediciones = [m for r in (self, *otros) for m in r.mediciones]
+        return pd.DataFrame(
+            [asdict(m) for m in mediciones],
+            columns=["etapa", "segundos", "memoria_mb", "filas", "estado"],
+        )
+
+
+def registro_activo():
+    """``Registro`` en curso o ``None``."""
+    return _REGISTRO.get()
+
+
+@contextmanager
+def medir(etapa, filas=None):
+    """Mide el bloque y lo anota en el registro activo.
+
+    Devuelve un diccionario en el que el bloque puede fijar ``"filas"`` si
+    no las conoce de antemano.
+    """
+    registro = _REGISTRO.get()
+    datos = {"filas": filas}
+    if registro is None:
+        yield datos
+        return
+
+    ruta = "/".join(registro._ruta + [etapa])
+    registro._ruta.append(etapa)
+    con_memoria = registro.memoria and tracemalloc.is_tracing()
+    if con_memoria:
+        base, pico_previo = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        registro._picos.append(0)
+    inicio = time.perf_counter()
+    try:
+        yield datos
+    finally:
+        segundos = time.perf_counter() - inicio
+        memoria_mb = None
+        registro._ruta.pop()
+        if con_memoria:
+            _, pico = tracemalloc.get_traced_memory()
+            # ``reset_peak`` de los hijos borra el pico de este nivel: se
+            # recupera con el mayor pico que vieron ellos.
+            pico = max(pico, registro._picos.pop())
+            memoria_mb = max(pico - base, 0) / 2**20
+            if registro._picos:
+                registro._picos[-1] = max(registro._picos[-1], pico, pico_previo)
+        registro.anotar(ruta, segundos, memoria_mb, datos["filas"])
+
+
+@contextmanager
+def perfilar(activo=True):
+    """Captura un perfil de cProfile del bloque si ``activo``.
+
+    Devuelve un diccionario cuyo ``"perfil"`` es, al salir, el
+    ``cProfile.Profile`` (o ``None`` si no estaba activo).
+    """
+    datos = {"perfil": None}
+    if not activo:
+        yield datos
+        return
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield datos
+    finally:
+        perfil.disable()
+        datos["perfil"] = perfil
+
+
+def resumen_perfil(perfil, lineas=30, orden="cumulative"):
+    """Texto de ``pstats`` con las ``lineas`` funciones más costosas."""
+    salida = io.StringIO()
+    pstats.Stats(perfil, stream=salida).sort_stats(orden).print_stats(lineas)
+    return salida.getvalue()
+
+
+def datos_perfil(perfil):
+    """Perfil en el formato de ``dump_stats`` (para ``pstats`` o snakeviz)."""
+    perfil.create_stats()
+    return marshal.dumps(perfil.stats)
+
+
+def configurar_log(destino):
+    """Envía las líneas JSON de ``bess.rendimiento`` a un archivo (``"-"`` = stderr).
+
+    Llamarla otra vez con el mismo destino no duplica las líneas.
+    """
+    if destino in _MANEJADORES:
+        return _MANEJADORES[destino]
+    if destino == "-":
+        manejador = logging.StreamHandler()
+    else:
+        manejador = logging.FileHandler(destino, encoding="utf-8")
+    manejador.setFormatter(logging.Formatter("%(message)s"))
+    LOGGER.addHandler(manejador)
+    LOGGER.setLevel(logging.INFO)
+    _MANEJADORES[destino] = manejador
+    return manejador
@@ -0,0 +1,440 @@
+"""Análisis de sensibilidad de la duración y del margen."""
+import numpy as np
+import pandas as pd
+
+from .despacho import simular_duraciones, simular_margenes
+from .finanzas import evaluar_escenarios
+
+
+def barrer_duraciones(
+    precios,
+    potencia_mw,
+    max_h,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    umbral_carga,
+    umbral_descarga,
+    margen,
+    horario,
+    coste_carga,
+    coste_descarga,
+    paso=1.0,
+    ventana_dias=0,
+):
+    """Beneficio neto anual de las duraciones ``paso, 2*paso, ..., max_h``.
+
+    Es la parte de despacho de ``analizar_duracion``: no depende de ningún
+    parámetro económico.
+    """
+    duraciones = paso * np.arange(1, int(np.floor(max_h / paso + 1e-9)) + 1)
+    return simular_duraciones(
+        precios,
+        potencia_mw,
+        duraciones,
+        ef_carga,
+        ef_descarga,
+        estrategia,
+        umbral_carga,
+        umbral_descarga,
+        margen,
+        horario,
+        coste_carga=coste_carga,
+        coste_descarga=coste_descarga,
+        ventana_dias=ventana_dias,
+    )
+
+
+def valorar_duraciones(
+    anual,
+    potencia_mw,
+    degradacion,
+    capex_kwh,
+    coste_desarrollo_mw,
+    opex_kw,
+    tasa_descuento,
+    tipo_terreno,
+    coste_terreno,
+):
+    """VAN de cada duración de ``barrer_duraciones`` y duración óptima."""
+    duraciones = anual.columns.to_numpy(dtype=float)
+    van = evaluar_escenarios(
+        anual.iloc[0].to_numpy(),
+        potencia_mw,
+        duraciones,
+        degradacion,
+        capex_kwh,
+        coste_desarrollo_mw,
+        opex_kw,
+        tasa_descuento,
+        tipo_terreno,
+        coste_terreno,
+    )["van"]
+    df = pd.DataFrame({"Duración (h)": duraciones, "VAN": van})
+    opt = df.loc[df["VAN"].idxmax(), "Duración (h)"]
+    return df, opt
+
+
+def analizar_duracion(
+    precios,
+    potencia_mw,
+    max_h,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    umbral_carga,
+    umbral_descarga,
+    margen,
+    horario,
+    degradacion,
+    capex_kwh,
+    coste_desarrollo_mw,
+    opex_kw,
+    tasa_descuento,
+    coste_carga,
+    coste_descarga,
+    tipo_terreno,
+    coste_terreno,
+    paso=1.0,
+    ventana_dias=0,
+):
+    """Calculate VAN for each duration from paso to max_h (steps of paso).
+
+    All durations are simulated together with ``simular_duraciones``.
+    """
+    anual = barrer_duraciones(
+        precios,
+        potencia_mw,
+        max_h,
+        ef_carga,
+        ef_descarga,
+        estrategia,
+        umbral_carga,
+        umbral_descarga,
+        margen,
+        horario,
+        coste_carga,
+        coste_descarga,
+        paso,
+        ventana_dias,
+    )
+    return valorar_duraciones(
+        anual,
+        potencia_mw,
+        degradacion,
+        capex_kwh,
+        coste_desarrollo_mw,
+        opex_kw,
+        tasa_descuento,
+        tipo_terreno,
+        coste_terreno,
+    )
+
+
+def barrer_margenes(
+    precios,
+    potencia_mw,
+    duracion_h,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    umbral_carga,
+    umbral_descarga,
+    max_margen,
+    horario,
+    coste_carga,
+    coste_descarga,
+    paso=1.0,
+    ventana_dias=0,
+):
+    """Beneficio neto anual de los márgenes ``0, paso, ..., max_margen``.
+
+    Los márgenes son ``paso * i`` (sin acumular redondeos); es la parte de
+    despacho de ``analizar_margen``.
+    """
+    n = int(np.floor(max_margen / paso + 1e-9))
+    margenes = np.round(paso * np.arange(n + 1), 10)
+    return simular_margenes(
+        precios,
+        potencia_mw,
+        duracion_h,
+        ef_carga,
+        ef_descarga,
+        estrategia,
+        margenes,
+        umbral_carga,
+        umbral_descarga,
+        horario=horario,
+        coste_carga=coste_carga,
+        coste_descarga=coste_descarga,
+        ventana_dias=ventana_dias,
+    )
+
+
+def valorar_margenes(
+    anual,
+    potencia_mw,
+    duracion_h,
+    degradacion,
+    capex_kwh,
+    coste_desarrollo_mw,
+    opex_kw,
+    tasa_descuento,
+    tipo_terreno,
+    coste_terreno,
+):
+    """TIR de cada margen de ``barrer_margenes`` y margen óptimo."""
+    margenes = anual.columns.to_numpy(dtype=float)
+    tir = evaluar_escenarios(
+        anual.iloc[0].to_numpy(),
+        potencia_mw,
+        duracion_h,
+        degradacion,
+        capex_kwh,
+        coste_desarrollo_mw,
+        opex_kw,
+        tasa_descuento,
+        tipo_terreno,
+        coste_terreno,
+    )["tir"]
+    df = pd.DataFrame({"Margen (€/MWh)": margenes, "TIR": tir})
+    opt = df.loc[df["TIR"].idxmax(), "Margen (€/MWh)"]
+    return df, opt
+
+
+def analizar_margen(
+    precios,
+    potencia_mw,
+    duracion_h,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    umbral_carga,
+    umbral_descarga,
+    max_margen,
+    horario,
+    degradacion,
+    capex_kwh,
+    coste_desarrollo_mw,
+    opex_kw,
+    tasa_descuento,
+    coste_carga,
+    coste_descarga,
+    tipo_terreno,
+    coste_terreno,
+    paso=1.0,
+    ventana_dias=0,
+):
+    """Return TIR for margins from 0 to max_margen in steps of paso.
+
+    All margins are simulated together with ``simular_margenes``.
+    """
+    anual = barrer_margenes(
+        precios,
+        potencia_mw,
+        duracion_h,
+        ef_carga,
+        ef_descarga,
+        estrategia,
+        umbral_carga,
+        umbral_descarga,
+        max_margen,
+        horario,
+        coste_carga,
+        coste_descarga,
+        paso,
+        ventana_dias,
+    )
+    return valorar_margenes(
+        anual,
+        potencia_mw,
+        duracion_h,
+        degradacion,
+        capex_kwh,
+        coste_desarrollo_mw,
+        opex_kw,
+        tasa_descuento,
+        tipo_terreno,
+        coste_terreno,
+    )
+
+
+RAZON_AUREA = (np.sqrt(5) - 1) / 2
+
+
+def _maximo_aureo(evaluar, a, b, tolerancia, puntos=6):
+    """Puntos evaluados al buscar el máximo de ``evaluar`` en ``[a, b]``.
+
+    Primero se evalúa una rejilla gruesa de ``puntos`` en una sola llamada.
+    Luego se refina por sección áurea entre los vecinos del mejor punto,
+    con un punto nuevo por iteración, hasta que el intervalo mide menos de
+    ``tolerancia``. ``evaluar`` recibe un array de puntos y devuelve sus
+    valores (NaN cuenta como el peor). Los puntos ya evaluados no se repiten.
+    Devuelve ``{x: valor}``.
+    """
+    memo = {}
+
+    def valor(*xs):
+        nuevos = [float(x) for x in xs if float(x) not in memo]
+        if nuevos:
+            for x, v in zip(nuevos, evaluar(np.array(nuevos))):
+                memo[x] = v if np.isfinite(v) else -np.inf
+        return [memo[float(x)] for x in xs]
+
+    rejilla = np.linspace(a, b, puntos) if b > a else np.array([a])
+    i = int(np.argmax(valor(*rejilla)))
+    lo, hi = rejilla[max(i - 1, 0)], rejilla[min(i + 1, len(rejilla) - 1)]
+    c = hi - RAZON_AUREA * (hi - lo)
+    d = lo + RAZON_AUREA * (hi - lo)
+    fc, fd = valor(c, d)
+    while hi - lo > tolerancia:
+        if fc >= fd:
+            hi, d, fd = d, c, fc
+            c = hi - RAZON_AUREA * (hi - lo)
+            (fc,) = valor(c)
+        else:
+            lo, c, fc = c, d, fd
+            d = lo + RAZON_AUREA * (hi - lo)
+            (fd,) = valor(d)
+    return memo
+
+
+def _optimo(memo, columnas):
+    """Tabla ordenada de los puntos evaluados y mejor punto.
+
+    El óptimo no se redondea: el beneficio cambia a saltos con la duración y
+    el valor redondeado podría caer al otro lado de un salto.
+    """
+    df = pd.DataFrame(sorted(memo.items()), columns=columnas)
+    df[columnas[1]] = df[columnas[1]].replace(-np.inf, np.nan)
+    return df, max(memo, key=memo.get)
+
+
+def optimizar_duracion(
+    precios,
+    potencia_mw,
+    max_h,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    umbral_carga,
+    umbral_descarga,
+    margen,
+    horario,
+    degradacion,
+    capex_kwh,
+    coste_desarrollo_mw,
+    opex_kw,
+    tasa_descuento,
+    coste_carga,
+    coste_descarga,
+    tipo_terreno,
+    coste_terreno,
+    min_h=0.25,
+    tolerancia=0.01,
+    ventana_dias=0,
+):
+    """Duración de máximo VAN entre ``min_h`` y ``max_h`` como valor continuo.
+
+    Mismos argumentos que ``analizar_duracion``, pero en lugar de la rejilla
+    completa se hace una búsqueda adaptativa (``_maximo_aureo``): unas 20
+    duraciones simuladas para ``tolerancia=0.01`` h. Supone que el VAN es
+    unimodal cerca del mejor punto de la rejilla gruesa. Con "Óptima" el VAN
+    tiene pequeños dientes de sierra por la rejilla de SOC, así que se
+    obtiene un máximo local. Devuelve la tabla de duraciones evaluadas y la
+    óptima.
+    """
+
+    def van(duraciones):
+        anual = simular_duraciones(
+            precios,
+            potencia_mw,
+            duraciones,
+            ef_carga,
+            ef_descarga,
+            estrategia,
+            umbral_carga,
+            umbral_descarga,
+            margen,
+            horario,
+            coste_carga=coste_carga,
+            coste_descarga=coste_descarga,
+            ventana_dias=ventana_dias,
+        )
+        return evaluar_escenarios(
+            anual.iloc[0].to_numpy(),
+            potencia_mw,
+            duraciones,
+            degradacion,
+            capex_kwh,
+            coste_desarrollo_mw,
+            opex_kw,
+            tasa_descuento,
+            tipo_terreno,
+            coste_terreno,
+        )["van"]
+
+    memo = _maximo_aureo(van, min_h, max_h, tolerancia)
+    return _optimo(memo, ["Duración (h)", "VAN"])
+
+
+def optimizar_margen(
+    precios,
+    potencia_mw,
+    duracion_h,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    umbral_carga,
+    umbral_descarga,
+    max_margen,
+    horario,
+    degradacion,
+    capex_kwh,
+    coste_desarrollo_mw,
+    opex_kw,
+    tasa_descuento,
+    coste_carga,
+    coste_descarga,
+    tipo_terreno,
+    coste_terreno,
+    tolerancia=0.1,
+    ventana_dias=0,
+):
+    """Margen de máxima TIR entre 0 y ``max_margen`` como valor continuo.
+
+    Versión adaptativa de ``analizar_margen``, como ``optimizar_duracion``.
+    Los márgenes con TIR indefinida cuentan como los peores.
+    """
+
+    def tir(margenes):
+        anual = simular_margenes(
+            precios,
+            potencia_mw,
+            duracion_h,
+            ef_carga,
+            ef_descarga,
+            estrategia,
+            margenes,
+            umbral_carga,
+            umbral_descarga,
+            horario=horario,
+            coste_carga=coste_carga,
+            coste_descarga=coste_descarga,
+            ventana_dias=ventana_dias,
+        )
+        return evaluar_escenarios(
+            anual.iloc[0].to_numpy(),
+            potencia_mw,
+            duracion_h,
+            degradacion,
+            capex_kwh,
+            coste_desarrollo_mw,
+            opex_kw,
+            tasa_descuento,
+            tipo_terreno,
+            coste_terreno,
+        )["tir"]
+
+    memo = _maximo_aureo(tir, 0.0, max_margen, tolerancia)
+    return _optimo(memo, ["Margen (€/MWh)", "TIR"])
@@ -0,0 +1,19 @@
+"""Rangos de coste, ciclos de vida y degradación por tecnología."""
+
+TECHS = {
+    "Li-ion LFP": {
+        "costo": (220, 240),
+        "ciclos": (6000, 10000),
+        "degrad": (1.5, 2.5),
+    },
+    "Li-ion NMC": {
+        "costo": (250, 280),
+        "ciclos": (4000, 7000),
+        "degrad": (2.5, 4.0),
+    },
+    "Sodio-ion (Na-ion)": {
+        "costo": (280, 320),
+        "ciclos": (3000, 6000),
+        "degrad": (2.0, 3.0),
+    },
+}
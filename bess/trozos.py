@@ -0,0 +1,151 @@
+"""Simulación por trozos con memoria acotada para series muy largas.
+
+Los precios se consumen en trozos; el SOC pasa de un trozo al siguiente y
+cada trozo se reduce enseguida a totales mensuales y, si se pide, se añade a
+un CSV en disco. La memoria máxima depende del tamaño del trozo, no del
+horizonte.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from .datos import ALMACEN, _leer_manifiesto
+from .despacho import _despachar, _despacho_optimo, _resultado, _senales, resumen_mensual
+
+TROZO_FILAS = 1 << 18
+
+
+def trozos_df(precios, filas=TROZO_FILAS):
+    """Trozos consecutivos de ``filas`` filas de un DataFrame de precios."""
+    for inicio in range(0, len(precios), filas):
+        yield precios.iloc[inicio:inicio + filas]
+
+
+def trozos_almacen(zona, directorio=ALMACEN, filas=TROZO_FILAS, desde=None, hasta=None):
+    """Trozos de ``zona`` leídos del almacén sin cargar la serie completa.
+
+    Cada partición anual se abre con mmap y solo se copian las filas del
+    trozo en curso; ``desde`` y ``hasta`` recortan la serie por fecha.
+    """
+    particiones = _leer_manifiesto(directorio)["zonas"].get(zona, {})
+    for anio in sorted(particiones, key=int):
+        carpeta = os.path.join(directorio, zona, anio)
+        fecha = np.load(os.path.join(carpeta, "fecha.npy"), mmap_mode="r")
+        precio = np.load(os.path.join(carpeta, "precio.npy"), mmap_mode="r")
+        a = 0 if desde is None else np.searchsorted(fecha, np.datetime64(desde, "ns"))
+        b = (
+            len(fecha)
+            if hasta is None
+            else np.searchsorted(fecha, np.datetime64(hasta, "ns"), side="right")
+        )
+        for inicio in range(a, b, filas):
+            fin = min(inicio + filas, b)
+            yield pd.DataFrame({
+                "Fecha": np.array(fecha[inicio:fin]),
+                "Precio": np.array(precio[inicio:fin]),
+            })
+
+
+def _por_dias(trozos):
+    """Reagrupa los trozos para que ningún día quede partido entre dos.
+
+    Las filas del último día de cada trozo se retienen y se anteponen al
+    siguiente, así las estadísticas diarias de las estrategias son exactas.
+    """
+    resto = None
+    for trozo in trozos:
+        if resto is not None:
+            trozo = pd.concat([resto, trozo], ignore_index=True)
+        if trozo.empty:
+            continue
+        dias = trozo["Fecha"].to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+        corte = np.searchsorted(dias, dias[-1])
+        resto = trozo.iloc[corte:]
+        if corte:
+            yield trozo.iloc[:corte].reset_index(drop=True)
+    if resto is not None and not resto.empty:
+        yield resto.reset_index(drop=True)
+
+
+def simular_por_trozos(
+    trozos,
+    potencia_mw,
+    duracion_h,
+    ef_carga,
+    ef_descarga,
+    estrategia,
+    umbral_carga=0.25,
+    umbral_descarga=0.75,
+    margen=0,
+    horario=None,
+    coste_carga=0.0,
+    coste_descarga=0.0,
+    ventana_dias=0,
+    salida=None,
+):
+    """``simular`` sobre un iterable de trozos de precios ordenados por fecha.
+
+    Devuelve el resumen mensual (mismo formato que ``resumen_mensual``). Si se
+    indica ``salida``, los resultados horarios se van añadiendo a ese CSV.
+    Los trozos se alinean a días completos y el SOC final de cada uno es el
+    inicial del siguiente, así que con las estrategias heurísticas el
+    resultado coincide con ``simular`` sobre la serie completa. Con "Óptima"
+    cada trozo se optimiza por separado partiendo del SOC heredado. Con
+    ``ventana_dias`` se guardan los últimos días de cada trozo para calcular
+    los umbrales causales del siguiente.
+    """
+    energia_mwh = potencia_mw * duracion_h
+    soc = 0.0
+    contexto = None
+    partes = []
+    if salida is not None and os.path.exists(salida):
+        os.remove(salida)
+    for trozo in _por_dias(trozos):
+        if estrategia == "Óptima":
+            despacho = _despacho_optimo(
+                trozo["Precio"].to_numpy(dtype=float),
+                potencia_mw * ef_carga,
+                potencia_mw * ef_descarga,
+                energia_mwh,
+                coste_carga,
+                coste_descarga,
+                soc_inicial=soc,
+            )
+        else:
+            ampliado = (
+                trozo
+                if contexto is None
+                else pd.concat([contexto, trozo], ignore_index=True)
+            )
+            senal = _senales(
+                ampliado,
+                estrategia,
+                umbral_carga,
+                umbral_descarga,
+                margen,
+                horario,
+                ventana_dias,
+            )[len(ampliado) - len(trozo):]
+            if ventana_dias:
+                desde = trozo["Fecha"].iloc[-1] - pd.Timedelta(days=ventana_dias)
+                contexto = ampliado[ampliado["Fecha"] >= desde]
+            despacho = _despachar(
+                senal, potencia_mw, energia_mwh, ef_carga, ef_descarga, soc_inicial=soc
+            )
+        resultado = _resultado(trozo, *despacho, coste_carga, coste_descarga)
+        soc = float(despacho[2][-1])
+        partes.append(resumen_mensual(resultado))
+        if salida is not None:
+            resultado.to_csv(
+                salida, mode="a", header=not os.path.exists(salida), index=False
+            )
+    if not partes:
+        return pd.DataFrame(
+            columns=["Carga (MWh)", "Descarga (MWh)", "Beneficio neto (€)"],
+            index=pd.DatetimeIndex([], name="Mes"),
+            dtype=float,
+        )
+    # Un mes partido entre dos trozos aparece en ambos resúmenes.
+    mensual = pd.concat(partes).groupby(level=0).sum()
+    return mensual.resample("ME").sum().rename_axis("Mes")
@@ -1,15 +1,33 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
-import numpy_financial as npf
+import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import textwrap
 import os
+import textwrap
 from datetime import timedelta
+from functools import partial
 from dateutil.relativedelta import relativedelta
 
+from bess.cartera import analizar_cartera
+from bess.comparativa import comparar_zonas
+from bess.datos import ZONAS, cargar_precios, informe_ingesta, leer_almacen
+from bess.etapas import DESPACHO, ECONOMIA, ETAPAS, Canalizacion, Etapa
+from bess.exportar import FORMATOS, exportar
+from bess.graficos import MAX_PUNTOS, lttb
+from bess.montecarlo import resumen_montecarlo
+from bess.rejilla import EJES
+from bess.rendimiento import (
+    Registro,
+    configurar_log,
+    datos_perfil,
+    medir,
+    perfilar,
+    resumen_perfil,
+)
+from bess.tecnologias import TECHS
+
 
 def fmt_eur(valor: float) -> str:
     """Formatea un número usando el estilo europeo y sin decimales."""
@@ -20,6 +38,82 @@ def fmt_miles_eur(valor: float) -> str:
     """Formato europeo en miles de euros sin decimales."""
     return fmt_eur(valor / 1000)
 
+# Ejes y rangos de cada par de la sensibilidad 2D.
+PARES_REJILLA = {
+    "Umbral de carga × Umbral de descarga": (
+        "umbral_carga", (0.05, 0.5), "umbral_descarga", (0.5, 0.95)
+    ),
+    "Duración × Margen": ("duracion_h", (0.5, 10.0), "margen", (0.0, 30.0)),
+    "Potencia × Duración": ("potencia_mw", (1.0, 100.0), "duracion_h", (0.5, 10.0)),
+}
+
+# Cartera de partida del editor y nombres de sus columnas en ``bess.cartera``.
+CARTERA_INICIAL = pd.DataFrame(
+    {
+        "Activo": ["Activo 1", "Activo 2", "Activo 3"],
+        "Zona": ["NORD", "CSUD", "SICILY"],
+        "Potencia (MW)": [10.0, 20.0, 5.0],
+        "Duración (h)": [4.0, 2.0, 6.0],
+    }
+)
+COLUMNAS_CARTERA = {
+    "Activo": "activo",
+    "Zona": "zona",
+    "Potencia (MW)": "potencia_mw",
+    "Duración (h)": "duracion_h",
+}
+
+FORMATOS_DESCARGA = {
+    "CSV": "csv",
+    "CSV comprimido": "csv.gz",
+    "Parquet": "parquet",
+}
+
+
+def _comparativa(comparar, desde, hasta, **parametros):
+    if not comparar:
+        return None
+    return comparar_zonas(
+        {k: parametros[k] for k in DESPACHO},
+        {k: parametros[k] for k in ECONOMIA},
+        desde,
+        hasta,
+    )
+
+
+def _cartera(cartera, desde, hasta, **parametros):
+    if not cartera:
+        return None
+    activos = pd.DataFrame(cartera).set_index("activo")
+    precios = {}
+    omitidas = []
+    for zona in activos["zona"].unique():
+        serie = leer_almacen(zona)
+        if serie is None:
+            omitidas.append(zona)
+            continue
+        precios[zona] = serie[(serie["Fecha"] >= desde) & (serie["Fecha"] <= hasta)]
+    activos = activos[activos["zona"].isin(list(precios))]
+    if activos.empty:
+        return None, None, omitidas
+    tabla, total = analizar_cartera(
+        activos,
+        precios,
+        {k: parametros[k] for k in DESPACHO},
+        {k: parametros[k] for k in ECONOMIA},
+    )
+    return tabla, total, omitidas
+
+
+ETAPAS_APP = ETAPAS + (
+    Etapa(
+        "comparativa",
+        ("comparar", "desde", "hasta") + DESPACHO + ECONOMIA,
+        _comparativa,
+    ),
+    Etapa("cartera", ("cartera", "desde", "hasta") + DESPACHO + ECONOMIA, _cartera),
+)
+
 RESULT_KEYS = [
     "resultado",
     "mensual",
@@ -48,6 +142,15 @@ RESULT_KEYS = [
     "coste_terreno",
     "tipo_terreno",
     "cuenta_resultados",
+    "cuenta_df",
+    "comparativa",
+    "cartera",
+    "montecarlo",
+    "rejilla",
+    "plurianual",
+    "ingesta",
+    "rendimiento",
+    "perfil",
 ]
 
 def reset_sidebar():
@@ -56,26 +159,12 @@ def reset_sidebar():
         del st.session_state[k]
     st.experimental_rerun()
 
-TECHS = {
-    "Li-ion LFP": {
-        "costo": (220, 240),
-        "ciclos": (6000, 10000),
-        "degrad": (1.5, 2.5),
-    },
-    "Li-ion NMC": {
-        "costo": (250, 280),
-        "ciclos": (4000, 7000),
-        "degrad": (2.5, 4.0),
-    },
-    "Sodio-ion (Na-ion)": {
-        "costo": (280, 320),
-        "ciclos": (3000, 6000),
-        "degrad": (2.0, 3.0),
-    },
-}
-
 st.set_page_config(page_title="Simulador de BESS", layout="wide")
 
+# Líneas JSON con el rendimiento de cada etapa para la monitorización.
+if os.environ.get("BESS_LOG_RENDIMIENTO"):
+    configurar_log(os.environ["BESS_LOG_RENDIMIENTO"])
+
 # Initialize session state variables for results
 for k in RESULT_KEYS:
     st.session_state.setdefault(k, None)
@@ -83,258 +172,475 @@ for k in RESULT_KEYS:
 # --- Cargar datos ---
 @st.cache_data
 def cargar_datos(zona, archivo=None):
-    if archivo is not None:
-        if archivo.name.endswith(".csv"):
-            df = pd.read_csv(archivo)
-        else:
-            df = pd.read_excel(archivo)
-    else:
-        path = "Precios_Mercado_Italiano_2024.xlsx"
-        if not os.path.exists(path):
-            alt_path = "data/precios_italia_2024.xlsx"
-            if os.path.exists(alt_path):
-                path = alt_path
-            else:
-                alt_path2 = "data/precios_italia.xlsx"
-                if os.path.exists(alt_path2):
-                    path = alt_path2
-                else:
-                    st.error(f"Archivo predeterminado no encontrado: {path}")
-                    st.stop()
-        df = pd.read_excel(path, sheet_name=zona)
-    df["Fecha"] = pd.to_datetime(df["Fecha"])
-    return df
-
-# --- Simulación ---
-def simular(
-    precios,
-    potencia_mw,
-    duracion_h,
-    ef_carga,
-    ef_descarga,
-    estrategia,
-    umbral_carga=0.25,
-    umbral_descarga=0.75,
-    margen=0,
-    horario=None,
-    coste_carga=0.0,
-    coste_descarga=0.0,
-):
-    energia_mwh = potencia_mw * duracion_h
-    capacidad_actual = 0
-    resultados = []
-
-    media_global = precios["Precio"].mean()
-    media_d = (
-        precios.groupby(precios["Fecha"].dt.date)["Precio"].mean().to_dict()
-    )
-    p_inf_d = (
-        precios.groupby(precios["Fecha"].dt.date)["Precio"]
-        .quantile(umbral_carga)
-        .to_dict()
-    )
-    p_sup_d = (
-        precios.groupby(precios["Fecha"].dt.date)["Precio"]
-        .quantile(umbral_descarga)
-        .to_dict()
-    )
-
-    for _, row in precios.iterrows():
-        precio = row["Precio"]
-        fecha_d = row["Fecha"].date()
-        p_inf = p_inf_d.get(fecha_d, media_global)
-        p_sup = p_sup_d.get(fecha_d, media_global)
-        media_dia = media_d.get(fecha_d, media_global)
-        estado = "Reposo"
-        carga = descarga = 0
-
-        if estrategia == "Percentiles":
-            if precio < p_inf and capacidad_actual < energia_mwh:
-                carga = potencia_mw * ef_carga
-                capacidad_actual += carga
-                estado = "Carga"
-            elif precio > p_sup and capacidad_actual > 0:
-                descarga = min(potencia_mw * ef_descarga, capacidad_actual)
-                capacidad_actual -= descarga
-                estado = "Descarga"
-
-        elif estrategia == "Margen fijo":
-            if precio < media_dia - margen and capacidad_actual < energia_mwh:
-                carga = potencia_mw * ef_carga
-                capacidad_actual += carga
-                estado = "Carga"
-            elif precio > media_dia + margen and capacidad_actual > 0:
-                descarga = min(potencia_mw * ef_descarga, capacidad_actual)
-                capacidad_actual -= descarga
-                estado = "Descarga"
-
-        elif estrategia == "Programada" and horario is not None:
-            accion = horario.get(row["Fecha"].hour)
-            if accion == "C" and capacidad_actual < energia_mwh:
-                carga = potencia_mw * ef_carga
-                capacidad_actual += carga
-                estado = "Carga"
-            elif accion == "D" and capacidad_actual > 0:
-                descarga = min(potencia_mw * ef_descarga, capacidad_actual)
-                capacidad_actual -= descarga
-                estado = "Descarga"
-
-        coste_c = coste_carga * carga
-        coste_d = coste_descarga * descarga
-        benef_bruto = precio * descarga - precio * carga
-        benef_neto = benef_bruto - coste_c - coste_d
-
-        resultados.append({
-            "Fecha": row["Fecha"],
-            "Precio": precio,
-            "Carga (MWh)": carga,
-            "Descarga (MWh)": descarga,
-            "Coste carga (€)": coste_c,
-            "Coste descarga (€)": coste_d,
-            "Beneficio bruto (€)": benef_bruto,
-            "Beneficio neto (€)": benef_neto,
-            "SOC (MWh)": capacidad_actual,
-            "Estado": estado,
-        })
-
-    return pd.DataFrame(resultados)
-
-def resumen_mensual(df):
-    return (
-        df.resample("M", on="Fecha")
-          .agg({"Carga (MWh)": "sum",
-                "Descarga (MWh)": "sum",
-                "Beneficio neto (€)": "sum"})
-          .rename_axis("Mes")
-    )
-
-def analizar_duracion(
-    precios,
-    potencia_mw,
-    max_h,
-    ef_carga,
-    ef_descarga,
-    estrategia,
-    umbral_carga,
-    umbral_descarga,
-    margen,
-    horario,
-    degradacion,
-    capex_kwh,
-    coste_desarrollo_mw,
-    opex_kw,
-    tasa_descuento,
-    coste_carga,
-    coste_descarga,
-    tipo_terreno,
-    coste_terreno,
-):
-    """Calculate VAN for each duration from 1 to max_h."""
-    datos = []
-    for h in range(1, max_h + 1):
-        res = simular(
-            precios,
-            potencia_mw,
-            h,
-            ef_carga,
-            ef_descarga,
-            estrategia,
-            umbral_carga,
-            umbral_descarga,
-            margen,
-            horario,
-            coste_carga=coste_carga,
-            coste_descarga=coste_descarga,
+    try:
+        return cargar_precios(zona, archivo)
+    except (FileNotFoundError, ValueError) as e:
+        st.error(str(e))
+        st.stop()
+
+
+def mostrar_ingesta(informe):
+    """Informe de validación del archivo de precios subido."""
+    correcciones = informe[
+        [
+            "Fechas no válidas",
+            "Precios no numéricos",
+            "Duplicadas",
+            "Fuera de rejilla",
+            "Filas rellenadas",
+            "Filas sin precio",
+        ]
+    ].to_numpy().sum()
+    with st.expander("🧾 Validación del archivo de precios", expanded=bool(correcciones)):
+        if correcciones:
+            st.warning(
+                "Se han corregido fechas repetidas, huecos o valores no válidos; "
+                "las filas que siguen sin precio no se operan."
+            )
+        st.dataframe(informe, use_container_width=True)
+
+
+def mostrar_comparativa(comparativa):
+    """Tabla ordenada y beneficio mensual superpuesto de todas las zonas."""
+    tabla, mensual, omitidas = comparativa
+    st.subheader("🗺️ Comparativa de zonas")
+    if omitidas:
+        st.warning(
+            f"Sin precios en el almacén para {', '.join(omitidas)}: "
+            "estas zonas no se han comparado."
+        )
+    if tabla is None:
+        return
+    st.dataframe(
+        tabla.style.format({
+            "Ingreso anual (€)": fmt_eur,
+            "VAN (€)": fmt_eur,
+            "TIR proyecto": "{:.2%}",
+            "TIR equity": "{:.2%}",
+            "Ciclos/año": "{:.1f}",
+        }),
+        use_container_width=True,
+    )
+    largo = mensual.reset_index().melt(
+        id_vars="Mes", var_name="Zona", value_name="Beneficio neto (€)"
+    )
+    fig_z = px.line(
+        largo,
+        x="Mes",
+        y="Beneficio neto (€)",
+        color="Zona",
+        markers=True,
+        title="Beneficio mensual por zona",
+    )
+    st.plotly_chart(fig_z, use_container_width=True)
+
+
+def mostrar_cartera(cartera):
+    """Indicadores de la cartera, tabla por activo y VAN de cada uno."""
+    tabla, total, omitidas = cartera
+    st.subheader("🏭 Cartera de activos")
+    if omitidas:
+        st.warning(
+            f"Sin precios en el almacén para {', '.join(omitidas)}: "
+            "los activos de estas zonas no se han evaluado."
+        )
+    if tabla is None:
+        return
+    col_van, col_tir, col_equity = st.columns(3)
+    col_van.metric("VAN de la cartera (miles €)", fmt_miles_eur(total["van"]))
+    col_tir.metric("TIR de la cartera", f"{total['tir']:.2%}")
+    col_equity.metric("TIR equity de la cartera", f"{total['tir_equity']:.2%}")
+    st.caption(
+        f"{len(tabla)} activos, inversión de {fmt_miles_eur(total['capex_total'])} "
+        f"miles de € e ingreso anual de {fmt_miles_eur(total['ingreso_anual'])} "
+        "miles de €. La TIR de la cartera es la de la suma de los flujos."
+    )
+    st.dataframe(
+        tabla.style.format({
+            "Potencia (MW)": "{:.1f}",
+            "Duración (h)": "{:.2f}",
+            "Ingreso anual (€)": fmt_eur,
+            "Ciclos/año": "{:.1f}",
+            "CAPEX (€)": fmt_eur,
+            "VAN (€)": fmt_eur,
+            "TIR proyecto": "{:.2%}",
+            "TIR equity": "{:.2%}",
+        }),
+        use_container_width=True,
+    )
+    fig = px.bar(
+        tabla.reset_index(), x="Activo", y="VAN (€)", color="Zona", title="VAN por activo"
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def mostrar_montecarlo(sorteo):
+    """Percentiles, probabilidad de VAN negativo e histogramas del Monte Carlo."""
+    tabla, prob_negativo = resumen_montecarlo(sorteo)
+    st.subheader("🎲 Análisis Monte Carlo")
+    st.caption(
+        f"{len(sorteo):,} sorteos de CAPEX, degradación, ciclos de vida, OPEX, "
+        "coste de financiación y escala de ingresos".replace(",", ".")
+    )
+    st.metric("Probabilidad de VAN negativo", f"{prob_negativo:.1%}")
+    st.dataframe(
+        tabla.style.format(
+            lambda v: f"{v * 100:.2f} %", subset=pd.IndexSlice[["TIR", "TIR equity"], :]
+        ).format(fmt_miles_eur, subset=pd.IndexSlice[["VAN"], :]),
+        use_container_width=True,
+    )
+    st.caption("VAN en miles de euros")
+    fig_van = px.histogram(sorteo, x="VAN", nbins=60, title="Distribución del VAN")
+    fig_van.add_vline(x=0, line_dash="dash", line_color="red")
+    st.plotly_chart(fig_van, use_container_width=True)
+    fig_tir = px.histogram(sorteo, x="TIR", nbins=60, title="Distribución de la TIR")
+    st.plotly_chart(fig_tir, use_container_width=True)
+
+
+def mostrar_plurianual(plurianual):
+    """Capacidad, ciclos y beneficio de cada año del despacho con degradación."""
+    st.subheader("📉 Despacho año a año")
+    st.caption(
+        "Cada año se despacha con sus precios y la capacidad que le queda; "
+        "los ingresos del modelo financiero salen de esta tabla."
+    )
+    fig = go.Figure()
+    fig.add_bar(
+        x=plurianual.index,
+        y=plurianual["Beneficio neto (€)"] / 1000,
+        name="Beneficio neto (miles de €)",
+    )
+    fig.add_scatter(
+        x=plurianual.index,
+        y=plurianual["Capacidad (%)"],
+        name="Capacidad (%)",
+        yaxis="y2",
+        mode="lines+markers",
+    )
+    fig.update_layout(
+        xaxis_title="Año",
+        yaxis_title="Beneficio neto (miles de €)",
+        yaxis2={"title": "Capacidad (%)", "overlaying": "y", "side": "right"},
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(
+        plurianual.style.format(
+            {
+                "Capacidad (%)": "{:.1f}",
+                "Capacidad (MWh)": "{:.2f}",
+                "Ciclos": "{:.1f}",
+                "Beneficio neto (€)": fmt_miles_eur,
+            }
+        ),
+        use_container_width=True,
+    )
+    st.caption("Beneficio neto en miles de euros")
+
+
+def mostrar_rejilla(rejilla):
+    """Mapas de calor de VAN y TIR de la sensibilidad 2D con el óptimo marcado."""
+    tabla, optimo = rejilla
+    eje_x, eje_y = tabla.columns[:2]
+    st.subheader("🧭 Sensibilidad 2D")
+    for metrica, escala, unidad in (("VAN", 1 / 1000, "miles €"), ("TIR", 100, "%")):
+        mapa = tabla.pivot(index=eje_y, columns=eje_x, values=metrica) * escala
+        fig = px.imshow(
+            mapa,
+            origin="lower",
+            aspect="auto",
+            color_continuous_scale="RdYlGn",
+            labels={"x": EJES[eje_x], "y": EJES[eje_y], "color": f"{metrica} ({unidad})"},
+            title=f"{metrica} según {EJES[eje_x].lower()} y {EJES[eje_y].lower()}",
+        )
+        if optimo[metrica] is not None:
+            x, y = optimo[metrica]
+            fig.add_trace(
+                go.Scatter(
+                    x=[x],
+                    y=[y],
+                    mode="markers",
+                    marker={"symbol": "x", "size": 14, "color": "black"},
+                    name="Óptimo",
+                )
+            )
+            st.caption(
+                f"Mejor {metrica} en {EJES[eje_x]} = {x:.2f}, {EJES[eje_y]} = {y:.2f}"
+            )
+        st.plotly_chart(fig, use_container_width=True)
+
+
+def mostrar_rendimiento(registro, dibujo, perfil):
+    """Tiempo, memoria y filas de cada etapa de la última ejecución."""
+    with st.expander("⏱️ Rendimiento"):
+        if registro is None:
+            st.caption("Ejecuta la simulación para medir sus etapas.")
+            return
+        tabla = registro.tabla(dibujo)
+        calculadas = tabla[tabla["estado"] == "calculada"]
+        raiz = calculadas[~calculadas["etapa"].str.contains("/")]
+        st.metric("Tiempo total", f"{raiz['segundos'].sum():.2f} s")
+        st.dataframe(
+            tabla.rename(
+                columns={
+                    "etapa": "Etapa",
+                    "segundos": "Tiempo (s)",
+                    "memoria_mb": "Memoria máx. (MB)",
+                    "filas": "Filas",
+                    "estado": "Estado",
+                }
+            ),
+            use_container_width=True,
+        )
+        if not registro.memoria:
+            st.caption("La memoria se mide a partir de la siguiente ejecución.")
+        if perfil is not None:
+            st.code(perfil["texto"])
+            st.download_button(
+                "Descargar perfil (.prof)",
+                perfil["datos"],
+                file_name="bess.prof",
+                mime="application/octet-stream",
+            )
+
+
+def grafico_precio_soc(fecha, precio, soc, titulo):
+    """Precio y SOC en ejes independientes."""
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Scatter(x=fecha, y=precio, name="Precio"), secondary_y=False)
+    fig.add_trace(go.Scatter(x=fecha, y=soc, name="SOC (MWh)"), secondary_y=True)
+    fig.update_layout(title=titulo)
+    fig.update_yaxes(title_text="Precio", secondary_y=False)
+    fig.update_yaxes(title_text="SOC (MWh)", secondary_y=True)
+    return fig
+
+
+def mostrar_resultados(estado):
+    """Pestañas de resultados a partir de los valores guardados en la sesión."""
+    resultado = estado["resultado"]
+    mensual = estado["mensual"]
+    fi_date = estado["fi_date"]
+    ff_date = estado["ff_date"]
+    sens_df = estado["sens_dur"]
+    horas_opt = estado["horas_optimas"]
+    sens_mar = estado["sens_margen"]
+    margen_opt = estado["margen_optimo"]
+    comparativa = estado["comparativa"]
+
+    extras = {
+        "Comparativa zonas": comparativa,
+        "Cartera": estado["cartera"],
+        "Sensibilidad 2D": estado["rejilla"],
+    }
+    extras = {k: v for k, v in extras.items() if v is not None}
+    tab_res, tab_graf, tab_ind, *tab_extra = st.tabs(
+        ["Resultados", "Gráficas", "Resultados económicos"] + list(extras)
+    )
+    tab_extra = dict(zip(extras, tab_extra))
+
+    with tab_res:
+        if estado["ingesta"] is not None:
+            mostrar_ingesta(estado["ingesta"])
+        st.subheader("📈 Resultados horarios")
+        st.dataframe(resultado.head(100), use_container_width=True)
+        st.subheader("📅 Resumen mensual")
+        st.dataframe(mensual, use_container_width=True)
+        etiqueta = st.selectbox(
+            "Formato de descarga", list(FORMATOS_DESCARGA), key="formato_descarga"
+        )
+        formato = FORMATOS_DESCARGA[etiqueta]
+        extension, mime = FORMATOS[formato]
+        # Las exportaciones se generan solo al pulsar el botón.
+        st.download_button(
+            f"Descargar resultados ({etiqueta})",
+            partial(exportar, resultado, formato),
+            f"resultados_bess{extension}",
+            mime,
+        )
+        st.download_button(
+            f"Descargar resumen mensual ({etiqueta})",
+            partial(exportar, mensual, formato),
+            f"resumen_mensual{extension}",
+            mime,
         )
-        first_year = res["Fecha"].dt.year.min()
-        ingreso_anual = res[res["Fecha"].dt.year == first_year]["Beneficio neto (€)"].sum()
-        capex_bat = potencia_mw * h * 1000 * capex_kwh
-        coste_dev = potencia_mw * coste_desarrollo_mw
-        capex_total = capex_bat + coste_dev
-        if tipo_terreno == "Compra":
-            capex_total += coste_terreno
-            gasto_terreno = 0
+
+    with tab_graf:
+        dia = st.slider(
+            "Día a visualizar",
+            min_value=fi_date,
+            max_value=ff_date,
+            value=st.session_state.get("dia_graf", fi_date),
+            format="YYYY-MM-DD",
+            key="dia_graf",
+        )
+        diario = resultado.dia(dia)
+        if len(diario):
+            st.plotly_chart(
+                grafico_precio_soc(
+                    diario.fecha, diario.precio, diario.soc, f"Precio y SOC - {dia}"
+                ),
+                use_container_width=True,
+            )
         else:
-            gasto_terreno = coste_terreno
-        inversion = -capex_total
-        ingresos = [ingreso_anual * (1 - degradacion / 100) ** i for i in range(15)]
-        flujo = [inversion] + [ingresos[i] - potencia_mw * 1000 * opex_kw - gasto_terreno for i in range(15)]
-        van = npf.npv(tasa_descuento / 100, flujo)
-        datos.append({"Duración (h)": h, "VAN": van})
-    df = pd.DataFrame(datos)
-    opt = df.loc[df["VAN"].idxmax(), "Duración (h)"]
-    return df, opt
-
-def analizar_margen(
-    precios,
-    potencia_mw,
-    duracion_h,
-    ef_carga,
-    ef_descarga,
-    estrategia,
-    umbral_carga,
-    umbral_descarga,
-    max_margen,
-    horario,
-    degradacion,
-    capex_kwh,
-    coste_desarrollo_mw,
-    opex_kw,
-    tasa_descuento,
-    coste_carga,
-    coste_descarga,
-    tipo_terreno,
-    coste_terreno,
-    paso=1.0,
-):
-    """Return TIR for margins from 0 to max_margen."""
-    datos = []
-    m = 0.0
-    while m <= max_margen:
-        res = simular(
-            precios,
-            potencia_mw,
-            duracion_h,
-            ef_carga,
-            ef_descarga,
-            estrategia,
-            umbral_carga,
-            umbral_descarga,
-            margen=m,
-            horario=horario,
-            coste_carga=coste_carga,
-            coste_descarga=coste_descarga,
+            st.info("No hay datos para ese día")
+
+        year_sel = st.selectbox("Año", resultado.indice.anios(), key="sel_year")
+        month_sel = st.selectbox(
+            "Mes", resultado.indice.meses_de(year_sel), key="sel_month"
         )
-        first_year = res["Fecha"].dt.year.min()
-        ingreso_anual = res[res["Fecha"].dt.year == first_year]["Beneficio neto (€)"].sum()
-        capex_bat = potencia_mw * duracion_h * 1000 * capex_kwh
-        coste_dev = potencia_mw * coste_desarrollo_mw
-        capex_total = capex_bat + coste_dev
-        if tipo_terreno == "Compra":
-            capex_total += coste_terreno
-            gasto_terreno = 0
+        periodo = resultado.mes(year_sel, month_sel)
+        if len(periodo):
+            st.plotly_chart(
+                grafico_precio_soc(
+                    periodo.fecha,
+                    periodo.precio,
+                    periodo.soc,
+                    f"Precio y Estado de Carga - {year_sel}-{month_sel:02d}",
+                ),
+                use_container_width=True,
+            )
         else:
-            gasto_terreno = coste_terreno
-        inversion = -capex_total
-        ingresos = [ingreso_anual * (1 - degradacion / 100) ** i for i in range(15)]
-        flujo = [inversion] + [ingresos[i] - potencia_mw * 1000 * opex_kw - gasto_terreno for i in range(15)]
-        tir = npf.irr(flujo)
-        datos.append({"Margen (€/MWh)": m, "TIR": tir})
-        m += paso
-    df = pd.DataFrame(datos)
-    opt = df.loc[df["TIR"].idxmax(), "Margen (€/MWh)"]
-    return df, opt
+            st.info("No hay datos para ese período")
+
+        # Horizonte completo reducido con LTTB para no enviar todas las horas.
+        i_precio = lttb(resultado.fecha, resultado.precio)
+        i_soc = lttb(resultado.fecha, resultado.soc)
+        fig_h = make_subplots(specs=[[{"secondary_y": True}]])
+        fig_h.add_trace(
+            go.Scattergl(
+                x=resultado.fecha[i_precio], y=resultado.precio[i_precio], name="Precio"
+            ),
+            secondary_y=False,
+        )
+        fig_h.add_trace(
+            go.Scattergl(
+                x=resultado.fecha[i_soc], y=resultado.soc[i_soc], name="SOC (MWh)"
+            ),
+            secondary_y=True,
+        )
+        fig_h.update_layout(title="Precio y SOC - horizonte completo")
+        fig_h.update_yaxes(title_text="Precio", secondary_y=False)
+        fig_h.update_yaxes(title_text="SOC (MWh)", secondary_y=True)
+        st.plotly_chart(fig_h, use_container_width=True)
+        if len(resultado) > MAX_PUNTOS:
+            st.caption(
+                f"Serie reducida a {MAX_PUNTOS} puntos por curva (LTTB) "
+                f"de {len(resultado)} horas."
+            )
+
+        fig_b = px.bar(mensual.reset_index(), x="Mes", y="Beneficio neto (€)", title="Beneficio mensual")
+        st.plotly_chart(fig_b, use_container_width=True)
+
+        if sens_df is not None:
+            fig_s = px.line(
+                sens_df,
+                x="Duración (h)",
+                y="VAN",
+                markers=True,
+                title="VAN según duración",
+            )
+            fig_s.add_vline(x=horas_opt, line_dash="dash", line_color="red")
+            st.plotly_chart(fig_s, use_container_width=True)
+
+        if sens_mar is not None:
+            fig_m = px.line(
+                sens_mar,
+                x="Margen (€/MWh)",
+                y="TIR",
+                markers=True,
+                title="TIR según margen",
+            )
+            fig_m.add_vline(x=margen_opt, line_dash="dash", line_color="red")
+            st.plotly_chart(fig_m, use_container_width=True)
+
+    with tab_ind:
+        st.subheader("📊 Resultados económicos")
+        info_text = textwrap.dedent(
+            f"""
+            - **Ingreso anual estimado**: {fmt_miles_eur(estado["ingreso_anual"])}
+            - **Inversión inicial**: {fmt_miles_eur(estado["inversion"])}
+            - **VAN (15 años)**: {fmt_miles_eur(estado["van"])}
+            - **TIR proyecto**: {estado["tir"]*100:.2f} %
+            - **TIR equity**: {estado["tir_equity"]*100:.2f} %
+            - **Ciclos usados al año**: {estado["ciclos_anuales"]:.1f} (vida útil {estado["cyc_min"]}-{estado["cyc_max"]} ciclos)
+            - **Degradación anual**: {estado["degradacion"]:.1f} %
+            {f"- **Duración óptima**: {horas_opt:.2f} h" if horas_opt else ""}
+            {f"- **Margen óptimo**: {margen_opt:.2f} €/MWh" if margen_opt else ""}
+            """
+        )
+        st.markdown(info_text)
+
+        anios = list(range(1, 16))
+        fig_cash = go.Figure()
+        fig_cash.add_bar(x=[0], y=[-estado["capex_bateria"] / 1000], name="CAPEX", marker_color="red")
+        fig_cash.add_bar(x=[0], y=[-estado["coste_desarrollo"] / 1000], name="Coste desarrollo", marker_color="orange")
+        if estado["tipo_terreno"] == "Compra":
+            fig_cash.add_bar(x=[0], y=[-estado["coste_terreno"] / 1000], name="Terreno", marker_color="brown")
+        fig_cash.add_bar(x=anios, y=[-a / 1000 for a in estado["amortizacion_anual"]], name="Amortización", marker_color="lightcoral")
+        fig_cash.add_bar(x=anios, y=[-i / 1000 for i in estado["intereses_anuales"]], name="Intereses", marker_color="pink")
+        fig_cash.add_bar(x=anios, y=[f / 1000 for f in estado["flujos_equity"]], name="Flujo equity", marker_color="blue")
+        fig_cash.update_layout(barmode="stack", xaxis_title="Año", yaxis_title="Flujo de caja (miles de €)", title="Flujo de caja anual")
+        st.plotly_chart(fig_cash, use_container_width=True)
+        st.subheader("📄 Cuenta de resultados")
+        st.caption("Valores en miles de euros")
+        st.dataframe(estado["cuenta_resultados"], use_container_width=True)
+        st.download_button(
+            "Descargar cuenta de resultados (CSV)",
+            partial(exportar, estado["cuenta_df"], "csv"),
+            "cuenta_resultados.csv",
+            "text/csv",
+        )
+        if estado["plurianual"] is not None:
+            mostrar_plurianual(estado["plurianual"])
+        if estado["montecarlo"] is not None:
+            mostrar_montecarlo(estado["montecarlo"])
+
+    if "Comparativa zonas" in tab_extra:
+        with tab_extra["Comparativa zonas"]:
+            mostrar_comparativa(comparativa)
+    if "Cartera" in tab_extra:
+        with tab_extra["Cartera"]:
+            mostrar_cartera(estado["cartera"])
+    if "Sensibilidad 2D" in tab_extra:
+        with tab_extra["Sensibilidad 2D"]:
+            mostrar_rejilla(estado["rejilla"])
+
 
 # --- Interfaz ---
 st.title("🔋 Simulador de BESS")
 
 with st.sidebar:
     st.header("🔧 Parámetros de simulación")
-    archivo = st.file_uploader("Archivo de precios", type=["xlsx", "csv"])
-    zona = st.selectbox(
-        "Zona",
-        ["NORD", "CNORD", "CSUD", "SUD", "SARD", "SICILY", "BZ"],
+    archivo = st.file_uploader(
+        "Archivo de precios",
+        type=["xlsx", "csv", "gz"],
+        help="Columnas Fecha y Precio, Fecha, Zona y Precio, o Fecha y una "
+        "columna por zona. Con varias zonas se usa la elegida abajo.",
+    )
+    zona = st.selectbox("Zona", ZONAS)
+    comparar = st.checkbox(
+        "Comparar todas las zonas",
+        disabled=archivo is not None,
+        help="Evalúa la misma batería en todas las zonas del libro predeterminado.",
+    )
+    evaluar_cartera = st.checkbox(
+        "Evaluar una cartera",
+        disabled=archivo is not None,
+        help="Varias baterías, cada una con su zona y su tamaño, simuladas a "
+        "la vez con la estrategia, las eficiencias y la economía de abajo.",
     )
+    activos = None
+    if evaluar_cartera:
+        activos = st.data_editor(
+            CARTERA_INICIAL,
+            num_rows="dynamic",
+            hide_index=True,
+            column_config={
+                "Zona": st.column_config.SelectboxColumn(options=ZONAS, required=True),
+                "Potencia (MW)": st.column_config.NumberColumn(min_value=0.1),
+                "Duración (h)": st.column_config.NumberColumn(min_value=0.25),
+            },
+            key="cartera_activos",
+        )
     st.markdown("---")
     tecnologia = st.selectbox("Tecnología", list(TECHS.keys()))
     cap_min, cap_max = TECHS[tecnologia]["costo"]
@@ -351,23 +657,54 @@ with st.sidebar:
         "Degradación anual (%)", min_value=deg_min, max_value=deg_max,
         value=deg_default, step=0.1
     )
+    degradacion_despacho = st.checkbox(
+        "Degradación en el despacho",
+        help="Simula cada año con sus precios y la capacidad degradada, en "
+        "lugar de escalar los ingresos del primer año.",
+    )
+    perdida_ciclos = (
+        st.slider(
+            "Pérdida por uso (% cada 1000 ciclos)",
+            min_value=0.0,
+            max_value=10.0,
+            value=0.0,
+            step=0.1,
+            help="Se suma a la degradación anual; con 0 solo hay "
+            "degradación por calendario.",
+        )
+        if degradacion_despacho
+        else 0.0
+    )
     potencia_mw = st.slider("Potencia (MW)", 1, 100, 10)
     duracion_h = st.slider("Duración (h)", 1, 10, 4)
     analizar_opt = st.checkbox("Analizar duración óptima")
     max_h = st.slider("Duración máxima a evaluar", 1, 10, 6) if analizar_opt else 0
+    adaptativa_h = analizar_opt and st.checkbox(
+        "Búsqueda adaptativa de la duración",
+        help="Busca la duración de máximo VAN como valor continuo (precisión "
+        "0,01 h) por sección áurea, con unas 20 simulaciones en lugar de la "
+        "rejilla completa.",
+    )
+    paso_h = (
+        st.select_slider("Paso de duración (h)", [0.25, 0.5, 1.0], value=1.0)
+        if analizar_opt and not adaptativa_h
+        else 1.0
+    )
     ef_carga = st.slider("Eficiencia de carga (%)", 50, 100, 95) / 100
     ef_descarga = st.slider("Eficiencia de descarga (%)", 50, 100, 95) / 100
     st.markdown("---")
 
     st.markdown("### Estrategia")
     estrategia = st.selectbox(
-        "Estrategia", ["Percentiles", "Margen fijo", "Programada"]
+        "Estrategia", ["Percentiles", "Margen fijo", "Programada", "Óptima"]
     )
     umbral_carga = 0.25
     umbral_descarga = 0.75
     margen = 0.0
     analizar_marg = False
     max_margen = 0.0
+    paso_margen = 1.0
+    adaptativa_margen = False
     horario_file = None
     if estrategia == "Percentiles":
         umbral_carga = st.slider("Umbral de carga", 0.0, 1.0, 0.25, 0.05)
@@ -385,9 +722,62 @@ with st.sidebar:
             if analizar_marg
             else 0
         )
-    else:  # Programada
+        adaptativa_margen = analizar_marg and st.checkbox(
+            "Búsqueda adaptativa del margen",
+            help="Busca el margen de máxima TIR como valor continuo (precisión "
+            "0,1 €/MWh) en lugar de recorrer todos los pasos.",
+        )
+        paso_margen = (
+            st.number_input("Paso de margen (€/MWh)", 0.1, 10.0, 1.0, 0.1)
+            if analizar_marg and not adaptativa_margen
+            else 1.0
+        )
+    elif estrategia == "Programada":
         horario_file = st.file_uploader(
             "Horario (CSV con columnas hora,accion)", type="csv")
+    else:  # Óptima
+        st.caption(
+            "Programa de carga y descarga de máximo beneficio con los precios "
+            "conocidos de antemano. Es una referencia de previsión perfecta "
+            "(discretizada en 200 niveles de SOC), no una cota estricta: la "
+            "rejilla redondea cada paso hacia abajo y las demás estrategias "
+            "pueden rebasar ligeramente la capacidad."
+        )
+
+    ventana_dias = 0
+    if estrategia in ("Percentiles", "Margen fijo"):
+        ventana_dias = st.slider(
+            "Días anteriores para los umbrales",
+            0,
+            30,
+            0,
+            help="Con 0, los umbrales salen de los precios del mismo día "
+            "(previsión perfecta). Con N días, los de cada hora salen solo de "
+            "los precios de los N días anteriores.",
+        )
+
+    pares = [
+        par
+        for par in PARES_REJILLA
+        if not (par.startswith("Umbral") and estrategia != "Percentiles")
+        and not (par.endswith("Margen") and estrategia != "Margen fijo")
+    ]
+    analizar_rejilla = st.checkbox(
+        "Sensibilidad 2D",
+        help="VAN y TIR en una rejilla de dos parámetros, simulada en una "
+        "sola pasada por la serie.",
+    )
+    rejilla = None
+    if analizar_rejilla:
+        par = st.selectbox("Parámetros", pares)
+        n_rejilla = st.slider("Puntos por eje", 5, 30, 20)
+        eje_x, rango_x, eje_y, rango_y = PARES_REJILLA[par]
+        rejilla = {
+            "eje_x": eje_x,
+            "valores_x": np.linspace(*rango_x, n_rejilla),
+            "eje_y": eje_y,
+            "valores_y": np.linspace(*rango_y, n_rejilla),
+        }
 
     st.markdown("---")
     st.markdown("### Parámetros económicos")
@@ -436,6 +826,26 @@ with st.sidebar:
         "Ratio de apalancamiento (%)", 0, 100, 20, step=1
     )
     coste_financiacion = st.number_input("Coste financiación (%)", 0.0, 20.0, 5.0)
+    analizar_mc = st.checkbox(
+        "Análisis Monte Carlo",
+        help="Sortea CAPEX, degradación y ciclos en los rangos de la tecnología, "
+        "además de OPEX, coste de financiación y escala de ingresos.",
+    )
+    n_sorteos = (
+        st.number_input("Número de sorteos", 1000, 200000, 20000, 1000)
+        if analizar_mc
+        else 0
+    )
+
+    st.markdown("---")
+    medir_rendimiento = st.checkbox(
+        "Medir rendimiento",
+        help="Tiempo, memoria máxima y filas de cada etapa en el panel "
+        "Rendimiento. Medir la memoria ralentiza algo el cálculo.",
+    )
+    perfilar_ejecucion = medir_rendimiento and st.checkbox(
+        "Perfilar la próxima ejecución (cProfile)"
+    )
 
     iniciar = st.button("▶️ Ejecutar simulación")
     if st.button("Restablecer parámetros"):
@@ -452,25 +862,29 @@ with st.sidebar:
 **Estrategias disponibles**<br>
 - <b>Percentiles</b>: se carga por debajo del `Umbral de carga` y se descarga por encima del `Umbral de descarga` calculados día a día.<br>
 - <b>Margen fijo</b>: la referencia es la media diaria; se compra si el precio baja de media&nbsp;&minus;&nbsp;margen y se vende por encima de media&nbsp;+&nbsp;margen.<br>
-- <b>Programada</b>: sube un CSV con columnas `hora` y `accion` (C o D) para fijar manualmente la carga y descarga.<br><br>
+- <b>Programada</b>: sube un CSV con columnas `hora` y `accion` (C o D) para fijar manualmente la carga y descarga.<br>
+- <b>Óptima</b>: calcula el programa de máximo beneficio conociendo todos los precios; es la referencia de previsión perfecta (discretizada) con la que comparar las demás estrategias, no una cota estricta.<br><br>
 Tras la simulación se abren tres pestañas:<br>
 - <em>Resultados</em> muestra tablas y enlaces de descarga.<br>
 - <em>Gráficas</em> incluye un deslizador para elegir el día y filtros por año/mes.<br>
 - <em>Resultados económicos</em> resume los flujos de caja y la TIR.<br>
+Con <b>Evaluar una cartera</b> se añade la pestaña <em>Cartera</em>, con el VAN y la TIR de cada activo y de la cartera completa.<br>
 </small>
 """
         st.markdown(help_text, unsafe_allow_html=True)
 
 if iniciar:
-    precios = cargar_datos(zona, archivo)
+    registro = Registro(memoria=medir_rendimiento)
+    with registro, medir("cargar_datos") as carga:
+        precios = cargar_datos(zona, archivo)
+        carga["filas"] = len(precios)
+    ingesta = informe_ingesta(archivo) if archivo is not None else None
     start_default = precios["Fecha"].min().date()
     fecha_inicio = st.date_input("Desde", start_default)
     fi_dt = pd.to_datetime(fecha_inicio)
     fecha_fin_dt = fi_dt + relativedelta(years=15) - timedelta(days=1)
     fecha_fin_dt = min(fecha_fin_dt, pd.to_datetime(precios["Fecha"].max()))
     st.caption(f"Se simula hasta {fecha_fin_dt.date()} (máximo 15 años)")
-    precios = precios[(precios["Fecha"] >= fi_dt) &
-                      (precios["Fecha"] <= fecha_fin_dt)]
     fi_date = fi_dt.date()
     ff_date = fecha_fin_dt.date()
 
@@ -479,148 +893,89 @@ if iniciar:
         df_hor = pd.read_csv(horario_file)
         horario = {row["hora"]: row["accion"] for _, row in df_hor.iterrows()}
 
-    resultado = simular(
-        precios,
-        potencia_mw,
-        duracion_h,
-        ef_carga,
-        ef_descarga,
-        estrategia,
-        umbral_carga,
-        umbral_descarga,
-        margen,
-        horario,
-        coste_carga,
-        coste_descarga,
-    )
-
-    mensual = resumen_mensual(resultado)
-
-    sens_df = None
-    horas_opt = None
-    sens_mar = None
-    margen_opt = None
-    if analizar_opt and max_h > 1:
-        sens_df, horas_opt = analizar_duracion(
-            precios,
-            potencia_mw,
-            max_h,
-            ef_carga,
-            ef_descarga,
-            estrategia,
-            umbral_carga,
-            umbral_descarga,
-            margen,
-            horario,
-            degradacion,
-            capex_kwh,
-            coste_desarrollo_mw,
-            opex_kw,
-            tasa_descuento,
-            coste_carga,
-            coste_descarga,
-            tipo_terreno,
-            coste_terreno,
-        )
-
-    if estrategia == "Margen fijo" and analizar_marg and max_margen > 0:
-        sens_mar, margen_opt = analizar_margen(
-            precios,
-            potencia_mw,
-            duracion_h,
-            ef_carga,
-            ef_descarga,
-            estrategia,
-            umbral_carga,
-            umbral_descarga,
-            max_margen,
-            horario,
-            degradacion,
-            capex_kwh,
-            coste_desarrollo_mw,
-            opex_kw,
-            tasa_descuento,
-            coste_carga,
-            coste_descarga,
-            tipo_terreno,
-            coste_terreno,
+    # Solo se recalculan las etapas cuyas entradas han cambiado desde la
+    # ejecución anterior de esta sesión.
+    canalizacion = st.session_state.get("canalizacion")
+    if canalizacion is None:
+        canalizacion = st.session_state["canalizacion"] = Canalizacion(ETAPAS_APP)
+    with registro, perfilar(perfilar_ejecucion) as captura:
+        salidas = canalizacion.ejecutar(
+            {
+                "serie": precios,
+                "desde": fi_dt,
+                "hasta": fecha_fin_dt,
+                "potencia_mw": potencia_mw,
+                "duracion_h": duracion_h,
+                "ef_carga": ef_carga,
+                "ef_descarga": ef_descarga,
+                "estrategia": estrategia,
+                "umbral_carga": umbral_carga,
+                "umbral_descarga": umbral_descarga,
+                "margen": margen,
+                "horario": horario,
+                "coste_carga": coste_carga,
+                "coste_descarga": coste_descarga,
+                "ventana_dias": ventana_dias,
+                "degradacion": degradacion,
+                "degradacion_despacho": degradacion_despacho,
+                "perdida_ciclos": perdida_ciclos,
+                "capex_kwh": capex_kwh,
+                "coste_desarrollo_mw": coste_desarrollo_mw,
+                "opex_kw": opex_kw,
+                "tasa_descuento": tasa_descuento,
+                "tipo_terreno": tipo_terreno,
+                "coste_terreno": coste_terreno,
+                "ratio_apalancamiento": ratio_apalancamiento,
+                "coste_financiacion": coste_financiacion,
+                "max_h": max_h if analizar_opt else 0,
+                "paso_h": paso_h,
+                "adaptativa_h": adaptativa_h,
+                "max_margen": max_margen if analizar_marg else 0,
+                "paso_margen": paso_margen,
+                "adaptativa_margen": adaptativa_margen,
+                "rejilla": rejilla,
+                "tecnologia": tecnologia,
+                "n_sorteos": n_sorteos if analizar_mc else 0,
+                "comparar": comparar and archivo is None,
+                "cartera": (
+                    activos.dropna().rename(columns=COLUMNAS_CARTERA).to_dict("records")
+                    if evaluar_cartera and archivo is None
+                    else None
+                ),
+            }
         )
-
-    # Beneficio neto del primer año
-    first_year = fi_date.year
-    ingreso_anual = mensual[mensual.index.year == first_year]["Beneficio neto (€)"].sum()
-    capex_bateria = potencia_mw * duracion_h * 1000 * capex_kwh
-    coste_desarrollo = potencia_mw * coste_desarrollo_mw
-    capex_total = capex_bateria + coste_desarrollo
-    if tipo_terreno == "Compra":
-        capex_total += coste_terreno
-        gasto_terreno = 0
-    else:
-        gasto_terreno = coste_terreno
-    inversion = -capex_total
-    ingresos = [ingreso_anual * (1 - degradacion / 100) ** i for i in range(15)]
-    flujo_anual = [ingresos[i] - potencia_mw * 1000 * opex_kw - gasto_terreno for i in range(15)]
-    flujo_caja = [inversion] + flujo_anual
-    van = npf.npv(tasa_descuento / 100, flujo_caja)
-    tir = npf.irr(flujo_caja)
-
-    deuda = capex_total * (ratio_apalancamiento / 100)
-    equity = capex_total - deuda
-    tasa_mensual = (coste_financiacion / 100) / 12
-    meses = 15 * 12
-    pago_mes = -npf.pmt(tasa_mensual, meses, deuda) if deuda else 0
-    saldo = deuda
-    flujo_equity = [-equity]
-    flujos_equity_anual = []
-    intereses_anuales = []
-    amortizacion_anual = []
-    for year in range(15):
-        interes_anual = 0
-        principal_anual = 0
-        for _ in range(12):
-            interes_mes = saldo * tasa_mensual
-            principal_mes = pago_mes - interes_mes
-            saldo -= principal_mes
-            interes_anual += interes_mes
-            principal_anual += principal_mes
-        pago_total = interes_anual + principal_anual
-        flujo_equity.append(
-            ingresos[year] - potencia_mw * 1000 * opex_kw - gasto_terreno - pago_total
-        )
-        flujos_equity_anual.append(
-            ingresos[year] - potencia_mw * 1000 * opex_kw - gasto_terreno - pago_total
-        )
-        intereses_anuales.append(interes_anual)
-        amortizacion_anual.append(principal_anual)
-    tir_equity = npf.irr(flujo_equity)
-
-    opex_anual = -potencia_mw * 1000 * opex_kw
-    if tipo_terreno == "Compra":
-        terreno_fila = [-coste_terreno] + [0] * 15
-    else:
-        terreno_fila = [0] + [-coste_terreno] * 15
-    data_cr = {
-        "Ingresos": [0] + ingresos,
-        "OPEX": [0] + [opex_anual] * 15,
-        "Coste terrenos": terreno_fila,
-        "Intereses": [0] + [-i for i in intereses_anuales],
-        "Amortización": [0] + [-a for a in amortizacion_anual],
-        "Coste desarrollo": [-coste_desarrollo] + [0] * 15,
-        "CAPEX": [-capex_bateria] + [0] * 15,
-        "Flujo equity": [-(capex_total - deuda)] + flujos_equity_anual,
-    }
-    cuenta_df = pd.DataFrame.from_dict(
-        data_cr, orient="index", columns=[f"Año {i}" for i in range(16)]
+    resultado = salidas["despacho"]
+    mensual = salidas["mensual"]
+    ingreso_anual = salidas["operacion"]["ingreso_anual"]
+    ciclos_anuales = salidas["operacion"]["ciclos_anuales"]
+    sens_df, horas_opt = (
+        salidas["sens_duracion"] or salidas["busqueda_duracion"] or (None, None)
     )
-    cuenta_df.index.name = "Concepto"
+    sens_mar, margen_opt = (
+        salidas["sens_margen"] or salidas["busqueda_margen"] or (None, None)
+    )
+    comparativa = salidas["comparativa"]
+    cartera = salidas["cartera"]
+    montecarlo = salidas["montecarlo"]
+    sens_rejilla = salidas["sens_rejilla"]
+    plurianual = salidas["plurianual"]
+
+    fin = salidas["finanzas"]
+    capex_bateria = fin["capex_bateria"]
+    coste_desarrollo = fin["coste_desarrollo"]
+    inversion = fin["inversion"]
+    flujo_anual = fin["flujo_anual"]
+    flujo_caja = fin["flujo_caja"]
+    van = fin["van"]
+    tir = fin["tir"]
+    tir_equity = fin["tir_equity"]
+    flujos_equity_anual = fin["flujos_equity_anual"]
+    intereses_anuales = fin["intereses_anuales"]
+    amortizacion_anual = fin["amortizacion_anual"]
+    cuenta_df = fin["cuenta_df"]
     cuenta_miles = cuenta_df / 1000
     cuenta_df_fmt = cuenta_miles.applymap(fmt_miles_eur)
 
-    total_descarga = resultado["Descarga (MWh)"].sum()
-    ciclos_periodo = total_descarga / (potencia_mw * duracion_h)
-    dias_periodo = (fecha_fin_dt - fi_dt).days + 1
-    ciclos_anuales = ciclos_periodo / (dias_periodo / 365)
-
     st.session_state.update(
         {
             "resultado": resultado,
@@ -650,266 +1005,33 @@ if iniciar:
             "sens_margen": sens_mar,
             "margen_optimo": margen_opt,
             "cuenta_resultados": cuenta_df_fmt,
+            "cuenta_df": cuenta_df,
+            "comparativa": comparativa,
+            "cartera": cartera,
+            "montecarlo": montecarlo,
+            "rejilla": sens_rejilla,
+            "plurianual": plurianual,
+            "ingesta": ingesta,
+            "rendimiento": registro,
+            "perfil": (
+                {
+                    "texto": resumen_perfil(captura["perfil"]),
+                    "datos": datos_perfil(captura["perfil"]),
+                }
+                if captura["perfil"] is not None
+                else None
+            ),
         }
     )
 
-    tab_res, tab_graf, tab_ind = st.tabs(["Resultados", "Gráficas", "Resultados económicos"])
-
-    with tab_res:
-        st.subheader("📈 Resultados horarios")
-        st.dataframe(resultado.head(100), use_container_width=True)
-        st.subheader("📅 Resumen mensual")
-        st.dataframe(mensual, use_container_width=True)
-        csv = resultado.to_csv(index=False).encode("utf-8")
-        st.download_button("Descargar resultados (CSV)", csv, "resultados_bess.csv")
-        csv_m = mensual.to_csv().encode("utf-8")
-        st.download_button("Descargar resumen mensual (CSV)", csv_m, "resumen_mensual.csv")
-
-    with tab_graf:
-        dia = st.slider(
-            "Día a visualizar",
-            min_value=fi_date,
-            max_value=ff_date,
-            value=st.session_state.get("dia_graf", fi_date),
-            format="YYYY-MM-DD",
-            key="dia_graf",
+if st.session_state["resultado"] is not None:
+    # La presentación se mide en cada recarga; las etapas, en la última ejecución.
+    with Registro() as dibujo:
+        with medir("presentacion", filas=len(st.session_state["resultado"])):
+            mostrar_resultados(st.session_state)
+    if medir_rendimiento:
+        mostrar_rendimiento(
+            st.session_state["rendimiento"], dibujo, st.session_state["perfil"]
         )
-        diario = resultado[resultado["Fecha"].dt.date == dia]
-        if not diario.empty:
-            fig_d = make_subplots(specs=[[{"secondary_y": True}]])
-            fig_d.add_trace(
-                go.Scatter(x=diario["Fecha"], y=diario["Precio"], name="Precio"),
-                secondary_y=False,
-            )
-            fig_d.add_trace(
-                go.Scatter(x=diario["Fecha"], y=diario["SOC (MWh)"], name="SOC (MWh)"),
-                secondary_y=True,
-            )
-            fig_d.update_layout(title=f"Precio y SOC - {dia}")
-            fig_d.update_yaxes(title_text="Precio", secondary_y=False)
-            fig_d.update_yaxes(title_text="SOC (MWh)", secondary_y=True)
-            st.plotly_chart(fig_d, use_container_width=True)
-        else:
-            st.info("No hay datos para ese día")
-
-        years_avail = sorted(resultado["Fecha"].dt.year.unique())
-        year_sel = st.selectbox("Año", years_avail, key="sel_year")
-        months_avail = sorted(
-            resultado[resultado["Fecha"].dt.year == year_sel]["Fecha"].dt.month.unique()
-        )
-        month_sel = st.selectbox("Mes", months_avail, key="sel_month")
-        periodo = resultado[(resultado["Fecha"].dt.year == year_sel) &
-                            (resultado["Fecha"].dt.month == month_sel)]
-        if not periodo.empty:
-            fig = make_subplots(specs=[[{"secondary_y": True}]])
-            fig.add_trace(
-                go.Scatter(x=periodo["Fecha"], y=periodo["Precio"], name="Precio"),
-                secondary_y=False,
-            )
-            fig.add_trace(
-                go.Scatter(x=periodo["Fecha"], y=periodo["SOC (MWh)"], name="SOC (MWh)"),
-                secondary_y=True,
-            )
-            fig.update_layout(title=f"Precio y Estado de Carga - {year_sel}-{month_sel:02d}")
-            fig.update_yaxes(title_text="Precio", secondary_y=False)
-            fig.update_yaxes(title_text="SOC (MWh)", secondary_y=True)
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("No hay datos para ese período")
-        fig_b = px.bar(mensual.reset_index(), x="Mes", y="Beneficio neto (€)", title="Beneficio mensual")
-        st.plotly_chart(fig_b, use_container_width=True)
-
-        if sens_df is not None:
-            fig_s = px.line(
-                sens_df,
-                x="Duración (h)",
-                y="VAN",
-                markers=True,
-                title="VAN según duración",
-            )
-            fig_s.add_vline(x=horas_opt, line_dash="dash", line_color="red")
-            st.plotly_chart(fig_s, use_container_width=True)
-
-        if sens_mar is not None:
-            fig_m = px.line(
-                sens_mar,
-                x="Margen (€/MWh)",
-                y="TIR",
-                markers=True,
-                title="TIR según margen",
-            )
-            fig_m.add_vline(x=margen_opt, line_dash="dash", line_color="red")
-            st.plotly_chart(fig_m, use_container_width=True)
-
-    with tab_ind:
-        st.subheader("📊 Resultados económicos")
-        info_text = textwrap.dedent(
-            f"""
-            - **Ingreso anual estimado**: {fmt_miles_eur(ingreso_anual)}
-            - **Inversión inicial**: {fmt_miles_eur(inversion)}
-            - **VAN (15 años)**: {fmt_miles_eur(van)}
-            - **TIR proyecto**: {tir*100:.2f} %
-            - **TIR equity**: {tir_equity*100:.2f} %
-            - **Ciclos usados al año**: {ciclos_anuales:.1f} (vida útil {cyc_min}-{cyc_max} ciclos)
-            - **Degradación anual**: {degradacion:.1f} %
-            {f"- **Duración óptima**: {horas_opt} h" if horas_opt else ""}
-            {f"- **Margen óptimo**: {margen_opt} €/MWh" if margen_opt else ""}
-            """
-        )
-        st.markdown(info_text)
-
-        years = list(range(16))
-        fig_cash = go.Figure()
-        fig_cash.add_bar(x=[0], y=[-capex_bateria / 1000], name="CAPEX", marker_color="red")
-        fig_cash.add_bar(x=[0], y=[-coste_desarrollo / 1000], name="Coste desarrollo", marker_color="orange")
-        if tipo_terreno == "Compra":
-            fig_cash.add_bar(x=[0], y=[-coste_terreno / 1000], name="Terreno", marker_color="brown")
-        fig_cash.add_bar(x=list(range(1, 16)), y=[-a / 1000 for a in amortizacion_anual], name="Amortización", marker_color="lightcoral")
-        fig_cash.add_bar(x=list(range(1, 16)), y=[-i / 1000 for i in intereses_anuales], name="Intereses", marker_color="pink")
-        fig_cash.add_bar(x=list(range(1, 16)), y=[f / 1000 for f in flujos_equity_anual], name="Flujo equity", marker_color="blue")
-        fig_cash.update_layout(barmode="stack", xaxis_title="Año", yaxis_title="Flujo de caja (miles de €)", title="Flujo de caja anual")
-        st.plotly_chart(fig_cash, use_container_width=True)
-        st.subheader("📄 Cuenta de resultados")
-        st.caption("Valores en miles de euros")
-        st.dataframe(cuenta_df_fmt, use_container_width=True)
-        csv_cu = cuenta_df.to_csv().encode("utf-8")
-        st.download_button(
-            "Descargar cuenta de resultados (CSV)",
-            csv_cu,
-            "cuenta_resultados.csv",
-        )
-elif st.session_state["resultado"] is not None:
-    resultado = st.session_state["resultado"]
-    mensual = st.session_state["mensual"]
-    fi_date = st.session_state["fi_date"]
-    ff_date = st.session_state["ff_date"]
-    ingreso_anual = st.session_state["ingreso_anual"]
-    inversion = st.session_state["inversion"]
-    van = st.session_state["van"]
-    tir = st.session_state["tir"]
-    tir_equity = st.session_state["tir_equity"]
-    ciclos_anuales = st.session_state["ciclos_anuales"]
-    cyc_min = st.session_state["cyc_min"]
-    cyc_max = st.session_state["cyc_max"]
-    flujo_caja = st.session_state["flujo_caja"]
-    flujos_anuales = st.session_state["flujos_anuales"]
-    flujos_equity_anual = st.session_state["flujos_equity"]
-    intereses_anuales = st.session_state.get("intereses_anuales")
-    amortizacion_anual = st.session_state.get("amortizacion_anual")
-    capex_bateria = st.session_state["capex_bateria"]
-    coste_desarrollo = st.session_state["coste_desarrollo"]
-    coste_terreno = st.session_state.get("coste_terreno", 0.0)
-    tipo_terreno = st.session_state.get("tipo_terreno", "Compra")
-    degradacion = st.session_state["degradacion"]
-    sens_df = st.session_state.get("sens_dur")
-    horas_opt = st.session_state.get("horas_optimas")
-    sens_mar = st.session_state.get("sens_margen")
-    margen_opt = st.session_state.get("margen_optimo")
-
-    tab_res, tab_graf, tab_ind = st.tabs(["Resultados", "Gráficas", "Resultados económicos"])
-
-    with tab_res:
-        st.subheader("📈 Resultados horarios")
-        st.dataframe(resultado.head(100), use_container_width=True)
-        st.subheader("📅 Resumen mensual")
-        st.dataframe(mensual, use_container_width=True)
-        csv = resultado.to_csv(index=False).encode("utf-8")
-        st.download_button("Descargar resultados (CSV)", csv, "resultados_bess.csv")
-        csv_m = mensual.to_csv().encode("utf-8")
-        st.download_button("Descargar resumen mensual (CSV)", csv_m, "resumen_mensual.csv")
-
-    with tab_graf:
-        dia = st.slider(
-            "Día a visualizar",
-            min_value=fi_date,
-            max_value=ff_date,
-            value=st.session_state.get("dia_graf", fi_date),
-            format="YYYY-MM-DD",
-            key="dia_graf",
-        )
-        diario = resultado[resultado["Fecha"].dt.date == dia]
-        if not diario.empty:
-            fig_d = make_subplots(specs=[[{"secondary_y": True}]])
-            fig_d.add_trace(
-                go.Scatter(x=diario["Fecha"], y=diario["Precio"], name="Precio"),
-                secondary_y=False,
-            )
-            fig_d.add_trace(
-                go.Scatter(x=diario["Fecha"], y=diario["SOC (MWh)"], name="SOC (MWh)"),
-                secondary_y=True,
-            )
-            fig_d.update_layout(title=f"Precio y SOC - {dia}")
-            fig_d.update_yaxes(title_text="Precio", secondary_y=False)
-            fig_d.update_yaxes(title_text="SOC (MWh)", secondary_y=True)
-            st.plotly_chart(fig_d, use_container_width=True)
-        else:
-            st.info("No hay datos para ese día")
-
-        years_avail = sorted(resultado["Fecha"].dt.year.unique())
-        year_sel = st.selectbox("Año", years_avail, key="sel_year2")
-        months_avail = sorted(
-            resultado[resultado["Fecha"].dt.year == year_sel]["Fecha"].dt.month.unique()
-        )
-        month_sel = st.selectbox("Mes", months_avail, key="sel_month2")
-        periodo = resultado[(resultado["Fecha"].dt.year == year_sel) & (resultado["Fecha"].dt.month == month_sel)]
-        if not periodo.empty:
-            fig = make_subplots(specs=[[{"secondary_y": True}]])
-            fig.add_trace(
-                go.Scatter(x=periodo["Fecha"], y=periodo["Precio"], name="Precio"),
-                secondary_y=False,
-            )
-            fig.add_trace(
-                go.Scatter(x=periodo["Fecha"], y=periodo["SOC (MWh)"], name="SOC (MWh)"),
-                secondary_y=True,
-            )
-            fig.update_layout(title=f"Precio y Estado de Carga - {year_sel}-{month_sel:02d}")
-            fig.update_yaxes(title_text="Precio", secondary_y=False)
-            fig.update_yaxes(title_text="SOC (MWh)", secondary_y=True)
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("No hay datos para ese período")
-        fig_b = px.bar(mensual.reset_index(), x="Mes", y="Beneficio neto (€)", title="Beneficio mensual")
-        st.plotly_chart(fig_b, use_container_width=True)
-
-
-    with tab_ind:
-        st.subheader("📊 Resultados económicos")
-        info_text = textwrap.dedent(
-            f"""
-            - **Ingreso anual estimado**: {fmt_miles_eur(ingreso_anual)}
-            - **Inversión inicial**: {fmt_miles_eur(inversion)}
-            - **VAN (15 años)**: {fmt_miles_eur(van)}
-            - **TIR proyecto**: {tir*100:.2f} %
-            - **TIR equity**: {tir_equity*100:.2f} %
-            - **Ciclos usados al año**: {ciclos_anuales:.1f} (vida útil {cyc_min}-{cyc_max} ciclos)
-            - **Degradación anual**: {degradacion:.1f} %
-            {f"- **Duración óptima**: {horas_opt} h" if horas_opt else ""}
-            {f"- **Margen óptimo**: {margen_opt} €/MWh" if margen_opt else ""}
-            """
-        )
-        st.markdown(info_text)
-
-        years = list(range(16))
-        fig_cash = go.Figure()
-        fig_cash.add_bar(x=[0], y=[-capex_bateria / 1000], name="CAPEX", marker_color="red")
-        fig_cash.add_bar(x=[0], y=[-coste_desarrollo / 1000], name="Coste desarrollo", marker_color="orange")
-        if tipo_terreno == "Compra":
-            fig_cash.add_bar(x=[0], y=[-coste_terreno / 1000], name="Terreno", marker_color="brown")
-        fig_cash.add_bar(x=list(range(1, 16)), y=[-a / 1000 for a in amortizacion_anual], name="Amortización", marker_color="lightcoral")
-        fig_cash.add_bar(x=list(range(1, 16)), y=[-i / 1000 for i in intereses_anuales], name="Intereses", marker_color="pink")
-        fig_cash.add_bar(x=list(range(1, 16)), y=[f / 1000 for f in flujos_equity_anual], name="Flujo equity", marker_color="blue")
-        fig_cash.update_layout(barmode="stack", xaxis_title="Año", yaxis_title="Flujo de caja (miles de €)", title="Flujo de caja anual")
-        st.plotly_chart(fig_cash, use_container_width=True)
-        st.subheader("📄 Cuenta de resultados")
-        st.caption("Valores en miles de euros")
-        cuenta_df_fmt = st.session_state.get("cuenta_resultados")
-        if cuenta_df_fmt is not None:
-            st.dataframe(cuenta_df_fmt, use_container_width=True)
-            csv_cu = cuenta_df_fmt.to_csv().encode("utf-8")
-            st.download_button(
-                "Descargar cuenta de resultados (CSV)",
-                csv_cu,
-                "cuenta_resultados.csv",
-            )
 else:
     st.info("Configura los parámetros en la barra lateral y pulsa Ejecutar.")
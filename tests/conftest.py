@@ -0,0 +1,34 @@
+import pytest
+
+from bess.datos import ZONAS, cargar_precios
+
+HORARIO = {**{h: "C" for h in range(1, 6)}, **{h: "D" for h in range(18, 22)}}
+DESPACHO = dict(
+    potencia_mw=10,
+    duracion_h=4,
+    ef_carga=0.95,
+    ef_descarga=0.9,
+    coste_carga=2.0,
+    coste_descarga=1.5,
+)
+ECONOMIA = dict(
+    degradacion=2.0,
+    capex_kwh=230,
+    coste_desarrollo_mw=20000,
+    opex_kw=6.5,
+    tasa_descuento=7.0,
+    tipo_terreno="Compra",
+    coste_terreno=0.0,
+)
+
+
+@pytest.fixture(scope="session")
+def almacen(tmp_path_factory):
+    """Almacén de precios temporal con el libro predeterminado."""
+    return str(tmp_path_factory.mktemp("almacen"))
+
+
+@pytest.fixture(scope="session")
+def precios_zonas(almacen):
+    """Precios de 2024 de todas las zonas del libro predeterminado."""
+    return {zona: cargar_precios(zona, directorio=almacen) for zona in ZONAS}
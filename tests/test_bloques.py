@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from bess.bloques import simular_por_bloques
+from bess.despacho import simular
+
+from conftest import DESPACHO, HORARIO
+
+HEURISTICAS = {
+    "Percentiles": dict(umbral_carga=0.3, umbral_descarga=0.7),
+    "Margen fijo": dict(margen=10.0, ventana_dias=7),
+    "Programada": dict(horario=HORARIO),
+}
+
+
+@pytest.mark.parametrize("bloque", ["D", "W"])
+@pytest.mark.parametrize("estrategia", list(HEURISTICAS))
+def test_heuristicas_igual_que_simular(precios_zonas, estrategia, bloque):
+    precios = precios_zonas["NORD"]
+    parametros = dict(DESPACHO, estrategia=estrategia, **HEURISTICAS[estrategia])
+    pd.testing.assert_frame_equal(
+        simular_por_bloques(precios, bloque=bloque, **parametros),
+        simular(precios, **parametros),
+    )
+
+
+@pytest.mark.parametrize("bloque", ["D", "W"])
+def test_optima_con_fronteras_de_la_pasada_gruesa(precios_zonas, bloque):
+    precios = precios_zonas["SICILY"]
+    parametros = dict(DESPACHO, estrategia="Óptima")
+    bloques = simular_por_bloques(precios, bloque=bloque, max_workers=2, **parametros)
+    optimo = simular(precios, **parametros)
+    assert (bloques["SOC (MWh)"] <= 40 + 1e-9).all()
+    assert bloques["Beneficio neto (€)"].sum() == pytest.approx(
+        optimo["Beneficio neto (€)"].sum(), rel=1e-3
+    )
+
+
+def test_frontera_fija_avisa(precios_zonas):
+    precios = precios_zonas["NORD"].head(24 * 7)
+    with pytest.warns(UserWarning, match="soc_frontera"):
+        resultado = simular_por_bloques(
+            precios, estrategia="Óptima", soc_frontera=0.5, max_workers=1, **DESPACHO
+        )
+    fin_de_dia = resultado["SOC (MWh)"].to_numpy()[23::24]
+    assert fin_de_dia == pytest.approx(20.0)
+
+
+def test_frontera_solo_con_optima(precios_zonas):
+    with pytest.raises(ValueError, match="soc_frontera"):
+        simular_por_bloques(
+            precios_zonas["NORD"], estrategia="Percentiles", soc_frontera=0, **DESPACHO
+        )
+
+
+@pytest.mark.parametrize("estrategia", ["Percentiles", "Óptima"])
+def test_sin_filas(precios_zonas, estrategia):
+    precios = precios_zonas["NORD"]
+    resultado = simular_por_bloques(precios.iloc[:0], estrategia=estrategia, **DESPACHO)
+    una_fila = simular(precios.head(1), estrategia=estrategia, **DESPACHO)
+    assert resultado.empty
+    assert list(resultado.columns) == list(una_fila.columns)
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bess.cartera import simular_cartera, valorar_cartera
+from bess.despacho import simular
+from bess.finanzas import modelo_financiero
+
+from conftest import DESPACHO, ECONOMIA
+
+ACTIVOS = pd.DataFrame(
+    {
+        "zona": ["NORD", "SICILY", "NORD", "SUD"],
+        "potencia_mw": [10.0, 5.0, 20.0, 8.0],
+        "duracion_h": [2.0, 4.0, 1.0, 6.0],
+        "ef_carga": [0.95, 0.9, 0.92, 0.95],
+        "margen": [5.0, 10.0, 0.0, 20.0],
+    },
+    index=pd.Index(["A", "B", "C", "D"], name="Activo"),
+)
+COLUMNAS = ["Carga (MWh)", "Descarga (MWh)", "Beneficio neto (€)"]
+CASOS = [
+    ("Percentiles", dict(umbral_carga=0.3, umbral_descarga=0.7), 0),
+    ("Margen fijo", {}, 0),
+    ("Margen fijo", {}, 7),
+    ("Óptima", {}, 0),
+]
+
+
+@pytest.mark.parametrize("estrategia, extra, ventana_dias", CASOS)
+def test_cartera_igual_que_simular(precios_zonas, estrategia, extra, ventana_dias):
+    comunes = dict(
+        ef_descarga=DESPACHO["ef_descarga"],
+        coste_carga=DESPACHO["coste_carga"],
+        coste_descarga=DESPACHO["coste_descarga"],
+        estrategia=estrategia,
+        ventana_dias=ventana_dias,
+        **extra,
+    )
+    anual = simular_cartera(ACTIVOS, precios_zonas, **comunes)
+    for nombre, activo in ACTIVOS.iterrows():
+        uno = simular(
+            precios_zonas[activo["zona"]],
+            potencia_mw=activo["potencia_mw"],
+            duracion_h=activo["duracion_h"],
+            ef_carga=activo["ef_carga"],
+            margen=activo["margen"],
+            **comunes,
+        )
+        esperado = uno.groupby(uno["Fecha"].dt.year)[COLUMNAS].sum()
+        obtenido = anual.xs(nombre, level="Activo")[COLUMNAS]
+        np.testing.assert_allclose(obtenido, esperado, rtol=1e-9, atol=1e-6)
+
+
+def test_valorar_cartera_igual_que_modelo(precios_zonas):
+    anual = simular_cartera(
+        ACTIVOS,
+        precios_zonas,
+        "Margen fijo",
+        ef_descarga=DESPACHO["ef_descarga"],
+        coste_carga=DESPACHO["coste_carga"],
+        coste_descarga=DESPACHO["coste_descarga"],
+    )
+    tabla, cartera = valorar_cartera(anual, ACTIVOS, **ECONOMIA)
+    flujos = []
+    for nombre, activo in ACTIVOS.iterrows():
+        fin = modelo_financiero(
+            tabla.loc[nombre, "Ingreso anual (€)"],
+            activo["potencia_mw"],
+            activo["duracion_h"],
+            **ECONOMIA,
+            ratio_apalancamiento=0,
+            coste_financiacion=0,
+        )
+        assert tabla.loc[nombre, "VAN (€)"] == pytest.approx(fin["van"], rel=1e-9)
+        flujos.append(fin["flujo_caja"])
+    assert cartera["van"] == pytest.approx(tabla["VAN (€)"].sum(), rel=1e-12)
+    np.testing.assert_allclose(cartera["flujo_caja"], np.sum(flujos, axis=0))
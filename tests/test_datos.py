@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+from bess.datos import cargar_precios
+
+FECHA = pd.date_range("2024-01-01", periods=48, freq="h")
+
+
+def _csv(tmp_path, nombre, df):
+    ruta = tmp_path / nombre
+    df.to_csv(ruta, index=False)
+    return str(ruta)
+
+
+def test_fuente_de_una_zona_sirve_para_cualquiera(tmp_path):
+    ruta = _csv(tmp_path, "una.csv", pd.DataFrame({"Fecha": FECHA, "Precio": 1.0}))
+    for zona in ("NORD", "SUD"):
+        precios = cargar_precios(zona, ruta, directorio=str(tmp_path / "almacen"))
+        assert len(precios) == 48
+
+
+def test_fuente_de_varias_zonas_sin_la_pedida(tmp_path):
+    ancho = pd.DataFrame({"Fecha": FECHA, "NORD": 1.0, "SUD": 2.0})
+    ruta = _csv(tmp_path, "ancho.csv", ancho)
+    directorio = str(tmp_path / "almacen")
+    # Tanto al convertir la fuente como al leerla ya guardada.
+    for _ in range(2):
+        with pytest.raises(ValueError, match="SICILY.*NORD, SUD"):
+            cargar_precios("SICILY", ruta, directorio=directorio)
+    assert (cargar_precios("SUD", ruta, directorio=directorio)["Precio"] == 2.0).all()
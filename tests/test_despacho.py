@@ -0,0 +1,70 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bess.datos import ZONAS
+from bess.despacho import (
+    _despacho_optimo,
+    cuantiles_moviles,
+    media_movil,
+    simular,
+    simular_referencia,
+)
+
+from conftest import DESPACHO, HORARIO
+
+ESTRATEGIAS = {
+    "Percentiles": dict(umbral_carga=0.3, umbral_descarga=0.7),
+    "Margen fijo": dict(margen=10.0),
+    "Programada": dict(horario=HORARIO),
+}
+
+
+@pytest.mark.parametrize("estrategia", list(ESTRATEGIAS))
+@pytest.mark.parametrize("zona", ZONAS)
+def test_simular_igual_que_referencia(precios_zonas, zona, estrategia):
+    precios = precios_zonas[zona]
+    parametros = dict(DESPACHO, estrategia=estrategia, **ESTRATEGIAS[estrategia])
+    pd.testing.assert_frame_equal(
+        simular(precios, **parametros), simular_referencia(precios, **parametros)
+    )
+
+
+@pytest.mark.parametrize("paso_c, paso_d", [(2.0, 2.0), (1.0, 3.0), (4.0, 1.0)])
+def test_optimo_igual_que_fuerza_bruta(paso_c, paso_d):
+    precio = np.array([30.0, 10.0, 80.0, 5.0, 90.0, 60.0])
+    energia, niveles, coste_c, coste_d = 4.0, 4, 2.0, 1.5
+    carga, descarga, _, _ = _despacho_optimo(
+        precio, paso_c, paso_d, energia, coste_c, coste_d, niveles=niveles
+    )
+    obtenido = np.sum((precio - coste_d) * descarga - (precio + coste_c) * carga)
+
+    delta = energia / niveles
+    mejor = -np.inf
+    for camino in itertools.product(range(niveles + 1), repeat=len(precio)):
+        cambio = np.diff(camino, prepend=0) * delta
+        if (cambio > paso_c + 1e-9).any() or (-cambio > paso_d + 1e-9).any():
+            continue
+        beneficio = np.sum(
+            (precio - coste_d) * np.clip(-cambio, 0, None)
+            - (precio + coste_c) * np.clip(cambio, 0, None)
+        )
+        mejor = max(mejor, beneficio)
+    assert obtenido == pytest.approx(mejor)
+
+
+@pytest.mark.parametrize("ventana_dias", [1, 7])
+def test_ventana_movil_igual_que_pandas(precios_zonas, ventana_dias):
+    precios = precios_zonas["SICILY"].copy()
+    precios.loc[precios.index[100:130], "Precio"] = np.nan
+    movil = precios.set_index("Fecha")["Precio"].rolling(
+        f"{ventana_dias}D", closed="left"
+    )
+    cuantiles = cuantiles_moviles(precios, ventana_dias, [0.25, 0.75])
+    np.testing.assert_allclose(cuantiles[:, 0], movil.quantile(0.25), rtol=1e-12)
+    np.testing.assert_allclose(cuantiles[:, 1], movil.quantile(0.75), rtol=1e-12)
+    np.testing.assert_allclose(
+        media_movil(precios, ventana_dias), movil.mean(), rtol=1e-12
+    )
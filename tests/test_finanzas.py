@@ -0,0 +1,75 @@
+import numpy as np
+import numpy_financial as npf
+import pytest
+
+from bess.finanzas import evaluar_escenarios, modelo_financiero, tir_lote
+
+from conftest import ECONOMIA
+
+
+def _irr(flujos):
+    return np.array([npf.irr(fila) for fila in flujos])
+
+
+def test_tir_lote_un_cambio_de_signo():
+    rng = np.random.default_rng(0)
+    inversion = -rng.uniform(1e6, 5e6, (200, 1))
+    anuales = rng.uniform(0.01, 0.3, (200, 15)) * -inversion
+    # Incluye proyectos que no recuperan la inversión (TIR negativa).
+    anuales[:50] *= 0.2
+    flujos = np.hstack((inversion, anuales))
+    np.testing.assert_allclose(tir_lote(flujos), _irr(flujos), rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize(
+    "fila",
+    [
+        [-100.0, 230.0, -132.0],
+        [-1000.0, 500.0, 600.0, -50.0, 200.0],
+        [-50.0, 20.0, -10.0, 60.0, 10.0],
+        [0.0, -100.0, 60.0, 60.0],
+    ],
+)
+def test_tir_lote_varios_cambios_de_signo(fila):
+    (tir,) = tir_lote([fila])
+    esperada = npf.irr(fila)
+    assert tir == pytest.approx(esperada, rel=1e-9, abs=1e-12, nan_ok=True)
+
+
+def test_tir_lote_sin_cambio_de_signo_y_forma():
+    flujos = np.array([[100.0, 10.0, 10.0], [-100.0, -10.0, -10.0]])
+    assert np.isnan(tir_lote(flujos)).all()
+    cubo = np.tile([-100.0, 30.0, 40.0, 50.0], (2, 3, 1))
+    tir = tir_lote(cubo)
+    assert tir.shape == (2, 3)
+    np.testing.assert_allclose(tir, npf.irr([-100.0, 30.0, 40.0, 50.0]), rtol=1e-9)
+
+
+def test_escenarios_igual_que_modelo_financiero():
+    ingresos = np.array([2e5, 6e5, 1.2e6])
+    duraciones = np.array([1.0, 2.0, 4.0])
+    esc = evaluar_escenarios(
+        ingresos,
+        10,
+        duraciones,
+        **ECONOMIA,
+        ratio_apalancamiento=60,
+        coste_financiacion=5,
+    )
+    for i, (ingreso, duracion) in enumerate(zip(ingresos, duraciones)):
+        fin = modelo_financiero(
+            ingreso,
+            10,
+            duracion,
+            **ECONOMIA,
+            ratio_apalancamiento=60,
+            coste_financiacion=5,
+        )
+        assert esc["van"][i] == pytest.approx(fin["van"], rel=1e-9)
+        for clave in ("tir", "tir_equity"):
+            assert esc[clave][i] == pytest.approx(fin[clave], rel=1e-9, nan_ok=True)
+            assert esc[clave][i] == pytest.approx(
+                npf.irr(fin["flujo_caja" if clave == "tir" else "flujo_equity"]),
+                rel=1e-9,
+                nan_ok=True,
+            )
@@ -0,0 +1,149 @@
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bess.ingesta import detectar_formato, ingerir, regularizar
+
+
+def _horas(*horas):
+    return np.datetime64("2024-03-30T00:00", "ns") + np.array(
+        [np.timedelta64(int(h * 60), "m") for h in horas]
+    )
+
+
+def test_regularizar_promedia_duplicadas():
+    fecha = _horas(0, 1, 2, 2, 3)
+    df, informe = regularizar(fecha, np.array([10.0, 20.0, 30.0, 50.0, 60.0]))
+    assert df["Precio"].tolist() == [10.0, 20.0, 40.0, 60.0]
+    assert informe["Duplicadas"] == 1
+    assert informe["Filas finales"] == 4
+
+
+def test_regularizar_ordena_y_descarta_fuera_de_rejilla():
+    fecha = _horas(3, 0, 1.5, 2, 1, 4)
+    df, informe = regularizar(fecha, np.array([4.0, 1.0, 99.0, 3.0, 2.0, 5.0]))
+    assert df["Fecha"].tolist() == list(pd.to_datetime(_horas(0, 1, 2, 3, 4)))
+    assert df["Precio"].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert informe["Fuera de rejilla"] == 1
+    assert informe["Paso (min)"] == 60
+
+
+def test_regularizar_interpola_solo_huecos_cortos():
+    # Hueco de 2 pasos (horas 1-2) y de 8 pasos (horas 5-12).
+    horas = [0, 3, 4, 13, 14]
+    df, informe = regularizar(_horas(*horas), np.array([0.0, 30.0, 40.0, 130.0, 140.0]))
+    precio = df["Precio"].to_numpy()
+    assert len(df) == 15
+    np.testing.assert_allclose(precio[:5], [0.0, 10.0, 20.0, 30.0, 40.0])
+    assert np.isnan(precio[5:13]).all()
+    assert informe["Huecos"] == 2
+    assert informe["Filas rellenadas"] == 2
+    assert informe["Filas sin precio"] == 8
+
+    df, informe = regularizar(
+        _horas(*horas), np.array([0.0, 30.0, 40.0, 130.0, 140.0]), max_hueco=8
+    )
+    np.testing.assert_allclose(df["Precio"], np.arange(15) * 10.0)
+    assert informe["Filas sin precio"] == 0
+
+
+def test_regularizar_cuartohorario():
+    fecha = np.datetime64("2024-01-01T00:00", "ns") + np.arange(8) * np.timedelta64(
+        15, "m"
+    )
+    df, informe = regularizar(np.delete(fecha, 3), np.delete(np.arange(8.0), 3))
+    assert informe["Paso (min)"] == 15
+    np.testing.assert_allclose(df["Precio"], np.arange(8.0))
+
+
+@pytest.mark.parametrize(
+    "muestra, formato",
+    [
+        (["2024-01-31 23:00:00"], "%Y-%m-%d %H:%M:%S"),
+        (["31/01/2024 23:00"], "%d/%m/%Y %H:%M"),
+        (["01/02/2024", "13/02/2024"], "%d/%m/%Y"),
+        (["01/02/2024 00:00", "02/02/2024 00:00", "basura"], "%d/%m/%Y %H:%M"),
+        (["01/02/2024 00:00", "2024-02-01 01:00:00"], None),
+        (["ayer"], None),
+    ],
+)
+def test_detectar_formato(muestra, formato):
+    assert detectar_formato(muestra) == formato
+
+
+def test_ingerir_csv_punto_y_coma_largo():
+    texto = (
+        "fecha;zona;precio\n"
+        "30/03/2024 00:00;NORD;10,5\n"
+        "30/03/2024 01:00;NORD;11,5\n"
+        "30/03/2024 01:00;NORD;12,5\n"
+        "30/03/2024 03:00;NORD;n/d\n"
+        "30/03/2024 00:00;SUD;20,0\n"
+        "30/03/2024 01:00;SUD;22,0\n"
+    )
+    for contenido, nombre in (
+        (texto.encode(), "precios.csv"),
+        (gzip.compress(texto.encode()), "precios.csv.gz"),
+    ):
+        zonas, informe = ingerir(contenido, nombre)
+        assert sorted(zonas) == ["NORD", "SUD"]
+        np.testing.assert_allclose(zonas["NORD"]["Precio"][:2], [10.5, 12.0])
+        assert zonas["SUD"]["Precio"].tolist() == [20.0, 22.0]
+        assert informe.loc["NORD", "Formato de fecha"] == "%d/%m/%Y %H:%M"
+        assert informe.loc["NORD", "Duplicadas"] == 1
+        assert informe.loc["NORD", "Precios no numéricos"] == 1
+
+
+def test_ingerir_csv_ancho_por_trozos():
+    fecha = pd.date_range("2024-01-01", periods=48, freq="h")
+    ancho = pd.DataFrame({"Fecha": fecha, "A": np.arange(48.0), "B": -np.arange(48.0)})
+    contenido = ancho.to_csv(index=False).encode()
+    zonas, informe = ingerir(contenido, "ancho.csv", filas_trozo=10)
+    assert (informe["Formato de fecha"] == "%Y-%m-%d %H:%M:%S").all()
+    for zona in ("A", "B"):
+        pd.testing.assert_frame_equal(
+            zonas[zona],
+            ancho[["Fecha", zona]].rename(columns={zona: "Precio"}),
+            check_dtype=False,
+        )
+    assert (informe["Filas finales"] == 48).all()
+
+
+def test_ingerir_fecha_mala_no_cambia_el_formato():
+    fecha = pd.date_range("2024-02-01", periods=72, freq="h")
+    lineas = [f"{f:%d/%m/%Y %H:%M};{i}" for i, f in enumerate(fecha)]
+    contenido = "\n".join(["Fecha;Precio", *lineas, "basura;5"]).encode()
+    zonas, informe = ingerir(contenido, "precios.csv")
+    assert zonas[""]["Fecha"].tolist() == fecha.tolist()
+    assert zonas[""]["Precio"].tolist() == list(range(72))
+    assert informe.loc["", "Formato de fecha"] == "%d/%m/%Y %H:%M"
+    assert informe.loc["", "Fechas no válidas"] == 1
+
+
+def test_ingerir_sin_formato_lee_el_dia_primero():
+    contenido = b"Fecha,Precio\n01/02/2024 00:00,1\n2024-02-01 01:00:00,2\n"
+    zonas, informe = ingerir(contenido, "precios.csv")
+    assert zonas[""]["Fecha"].tolist() == list(
+        pd.date_range("2024-02-01", periods=2, freq="h")
+    )
+    assert informe.loc["", "Formato de fecha"] == "mixto"
+
+
+def test_ingerir_trozos_con_otro_formato():
+    fecha = pd.date_range("2024-02-01", periods=40, freq="h")
+    lineas = [
+        f"{f:%d/%m/%Y %H:%M},{i}" if i < 20 else f"{f:%Y-%m-%d %H:%M:%S},{i}"
+        for i, f in enumerate(fecha)
+    ]
+    contenido = "\n".join(["Fecha,Precio", *lineas]).encode()
+    zonas, informe = ingerir(contenido, "precios.csv", filas_trozo=10)
+    assert zonas[""]["Fecha"].tolist() == fecha.tolist()
+    assert informe.loc["", "Formato de fecha"] == "%d/%m/%Y %H:%M, %Y-%m-%d %H:%M:%S"
+    assert informe.loc["", "Fechas no válidas"] == 0
+
+
+def test_ingerir_sin_fechas():
+    with pytest.raises(ValueError):
+        ingerir(b"Fecha,Precio\nayer,1\n", "malo.csv")
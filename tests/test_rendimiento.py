@@ -0,0 +1,20 @@
+import warnings
+
+from bess.rendimiento import Registro, medir
+
+
+def test_tabla_de_varios_registros_sin_avisos():
+    with Registro() as registro:
+        with medir("despacho", filas=10):
+            pass
+    vacio = Registro()
+    with Registro() as dibujo:
+        with medir("graficos"):
+            pass
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        tabla = registro.tabla(vacio, dibujo)
+        assert registro.tabla(vacio).shape == (1, 5)
+        assert vacio.tabla(vacio).empty
+    assert tabla["etapa"].tolist() == ["despacho", "graficos"]
+    assert tabla["filas"].tolist()[0] == 10
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from bess.despacho import simular, simular_duraciones, simular_margenes
+from bess.finanzas import modelo_financiero
+from bess.sensibilidad import analizar_duracion
+
+from conftest import DESPACHO, ECONOMIA, HORARIO
+
+SIN_DURACION = {k: v for k, v in DESPACHO.items() if k != "duracion_h"}
+CASOS = [
+    ("Percentiles", dict(umbral_carga=0.3, umbral_descarga=0.7), 0),
+    ("Percentiles", dict(umbral_carga=0.3, umbral_descarga=0.7), 7),
+    ("Margen fijo", dict(margen=10.0), 0),
+    ("Margen fijo", dict(margen=10.0), 7),
+    ("Programada", dict(horario=HORARIO), 0),
+    ("Óptima", {}, 0),
+]
+
+
+def _anual(resultado):
+    return resultado.groupby(resultado["Fecha"].dt.year)["Beneficio neto (€)"].sum()
+
+
+@pytest.mark.parametrize("estrategia, extra, ventana_dias", CASOS)
+@pytest.mark.parametrize("zona", ["NORD", "SICILY"])
+def test_duraciones_igual_que_simular(
+    precios_zonas, zona, estrategia, extra, ventana_dias
+):
+    precios = precios_zonas[zona]
+    if estrategia == "Óptima":
+        duraciones = [0.5, 2.0, 4.0]
+    else:
+        duraciones = [0.5, 1.0, 2.5, 4.0, 6.0]
+    parametros = dict(
+        SIN_DURACION, estrategia=estrategia, ventana_dias=ventana_dias, **extra
+    )
+    lote = simular_duraciones(precios, duraciones=duraciones, **parametros)
+    for duracion in duraciones:
+        uno = _anual(simular(precios, duracion_h=duracion, **parametros))
+        np.testing.assert_allclose(lote[duracion].to_numpy(), uno.to_numpy(), rtol=1e-9)
+
+
+def test_van_de_duraciones_igual_que_modelo(precios_zonas):
+    precios = precios_zonas["NORD"]
+    tabla, _ = analizar_duracion(
+        precios,
+        max_h=6,
+        estrategia="Percentiles",
+        umbral_carga=0.25,
+        umbral_descarga=0.75,
+        margen=0,
+        horario=None,
+        **SIN_DURACION,
+        **ECONOMIA,
+    )
+    for duracion, van in zip(tabla["Duración (h)"], tabla["VAN"]):
+        ingreso = _anual(
+            simular(
+                precios, duracion_h=duracion, estrategia="Percentiles", **SIN_DURACION
+            )
+        ).iloc[0]
+        fin = modelo_financiero(
+            ingreso,
+            DESPACHO["potencia_mw"],
+            duracion,
+            **ECONOMIA,
+            ratio_apalancamiento=0,
+            coste_financiacion=0,
+        )
+        assert van == pytest.approx(fin["van"], rel=1e-9)
+
+
+@pytest.mark.parametrize("ventana_dias", [0, 7])
+@pytest.mark.parametrize("zona", ["NORD", "SICILY"])
+def test_margenes_igual_que_simular(precios_zonas, zona, ventana_dias):
+    precios = precios_zonas[zona]
+    margenes = [0.0, 5.0, 12.5, 30.0, 80.0]
+    lote = simular_margenes(
+        precios,
+        estrategia="Margen fijo",
+        margenes=margenes,
+        ventana_dias=ventana_dias,
+        **DESPACHO,
+    )
+    for margen in margenes:
+        uno = _anual(
+            simular(
+                precios,
+                estrategia="Margen fijo",
+                margen=margen,
+                ventana_dias=ventana_dias,
+                **DESPACHO,
+            )
+        )
+        np.testing.assert_allclose(lote[margen].to_numpy(), uno.to_numpy(), rtol=1e-9)
+
+
+@pytest.mark.parametrize("estrategia", ["Percentiles", "Óptima"])
+def test_margenes_sin_efecto_fuera_de_margen_fijo(precios_zonas, estrategia):
+    precios = precios_zonas["NORD"]
+    umbrales = dict(umbral_carga=0.3, umbral_descarga=0.7)
+    lote = simular_margenes(
+        precios,
+        estrategia=estrategia,
+        margenes=[0.0, 5.0, 10.0],
+        **umbrales,
+        **DESPACHO,
+    )
+    uno = _anual(simular(precios, estrategia=estrategia, **umbrales, **DESPACHO))
+    for margen in lote.columns:
+        np.testing.assert_allclose(lote[margen].to_numpy(), uno.to_numpy(), rtol=1e-9)